@@ -1,3 +1,7 @@
+from typing import List, Tuple
+
+import django.apps
+
 from aleksis.core.util.apps import AppConfig
 
 
@@ -17,3 +21,60 @@ class ChronosConfig(AppConfig):
         ([2019], "Tom Teichler", "tom.teichler@teckids.org"),
         ([2019], "Hangzhi Yu", "yuha@katharineum.de"),
     )
+
+    def ready(self):
+        super().ready()
+
+        from .handlers import (  # noqa
+            connect_change_feed_handlers,
+            connect_holiday_calendar_handlers,
+            connect_lesson_series_handlers,
+            connect_occurrence_handlers,
+            connect_period_grid_handlers,
+            connect_person_role_handlers,
+            connect_substitution_date_handlers,
+            connect_substitution_snapshot_handlers,
+            connect_timetable_cache_handlers,
+            connect_timetable_directory_handlers,
+            connect_view_data_handlers,
+        )
+
+        # Stored dates and series keys have to be updated before timetables are rebuilt
+        connect_substitution_date_handlers()
+        connect_lesson_series_handlers()
+
+        # Holidays, period grids and person roles have to be reloaded before timetables are rebuilt
+        connect_holiday_calendar_handlers()
+        connect_period_grid_handlers()
+        connect_person_role_handlers()
+        connect_timetable_cache_handlers()
+        connect_timetable_directory_handlers()
+        connect_view_data_handlers()
+        connect_change_feed_handlers()
+        connect_substitution_snapshot_handlers()
+
+        # Occurrences are regenerated from stored dates and the reloaded holiday calendar
+        connect_occurrence_handlers()
+
+    def post_migrate(
+        self,
+        app_config: django.apps.AppConfig,
+        verbosity: int,
+        interactive: bool,
+        using: str,
+        plan: List[Tuple],
+        apps: django.apps.registry.Apps,
+        **kwargs,
+    ) -> None:
+        super().post_migrate(app_config, verbosity, interactive, using, plan, apps, **kwargs)
+
+        # Fill the lesson occurrence table once it has been created
+        if any(
+            migration.app_label == self.label
+            and migration.name == "0007_lesson_occurrence"
+            and not backwards
+            for migration, backwards in plan or []
+        ):
+            from .util.occurrences import rebuild_current_occurrences  # noqa
+
+            rebuild_current_occurrences()
@@ -0,0 +1,764 @@
+from datetime import date
+from threading import local
+from typing import Any, Iterable, List, Optional
+from weakref import ref
+
+from django.db import transaction
+from django.db.models import Model, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+
+from calendarweek import CalendarWeek
+
+from aleksis.core.models import Announcement, AnnouncementRecipient, Group, Person
+from aleksis.core.util.core_helpers import get_site_preferences, is_celery_enabled
+
+from .models import (
+    Absence,
+    Break,
+    Event,
+    ExtraLesson,
+    Holiday,
+    Lesson,
+    LessonPeriod,
+    LessonSubstitution,
+    Room,
+    Subject,
+    Supervision,
+    SupervisionArea,
+    SupervisionSubstitution,
+    TimePeriod,
+    TimetableChange,
+    ValidityRange,
+)
+from .tasks import render_substitution_snapshots_task
+from .util.broker import publish_change
+from .util.caching import invalidate_timetable_cache, weeks_between
+from .util.changes import record_change
+from .util.conditional import invalidate_view_data
+from .util.directory import invalidate_timetable_directory
+from .util.holidays import invalidate_holiday_calendar
+from .util.period_grid import invalidate_period_grids
+from .util.roles import invalidate_person_roles
+from .util.series import build_series_key
+from .util.snapshots import mark_snapshots_outdated
+
+
+def _get_timetable_weeks(instance: Model) -> Optional[List[CalendarWeek]]:
+    """Get the weeks of week- or date-bound timetable data, or `None` for other data."""
+    if isinstance(instance, (LessonSubstitution, ExtraLesson)):
+        return [CalendarWeek(week=instance.week, year=instance.year)]
+    elif isinstance(instance, SupervisionSubstitution):
+        start, end = instance.date, instance.date
+    elif isinstance(instance, (Event, Holiday)):
+        start, end = instance.date_start, instance.date_end
+    else:
+        return None
+
+    if not start or not end:
+        return None
+    return list(weeks_between(start, end))
+
+
+def _invalidate_for_instance(instance: Model, created: bool = True):
+    """Invalidate all cached timetables which could show the provided object.
+
+    Changes to week- or date-bound objects only invalidate the affected weeks,
+    which for updates also include the weeks the object was in before.
+    """
+    weeks = _get_timetable_weeks(instance)
+    if weeks is not None and not created:
+        previous_weeks = getattr(instance, "_previous_timetable_weeks", None)
+        weeks = weeks + previous_weeks if previous_weeks is not None else None
+
+    invalidate_timetable_cache(weeks)
+
+
+def timetable_data_pre_save(sender: type, instance: Model, **kwargs: Any):
+    """Remember the previous weeks of week- or date-bound data before it is changed."""
+    if kwargs.get("raw") or not instance.pk:
+        return
+
+    previous = (
+        sender.objects.filter(pk=instance.pk).select_related(None).prefetch_related(None).first()
+    )
+    instance._previous_timetable_weeks = _get_timetable_weeks(previous) if previous else None
+
+
+def timetable_data_saved(sender: type, instance: Model, created: bool, **kwargs: Any):
+    """Invalidate cached timetables after timetable data has been created or changed."""
+    if kwargs.get("raw"):
+        invalidate_timetable_cache()
+    else:
+        _invalidate_for_instance(instance, created)
+
+
+def timetable_data_deleted(sender: type, instance: Model, **kwargs: Any):
+    """Invalidate cached timetables after timetable data has been deleted."""
+    _invalidate_for_instance(instance)
+
+
+def timetable_data_m2m_changed(
+    sender: type, instance: Model, action: str, reverse: bool, **kwargs: Any
+):
+    """Invalidate cached timetables after relations of timetable data have changed."""
+    if not action.startswith("post_"):
+        return
+
+    if reverse:
+        invalidate_timetable_cache()
+    else:
+        _invalidate_for_instance(instance)
+
+
+def timetable_related_data_pre_save(sender: type, instance: Model, **kwargs: Any):
+    """Remember the previous values of the fields shown in timetables before an object changes."""
+    instance._previous_timetable_fields = None
+    if kwargs.get("raw") or not instance.pk:
+        return
+
+    fields = [sender._meta.get_field(name) for name in TIMETABLE_RELATED_MODELS[sender]]
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None:
+        fields = [
+            field
+            for field in fields
+            if field.name in update_fields or field.attname in update_fields
+        ]
+    if not fields:
+        return
+
+    attnames = [field.attname for field in fields]
+    previous = sender.objects.filter(pk=instance.pk).values_list(*attnames).first()
+    instance._previous_timetable_fields = (attnames, previous)
+
+
+def timetable_related_data_saved(sender: type, instance: Model, created: bool, **kwargs: Any):
+    """Invalidate all cached timetables after fields shown in them have been changed.
+
+    New objects aren't shown in any timetable yet, and changes to other fields,
+    e. g. of persons logging in, don't change any timetable.
+    """
+    if kwargs.get("raw"):
+        invalidate_timetable_cache()
+        return
+
+    previous = instance.__dict__.pop("_previous_timetable_fields", None)
+    if created or previous is None:
+        return
+
+    attnames, values = previous
+    if values != tuple(getattr(instance, attname) for attname in attnames):
+        invalidate_timetable_cache()
+
+
+def timetable_related_data_deleted(sender: type, **kwargs: Any):
+    """Invalidate all cached timetables after data shown in them has been deleted."""
+    invalidate_timetable_cache()
+
+
+TIMETABLE_DATA_MODELS = [
+    LessonPeriod,
+    LessonSubstitution,
+    ExtraLesson,
+    Event,
+    Holiday,
+    Supervision,
+    SupervisionSubstitution,
+    Lesson,
+    TimePeriod,
+    Break,
+    ValidityRange,
+]
+
+# Week- or date-bound timetable data only invalidates the weeks it was and is in
+WEEK_BOUND_TIMETABLE_DATA_MODELS = [
+    LessonSubstitution,
+    ExtraLesson,
+    Event,
+    Holiday,
+    SupervisionSubstitution,
+]
+
+# Objects which are stored as part of built timetables with the fields shown in them,
+# e. g. subjects with their colours
+TIMETABLE_RELATED_MODELS = {
+    Subject: ["short_name", "name", "colour_fg", "colour_bg"],
+    Room: ["short_name", "name"],
+    SupervisionArea: ["short_name", "name", "colour_fg", "colour_bg"],
+    Person: ["first_name", "last_name", "additional_name", "short_name", "primary_group"],
+    Group: ["name", "short_name"],
+}
+
+TIMETABLE_DATA_M2M_FIELDS = [
+    LessonSubstitution.teachers,
+    ExtraLesson.groups,
+    ExtraLesson.teachers,
+    Event.groups,
+    Event.rooms,
+    Event.teachers,
+    Lesson.groups,
+    Lesson.teachers,
+    Group.members,
+    Group.parent_groups,
+]
+
+
+def connect_timetable_cache_handlers(dispatch_uid: str = "chronos_timetable_cache"):
+    """Connect all signal handlers needed for invalidating cached timetables."""
+    for model in TIMETABLE_DATA_MODELS:
+        post_save.connect(
+            timetable_data_saved, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+        post_delete.connect(
+            timetable_data_deleted, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+
+    for model in WEEK_BOUND_TIMETABLE_DATA_MODELS:
+        pre_save.connect(
+            timetable_data_pre_save, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+
+    for model in TIMETABLE_RELATED_MODELS:
+        pre_save.connect(
+            timetable_related_data_pre_save,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+        post_save.connect(
+            timetable_related_data_saved,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+        post_delete.connect(
+            timetable_related_data_deleted,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+
+    for field in TIMETABLE_DATA_M2M_FIELDS:
+        through = field.through
+        m2m_changed.connect(
+            timetable_data_m2m_changed,
+            sender=through,
+            dispatch_uid=f"{dispatch_uid}_{through.__name__}",
+        )
+
+
+def holidays_changed(sender: type, **kwargs: Any):
+    """Make all processes reload their holiday calendar after a holiday has changed."""
+    invalidate_holiday_calendar()
+
+
+def connect_holiday_calendar_handlers(dispatch_uid: str = "chronos_holiday_calendar"):
+    """Connect all signal handlers needed for reloading the holiday calendar."""
+    post_save.connect(holidays_changed, sender=Holiday, dispatch_uid=dispatch_uid)
+    post_delete.connect(holidays_changed, sender=Holiday, dispatch_uid=dispatch_uid)
+
+
+def period_grid_changed(sender: type, **kwargs: Any):
+    """Make all processes rebuild their period grids after time periods or breaks have changed."""
+    invalidate_period_grids()
+
+
+PERIOD_GRID_MODELS = [TimePeriod, Break, ValidityRange]
+
+
+def connect_period_grid_handlers(dispatch_uid: str = "chronos_period_grid"):
+    """Connect all signal handlers needed for rebuilding period grids."""
+    for model in PERIOD_GRID_MODELS:
+        post_save.connect(
+            period_grid_changed, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+        post_delete.connect(
+            period_grid_changed, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+
+
+def lesson_period_saved(sender: type, instance: LessonPeriod, created: bool, **kwargs: Any):
+    """Update the dates of substitutions after their lesson period has been moved."""
+    if not created and not kwargs.get("raw"):
+        LessonSubstitution.objects.filter(lesson_period=instance).sync_dates()
+
+
+def time_period_saved(sender: type, instance: TimePeriod, created: bool, **kwargs: Any):
+    """Update the dates of substitutions and extra lessons after their time period has moved."""
+    if not created and not kwargs.get("raw"):
+        LessonSubstitution.objects.filter(lesson_period__period=instance).sync_dates()
+        ExtraLesson.objects.filter(period=instance).sync_dates()
+
+
+def connect_substitution_date_handlers(dispatch_uid: str = "chronos_substitution_dates"):
+    """Connect all signal handlers needed for keeping stored dates in sync."""
+    post_save.connect(lesson_period_saved, sender=LessonPeriod, dispatch_uid=dispatch_uid)
+    post_save.connect(time_period_saved, sender=TimePeriod, dispatch_uid=dispatch_uid)
+
+
+# Work requested by signal handlers which is done once the transaction has been committed
+_pending = local()
+
+
+class _PendingOccurrences:
+    """Occurrence rebuilds requested within one transaction.
+
+    All rebuilds are merged and done at once after the transaction has been
+    committed. The pending rebuilds are only referenced weakly from outside,
+    so if the transaction is rolled back, they are dropped together with
+    their on-commit callback.
+    """
+
+    def __init__(self):
+        self.all = False
+        self.lesson_periods = set()
+        self.start = None
+        self.end = None
+        self.dated_lesson_periods = set()
+        self.done = False
+
+    def add(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        lesson_periods: Optional[Iterable[int]] = None,
+    ):
+        if lesson_periods is None and not (start and end):
+            self.all = True
+        elif not (start and end):
+            self.lesson_periods.update(lesson_periods)
+        else:
+            self.start = min(self.start or start, start)
+            self.end = max(self.end or end, end)
+            if lesson_periods is None:
+                self.dated_lesson_periods = None
+            elif self.dated_lesson_periods is not None:
+                self.dated_lesson_periods.update(lesson_periods)
+
+    def __call__(self):
+        from .tasks import rebuild_lesson_occurrences  # noqa
+
+        self.done = True
+        if self.all:
+            rebuild_lesson_occurrences()
+            return
+
+        if self.lesson_periods:
+            rebuild_lesson_occurrences(None, None, sorted(self.lesson_periods))
+        if self.start:
+            rebuild_lesson_occurrences(
+                self.start.isoformat(),
+                self.end.isoformat(),
+                sorted(self.dated_lesson_periods)
+                if self.dated_lesson_periods is not None
+                else None,
+            )
+
+
+def _rebuild_occurrences(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    lesson_periods: Optional[Iterable[int]] = None,
+):
+    """Rebuild occurrences after the current transaction has been committed.
+
+    All rebuilds requested within one transaction are merged, so that e. g.
+    an import only rebuilds the occurrences of the touched range once.
+    """
+    pending_ref = getattr(_pending, "occurrences", None)
+    pending = pending_ref() if pending_ref else None
+    if pending is not None and not pending.done and transaction.get_connection().in_atomic_block:
+        pending.add(start, end, lesson_periods)
+        return
+
+    pending = _PendingOccurrences()
+    pending.add(start, end, lesson_periods)
+    _pending.occurrences = ref(pending)
+    # Outside of transactions, the rebuilds are done immediately
+    transaction.on_commit(pending)
+
+
+def _rebuild_occurrences_for_substitutions(subs: Iterable[LessonSubstitution]):
+    for sub in subs:
+        _rebuild_occurrences(sub.date, sub.date, [sub.lesson_period_id])
+
+
+def occurrence_data_pre_save(sender: type, instance: Model, **kwargs: Any):
+    """Remember the previous dates of substitutions and holidays before they are changed."""
+    if kwargs.get("raw") or not instance.pk:
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).select_related(None).prefetch_related(None)
+    if sender is LessonSubstitution:
+        instance._previous_occurrence = previous.values_list("date", "lesson_period").first()
+    else:
+        instance._previous_occurrence = previous.values_list("date_start", "date_end").first()
+
+
+def substitution_occurrences_changed(sender: type, instance: LessonSubstitution, **kwargs: Any):
+    """Regenerate the occurrences of substituted lesson periods."""
+    if kwargs.get("raw"):
+        return
+
+    previous = getattr(instance, "_previous_occurrence", None)
+    if previous and previous != (instance.date, instance.lesson_period_id):
+        _rebuild_occurrences(previous[0], previous[0], [previous[1]])
+    _rebuild_occurrences_for_substitutions([instance])
+
+
+def substitution_teachers_changed(
+    sender: type, instance: Model, action: str, reverse: bool, pk_set: set, **kwargs: Any
+):
+    """Regenerate the occurrences of substitutions after their teachers have changed."""
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        _rebuild_occurrences_for_substitutions([instance])
+    elif pk_set:
+        _rebuild_occurrences_for_substitutions(LessonSubstitution.objects.filter(pk__in=pk_set))
+    else:
+        _rebuild_occurrences()
+
+
+def holiday_occurrences_changed(sender: type, instance: Holiday, **kwargs: Any):
+    """Regenerate all occurrences within the previous and current dates of a holiday."""
+    if kwargs.get("raw"):
+        return
+
+    previous = getattr(instance, "_previous_occurrence", None)
+    if previous and previous != (instance.date_start, instance.date_end):
+        _rebuild_occurrences(*previous)
+    _rebuild_occurrences(instance.date_start, instance.date_end)
+
+
+def lesson_occurrences_changed(sender: type, instance: Model, created: bool = False, **kwargs: Any):
+    """Regenerate the occurrences of lesson periods after the lesson data has changed."""
+    if kwargs.get("raw"):
+        return
+
+    if isinstance(instance, LessonPeriod):
+        lesson_periods = [instance.pk]
+    elif created:
+        # New lessons, time periods and validity ranges have no lesson periods yet
+        return
+    elif isinstance(instance, Lesson):
+        lesson_periods = instance.lesson_periods.values_list("pk", flat=True)
+    elif isinstance(instance, TimePeriod):
+        lesson_periods = instance.lesson_periods.values_list("pk", flat=True)
+    else:
+        lesson_periods = LessonPeriod.objects.filter(lesson__validity=instance).values_list(
+            "pk", flat=True
+        )
+    _rebuild_occurrences(lesson_periods=lesson_periods)
+
+
+def lesson_teachers_changed(
+    sender: type, instance: Model, action: str, reverse: bool, pk_set: set, **kwargs: Any
+):
+    """Regenerate the occurrences of lessons after their teachers have changed."""
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        lessons = [instance.pk]
+    elif pk_set:
+        lessons = pk_set
+    else:
+        _rebuild_occurrences()
+        return
+    _rebuild_occurrences(
+        lesson_periods=LessonPeriod.objects.filter(lesson__in=lessons).values_list("pk", flat=True)
+    )
+
+
+def connect_occurrence_handlers(dispatch_uid: str = "chronos_occurrences"):
+    """Connect all signal handlers needed for maintaining lesson occurrences incrementally."""
+    for model in (LessonSubstitution, Holiday):
+        pre_save.connect(
+            occurrence_data_pre_save, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+
+    post_save.connect(
+        substitution_occurrences_changed, sender=LessonSubstitution, dispatch_uid=dispatch_uid
+    )
+    post_delete.connect(
+        substitution_occurrences_changed, sender=LessonSubstitution, dispatch_uid=dispatch_uid
+    )
+    m2m_changed.connect(
+        substitution_teachers_changed,
+        sender=LessonSubstitution.teachers.through,
+        dispatch_uid=dispatch_uid,
+    )
+
+    post_save.connect(holiday_occurrences_changed, sender=Holiday, dispatch_uid=dispatch_uid)
+    post_delete.connect(holiday_occurrences_changed, sender=Holiday, dispatch_uid=dispatch_uid)
+
+    for model in (LessonPeriod, Lesson, TimePeriod, ValidityRange):
+        post_save.connect(
+            lesson_occurrences_changed,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+    m2m_changed.connect(
+        lesson_teachers_changed, sender=Lesson.teachers.through, dispatch_uid=dispatch_uid
+    )
+
+
+def person_roles_changed(sender: type, **kwargs: Any):
+    """Make all processes rebuild their person role index after teachers or groups changed."""
+    if kwargs.get("action", "post_").startswith("post_"):
+        invalidate_person_roles()
+
+
+def connect_person_role_handlers(dispatch_uid: str = "chronos_person_roles"):
+    """Connect all signal handlers needed for rebuilding the person role index."""
+    for model in (Person, Lesson, LessonPeriod):
+        post_save.connect(
+            person_roles_changed, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+        post_delete.connect(
+            person_roles_changed, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+
+    for field in (Lesson.teachers, Group.members):
+        through = field.through
+        m2m_changed.connect(
+            person_roles_changed, sender=through, dispatch_uid=f"{dispatch_uid}_{through.__name__}"
+        )
+
+
+def lesson_pre_save(sender: type, instance: Lesson, **kwargs: Any):
+    """Remember the previous subject of a lesson before it is changed."""
+    instance._previous_subject_id = None
+    if kwargs.get("raw") or not instance.pk:
+        return
+
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not {"subject", "subject_id"} & set(update_fields):
+        # The subject isn't saved, so it can't have changed
+        instance._previous_subject_id = instance.subject_id
+        return
+
+    instance._previous_subject_id = (
+        Lesson.objects.filter(pk=instance.pk).values_list("subject_id", flat=True).first()
+    )
+
+
+def lesson_saved(sender: type, instance: Lesson, created: bool, **kwargs: Any):
+    """Update the series key of a lesson after its subject has changed."""
+    previous_subject_id = instance.__dict__.pop("_previous_subject_id", None)
+    if created or kwargs.get("raw") or previous_subject_id != instance.subject_id:
+        instance.update_series_key()
+
+
+def _update_series_keys(lessons: QuerySet):
+    """Update the series keys of many lessons at once."""
+    lessons = list(
+        lessons.select_related(None).prefetch_related(None).prefetch_related("groups", "teachers")
+    )
+    for lesson in lessons:
+        lesson.series_key = build_series_key(
+            lesson.subject_id,
+            [group.pk for group in lesson.groups.all()],
+            [teacher.pk for teacher in lesson.teachers.all()],
+        )
+    Lesson.objects.bulk_update(lessons, ["series_key"], batch_size=1000)
+
+
+# Fields of lessons whose relations are part of the series key, by their through models
+LESSON_SERIES_M2M_FIELDS = {
+    Lesson.groups.through: "groups",
+    Lesson.teachers.through: "teachers",
+}
+
+
+def lesson_series_changed(
+    sender: type, instance: Model, action: str, reverse: bool, pk_set: set, **kwargs: Any
+):
+    """Update the series keys of lessons after their groups or teachers have changed.
+
+    If all lessons of a group or teacher are removed, only these lessons are updated.
+    """
+    if action == "pre_clear" and reverse:
+        field = LESSON_SERIES_M2M_FIELDS[sender]
+        instance._cleared_series_lessons = list(
+            Lesson.objects.filter(**{field: instance}).values_list("pk", flat=True)
+        )
+        return
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        instance.update_series_key()
+        return
+
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_series_lessons", None)
+    if pk_set:
+        _update_series_keys(Lesson.objects.filter(pk__in=pk_set))
+
+
+def connect_lesson_series_handlers(dispatch_uid: str = "chronos_lesson_series"):
+    """Connect all signal handlers needed for keeping the series keys of lessons up to date."""
+    pre_save.connect(lesson_pre_save, sender=Lesson, dispatch_uid=dispatch_uid)
+    post_save.connect(lesson_saved, sender=Lesson, dispatch_uid=dispatch_uid)
+
+    for through in LESSON_SERIES_M2M_FIELDS:
+        m2m_changed.connect(
+            lesson_series_changed,
+            sender=through,
+            dispatch_uid=f"{dispatch_uid}_{through.__name__}",
+        )
+
+
+def timetable_directory_changed(sender: type, **kwargs: Any):
+    """Make the timetable directory be rebuilt after lessons or groups changed."""
+    if kwargs.get("action", "post_").startswith("post_"):
+        invalidate_timetable_directory()
+
+
+def connect_timetable_directory_handlers(dispatch_uid: str = "chronos_timetable_directory"):
+    """Connect all signal handlers needed for rebuilding the timetable directory."""
+    for model in (Lesson, LessonPeriod, Group, ValidityRange):
+        post_save.connect(
+            timetable_directory_changed,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+        post_delete.connect(
+            timetable_directory_changed,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+
+    for field in (Lesson.teachers, Lesson.groups, Group.parent_groups):
+        through = field.through
+        m2m_changed.connect(
+            timetable_directory_changed,
+            sender=through,
+            dispatch_uid=f"{dispatch_uid}_{through.__name__}",
+        )
+
+
+def view_data_changed(sender: type, **kwargs: Any):
+    """Mark data shown in timetable and substitution views as changed."""
+    if kwargs.get("action", "post_").startswith("post_"):
+        invalidate_view_data()
+        publish_change()
+
+
+def connect_view_data_handlers(dispatch_uid: str = "chronos_view_data"):
+    """Connect all signal handlers needed for answering conditional requests to views."""
+    for model in (Announcement, AnnouncementRecipient, Absence):
+        post_save.connect(
+            view_data_changed, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+        post_delete.connect(
+            view_data_changed, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+
+
+def change_feed_saved(sender: type, instance: Model, created: bool, **kwargs: Any):
+    """Record a created or updated substitution, extra lesson or event in the change feed."""
+    record_change(instance, TimetableChange.CREATED if created else TimetableChange.UPDATED)
+    publish_change()
+
+
+def change_feed_deleted(sender: type, instance: Model, **kwargs: Any):
+    """Record a deleted substitution, extra lesson or event in the change feed."""
+    record_change(instance, TimetableChange.DELETED)
+    publish_change()
+
+
+def change_feed_m2m_changed(
+    sender: type, instance: Model, action: str, reverse: bool, model: type, pk_set: set, **kwargs
+):
+    """Record substitutions, extra lessons or events as updated after their relations changed."""
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        record_change(instance, TimetableChange.UPDATED)
+    elif pk_set:
+        for obj in model.objects.filter(pk__in=pk_set):
+            record_change(obj, TimetableChange.UPDATED)
+    publish_change()
+
+
+def connect_change_feed_handlers(dispatch_uid: str = "chronos_change_feed"):
+    """Connect all signal handlers needed for recording the change feed."""
+    for model in (LessonSubstitution, SupervisionSubstitution, ExtraLesson, Event):
+        post_save.connect(
+            change_feed_saved, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+        post_delete.connect(
+            change_feed_deleted, sender=model, dispatch_uid=f"{dispatch_uid}_{model.__name__}"
+        )
+
+    for field in (
+        LessonSubstitution.teachers,
+        ExtraLesson.groups,
+        ExtraLesson.teachers,
+        Event.groups,
+        Event.rooms,
+        Event.teachers,
+    ):
+        through = field.through
+        m2m_changed.connect(
+            change_feed_m2m_changed,
+            sender=through,
+            dispatch_uid=f"{dispatch_uid}_{through.__name__}",
+        )
+
+
+def _mark_substitution_snapshots_outdated():
+    """Mark the pre-rendered substitution plans as outdated and schedule their rendering.
+
+    The plans are only rendered by a Celery task, so that editors don't have
+    to wait for them. Without Celery, outdated plans are rendered by running
+    `chronos_render_substitutions --outdated` regularly.
+    """
+    if mark_snapshots_outdated() and is_celery_enabled():
+        render_substitution_snapshots_task()
+
+
+def substitution_snapshots_changed(sender: type, **kwargs: Any):
+    """Mark the pre-rendered substitution plans as outdated after substitution data changed.
+
+    They are marked once the transaction has been committed, so changes which
+    are rolled back don't cause any rendering.
+    """
+    if not kwargs.get("action", "post_").startswith("post_"):
+        return
+
+    if get_site_preferences()["chronos__substitutions_snapshots"]:
+        transaction.on_commit(_mark_substitution_snapshots_outdated)
+
+
+def connect_substitution_snapshot_handlers(dispatch_uid: str = "chronos_substitution_snapshots"):
+    """Connect all signal handlers needed for keeping pre-rendered substitution plans current."""
+    for model in (
+        LessonSubstitution,
+        SupervisionSubstitution,
+        ExtraLesson,
+        Event,
+        Absence,
+        Announcement,
+        AnnouncementRecipient,
+    ):
+        post_save.connect(
+            substitution_snapshots_changed,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+        post_delete.connect(
+            substitution_snapshots_changed,
+            sender=model,
+            dispatch_uid=f"{dispatch_uid}_{model.__name__}",
+        )
+
+    for field in (LessonSubstitution.teachers, ExtraLesson.groups, ExtraLesson.teachers):
+        through = field.through
+        m2m_changed.connect(
+            substitution_snapshots_changed,
+            sender=through,
+            dispatch_uid=f"{dispatch_uid}_{through.__name__}",
+        )
@@ -0,0 +1,37 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from aleksis.apps.chronos.util.benchmark import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Measure wall time and queries of building timetables and substitutions"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=date.fromisoformat,
+            help="Day to build timetables for (YYYY-MM-DD, defaults to the next relevant day)",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Number of measured runs")
+        parser.add_argument("--json", action="store_true", help="Output the results as JSON")
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(options["date"], max(options["repeat"], 1))
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"database": connection.vendor, "results": results}))
+            return
+
+        self.stdout.write(f"Database: {connection.vendor}")
+        self.stdout.write(
+            f"{'Path':<36} {'Cache':<6} {'Min ms':>9} {'Median ms':>10} {'Queries':>8}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<36} {result['cache']:<6} {result['min_ms']:>9.1f} "
+                f"{result['median_ms']:>10.1f} {result['queries']:>8}"
+            )
@@ -0,0 +1,67 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aleksis.apps.chronos.util.sample_data import generate_school_data
+
+
+class Command(BaseCommand):
+    help = "Generate the timetable data of a synthetic school for testing and benchmarks"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix", default="Sample", help="Name of the school term and prefix of all names"
+        )
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="Day in the first week of the school term (YYYY-MM-DD, defaults to today)",
+        )
+        parser.add_argument("--weeks", type=int, default=20, help="Length of the school term")
+        parser.add_argument("--validity-ranges", type=int, default=2)
+        parser.add_argument("--grades", type=int, default=6)
+        parser.add_argument("--classes-per-grade", type=int, default=3)
+        parser.add_argument("--students-per-class", type=int, default=25)
+        parser.add_argument("--teachers", type=int, default=60)
+        parser.add_argument("--rooms", type=int, default=40)
+        parser.add_argument("--periods-per-day", type=int, default=8)
+        parser.add_argument("--periods-per-class", type=int, default=30)
+        parser.add_argument("--substitutions", type=int, default=300)
+        parser.add_argument("--supervision-substitutions", type=int, default=30)
+        parser.add_argument("--events", type=int, default=20)
+        parser.add_argument("--extra-lessons", type=int, default=30)
+        parser.add_argument("--holidays", type=int, default=2)
+        parser.add_argument("--absences", type=int, default=30)
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+
+    def handle(self, *args, **options):
+        kwargs = {
+            key: options[key]
+            for key in (
+                "prefix",
+                "start",
+                "weeks",
+                "validity_ranges",
+                "grades",
+                "classes_per_grade",
+                "students_per_class",
+                "teachers",
+                "rooms",
+                "periods_per_day",
+                "periods_per_class",
+                "substitutions",
+                "supervision_substitutions",
+                "events",
+                "extra_lessons",
+                "holidays",
+                "absences",
+                "seed",
+            )
+        }
+        try:
+            counts = generate_school_data(**kwargs)
+        except ValueError as e:
+            raise CommandError(e)
+
+        for model_name, count in counts.items():
+            self.stdout.write(f"{model_name}: {count}")
@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from aleksis.apps.chronos.util.widget import precompute_widget_payloads
+
+
+class Command(BaseCommand):
+    help = "Precompute the timetable widget of all persons with a timetable"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=date.fromisoformat,
+            help="Day to precompute (YYYY-MM-DD, defaults to the next relevant day)",
+        )
+
+    def handle(self, *args, **options):
+        count = precompute_widget_payloads(options["date"])
+        self.stdout.write(f"{count} timetable widgets have been precomputed.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from aleksis.apps.chronos.util.changes import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete old changes from the change feed of substitutions"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Number of days to keep changes (defaults to the site preference)",
+        )
+
+    def handle(self, *args, **options):
+        count = prune_changes(options["days"])
+        self.stdout.write(f"{count} changes have been deleted.")
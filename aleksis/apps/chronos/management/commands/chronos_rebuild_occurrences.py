@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aleksis.apps.chronos.util.occurrences import rebuild_occurrences
+
+
+class Command(BaseCommand):
+    help = "Regenerate the lesson occurrence table"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start", type=date.fromisoformat, help="First date to regenerate (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--end", type=date.fromisoformat, help="Last date to regenerate (YYYY-MM-DD)"
+        )
+
+    def handle(self, *args, **options):
+        if bool(options["start"]) != bool(options["end"]):
+            raise CommandError("Please provide both a start and an end date.")
+
+        count = rebuild_occurrences(options["start"], options["end"])
+        self.stdout.write(f"{count} lesson occurrences have been generated.")
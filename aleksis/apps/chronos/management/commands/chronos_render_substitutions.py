@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from aleksis.apps.chronos.util.snapshots import (
+    get_snapshots_root,
+    render_substitution_snapshots,
+    snapshots_outdated,
+)
+
+
+class Command(BaseCommand):
+    help = "Pre-render the substitution plans of the next relevant days into static files"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Number of days to render (defaults to the number of days on the print view)",
+        )
+        parser.add_argument(
+            "--outdated",
+            action="store_true",
+            help="Only render if substitution data has changed since the last rendering",
+        )
+
+    def handle(self, *args, **options):
+        if options["outdated"] and not snapshots_outdated():
+            self.stdout.write("Substitution plans are up to date.")
+            return
+
+        manifest = render_substitution_snapshots(options["days"])
+        self.stdout.write(
+            f"Substitution plans of {len(manifest['days'])} days have been rendered "
+            f"as version {manifest['version']} into {get_snapshots_root()}."
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from aleksis.apps.chronos.util.caching import (
+    get_timetable_cache_stats,
+    invalidate_timetable_cache,
+    reset_timetable_cache_stats,
+)
+
+
+class Command(BaseCommand):
+    help = "Show hit and miss counters of the timetable cache"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset hit and miss counters after showing them"
+        )
+        parser.add_argument(
+            "--invalidate", action="store_true", help="Invalidate all cached timetables"
+        )
+
+    def handle(self, *args, **options):
+        stats = get_timetable_cache_stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total * 100 if total else 0
+        self.stdout.write(
+            f"Hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio:.1f} %"
+        )
+
+        if options["reset"]:
+            reset_timetable_cache_stats()
+            self.stdout.write("Counters have been reset.")
+
+        if options["invalidate"]:
+            invalidate_timetable_cache()
+            self.stdout.write("Cached timetables have been invalidated.")
@@ -4,9 +4,8 @@ from typing import Iterable, List, Optional, Union
 
 from django.contrib.sites.managers import CurrentSiteManager as _CurrentSiteManager
 from django.db import models
-from django.db.models import Count, ExpressionWrapper, F, Func, Q, QuerySet, Value
-from django.db.models.fields import DateField
-from django.db.models.functions import Concat
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, QuerySet, Window
+from django.db.models.functions import RowNumber
 
 from calendarweek import CalendarWeek
 
@@ -201,6 +200,27 @@ class BreakManager(CurrentSiteManager):
         return super().get_queryset().select_related("before_period", "after_period")
 
 
+class LessonOccurrenceManager(CurrentSiteManager):
+    """Manager adding specific methods to lesson occurrences."""
+
+    def get_queryset(self):
+        """Ensure all related data is loaded as well."""
+        return (
+            super()
+            .get_queryset()
+            .select_related(
+                "lesson_period",
+                "lesson_period__lesson",
+                "lesson_period__lesson__subject",
+                "lesson_period__room",
+                "period",
+                "subject",
+                "room",
+            )
+            .prefetch_related("teachers", "lesson_period__lesson__groups")
+        )
+
+
 class WeekQuerySetMixin:
     def annotate_week(self, week: Union[CalendarWeek]):
         """Annotate all lessons in the QuerySet with the number of the provided calendar week."""
@@ -210,26 +230,31 @@ class WeekQuerySetMixin:
         )
 
 
-class GroupByPeriodsMixin:
-    def group_by_periods(self, is_week: bool = False) -> dict:
-        """Group a QuerySet of objects with attribute period by period numbers and weekdays."""
-        per_period = {}
-        for obj in self:
-            period = obj.period.period
-            weekday = obj.period.weekday
+def group_by_periods(objs: Iterable, is_week: bool = False) -> dict:
+    """Group objects with attribute period by period numbers and weekdays."""
+    per_period = {}
+    for obj in objs:
+        period = obj.period.period
+        weekday = obj.period.weekday
 
-            if period not in per_period:
-                per_period[period] = [] if not is_week else {}
+        if period not in per_period:
+            per_period[period] = [] if not is_week else {}
 
-            if is_week and weekday not in per_period[period]:
-                per_period[period][weekday] = []
+        if is_week and weekday not in per_period[period]:
+            per_period[period][weekday] = []
 
-            if not is_week:
-                per_period[period].append(obj)
-            else:
-                per_period[period][weekday].append(obj)
+        if not is_week:
+            per_period[period].append(obj)
+        else:
+            per_period[period][weekday].append(obj)
 
-        return per_period
+    return per_period
+
+
+class GroupByPeriodsMixin:
+    def group_by_periods(self, is_week: bool = False) -> dict:
+        """Group a QuerySet of objects with attribute period by period numbers and weekdays."""
+        return group_by_periods(self, is_week=is_week)
 
 
 class LessonDataQuerySet(models.QuerySet, WeekQuerySetMixin):
@@ -307,31 +332,37 @@ class LessonDataQuerySet(models.QuerySet, WeekQuerySetMixin):
             | Q(**{self._period_path + "lesson__groups__parent_groups__in": groups})
         )
 
-    def filter_teacher(self, teacher: Union[Person, int]):
-        """Filter for all lessons given by a certain teacher."""
-        qs1 = self.filter(**{self._period_path + "lesson__teachers": teacher})
-        qs2 = self.filter(
-            **{
-                self._subst_path + "teachers": teacher,
-                self._subst_path + "week": F("_week"),
-                self._subst_path + "year": F("_year"),
-            }
+    def _substitutions_in_annotated_week(self) -> QuerySet:
+        """Get a subquery of the substitutions belonging to the lessons in the annotated week."""
+        from .models import LessonSubstitution  # noqa
+
+        if not self._subst_path:
+            return LessonSubstitution.objects.filter(pk=OuterRef("pk"))
+
+        return LessonSubstitution.objects.filter(
+            lesson_period=OuterRef("pk"), week=OuterRef("_week"), year=OuterRef("_year")
         )
 
-        return qs1.union(qs2)
+    def filter_teacher(self, teacher: Union[Person, int]):
+        """Filter for all lessons given by a certain teacher.
+
+        This includes lessons the teacher substitutes in the annotated week.
+        """
+        from .models import Lesson  # noqa
+
+        lessons = Lesson.objects.filter(pk=OuterRef(self._period_path + "lesson"), teachers=teacher)
+        substitutions = self._substitutions_in_annotated_week().filter(teachers=teacher)
+
+        return self.filter(Q(Exists(lessons)) | Q(Exists(substitutions)))
 
     def filter_room(self, room: Union["Room", int]):
-        """Filter for all lessons taking part in a certain room."""
-        qs1 = self.filter(**{self._period_path + "room": room})
-        qs2 = self.filter(
-            **{
-                self._subst_path + "room": room,
-                self._subst_path + "week": F("_week"),
-                self._subst_path + "year": F("_year"),
-            }
-        )
+        """Filter for all lessons taking part in a certain room.
+
+        This includes lessons moved to this room in the annotated week.
+        """
+        substitutions = self._substitutions_in_annotated_week().filter(room=room)
 
-        return qs1.union(qs2)
+        return self.filter(Q(**{self._period_path + "room": room}) | Q(Exists(substitutions)))
 
     def filter_from_type(
         self, type_: TimetableType, obj: Union[Person, Group, "Room", int]
@@ -375,28 +406,62 @@ class LessonDataQuerySet(models.QuerySet, WeekQuerySetMixin):
 
         return lesson_periods
 
+    def _get_neighbour(self, reference: "LessonPeriod", offset: int) -> Optional["LessonPeriod"]:
+        """Get the lesson with an offset to a reference lesson in this ordered set of lessons.
+
+        The position is resolved by one query numbering the set with a window function.
+        Offsets beyond the ends of the set wrap around; the returned lesson then carries
+        its unwrapped position as `_index` and the size of the set as `_cnt`.
+        """
+        ordering = list(self.query.order_by or self.model._meta.ordering) + ["pk"]
+        order_by = [
+            F(field[1:]).desc() if field.startswith("-") else F(field).asc() for field in ordering
+        ]
+        numbered = (
+            self.select_related(None)
+            .prefetch_related(None)
+            .annotate(_rn=Window(RowNumber(), order_by=order_by), _cnt=Window(Count("pk")))
+            .order_by()
+        )
+        sql, params = numbered.query.sql_with_params()
+
+        neighbours = self.model.objects.raw(
+            f"WITH numbered AS ({sql}) "  # noqa: S608
+            "SELECT neighbour.*, reference._rn - 1 + %s AS _index "
+            "FROM numbered reference INNER JOIN numbered neighbour "
+            "ON neighbour._rn = ((reference._rn - 1 + %s) %% reference._cnt + reference._cnt) "
+            "%% reference._cnt + 1 "
+            "WHERE reference.id = %s",
+            [*params, offset, offset, reference.pk],
+        )
+        return next(iter(neighbours), None)
+
     def next_lesson(self, reference: "LessonPeriod", offset: Optional[int] = 1) -> "LessonPeriod":
         """Get another lesson in an ordered set of lessons.
 
         By default, it returns the next lesson in the set. By passing the offset argument,
         the n-th next lesson can be selected. By passing a negative number, the n-th
-        previous lesson can be selected.
+        previous lesson can be selected. Offsets beyond the ends of the set continue
+        in the following or preceding weeks.
         """
-        index = list(self.values_list("id", flat=True)).index(reference.id)
-
-        next_index = index + offset
-        if next_index > self.count() - 1:
-            next_index %= self.count()
-            week = reference._week + 1
-        elif next_index < 0:
-            next_index = self.count() + next_index
-            week = reference._week - 1
-        else:
-            week = reference._week
+        neighbour = self._get_neighbour(reference, offset)
+        if neighbour is None:
+            return None
+
+        neighbour.annotate_week(reference.week + neighbour._index // neighbour._cnt)
+        return neighbour
 
-        week = CalendarWeek(week=week, year=reference.lesson.get_year(week))
+    def adjacent_lesson(
+        self, reference: "LessonPeriod", offset: Optional[int] = 1
+    ) -> Optional["LessonPeriod"]:
+        """Get another lesson in an ordered set of lessons without continuing in other weeks."""
+        neighbour = self._get_neighbour(reference, offset)
+        if neighbour is None or not 0 <= neighbour._index < neighbour._cnt:
+            return None
 
-        return self.annotate_week(week).all()[next_index]
+        if reference.week:
+            neighbour.annotate_week(reference.week)
+        return neighbour
 
 
 class LessonPeriodQuerySet(LessonDataQuerySet, GroupByPeriodsMixin):
@@ -405,6 +470,38 @@ class LessonPeriodQuerySet(LessonDataQuerySet, GroupByPeriodsMixin):
     _period_path = ""
     _subst_path = "substitutions__"
 
+    def annotate_week(self, week: CalendarWeek):
+        """Annotate all lessons with the provided calendar week and prefetch its substitutions."""
+        return super().annotate_week(week).prefetch_substitutions(week)
+
+    def prefetch_substitutions(self, week: CalendarWeek) -> "LessonPeriodQuerySet":
+        """Prefetch only the substitutions of the lesson periods in the provided week.
+
+        They are used by `LessonPeriod.get_substitution` when asked for the annotated week,
+        so the substitutions of all weeks aren't prefetched anymore.
+        """
+        from .models import LessonSubstitution  # noqa
+
+        substitutions = (
+            LessonSubstitution.objects.filter(week=week.week, year=week.year)
+            .select_related(None)
+            .select_related("subject", "room")
+            .prefetch_related(None)
+            .prefetch_related("teachers")
+        )
+
+        # Replace substitutions prefetched for all weeks or for another week
+        qs = self._chain()
+        qs._prefetch_related_lookups = tuple(
+            lookup
+            for lookup in qs._prefetch_related_lookups
+            if lookup != "substitutions"
+            and getattr(lookup, "to_attr", None) != "_week_substitutions"
+        )
+        return qs.prefetch_related(
+            Prefetch("substitutions", queryset=substitutions, to_attr="_week_substitutions")
+        )
+
 
 class LessonSubstitutionQuerySet(LessonDataQuerySet):
     """QuerySet with custom query methods for substitutions."""
@@ -414,39 +511,34 @@ class LessonSubstitutionQuerySet(LessonDataQuerySet):
 
     def within_dates(self, start: date, end: date):
         """Filter for all substitutions within a date range."""
-        start_week = CalendarWeek.from_date(start)
-        end_week = CalendarWeek.from_date(end)
-        return self.filter(
-            week__gte=start_week.week,
-            week__lte=end_week.week,
-            year__gte=start_week.year,
-            year__lte=end_week.year,
-        ).filter(
-            Q(
-                week=start_week.week,
-                year=start_week.year,
-                lesson_period__period__weekday__gte=start.weekday(),
-            )
-            | Q(
-                week=end_week.week,
-                year=end_week.year,
-                lesson_period__period__weekday__lte=end.weekday(),
-            )
-            | (
-                ~Q(week=start_week.week, year=start_week.year)
-                & ~Q(week=end_week.week, year=end_week.year)
-            )
-        )
+        return self.filter(date__range=(start, end))
 
     def in_week(self, wanted_week: CalendarWeek):
         """Filter for all lessons within a calendar week."""
-        return self.filter(week=wanted_week.week, year=wanted_week.year).annotate_week(wanted_week)
+        return self.within_dates(wanted_week[0], wanted_week[6]).annotate_week(wanted_week)
 
     def on_day(self, day: date):
         """Filter for all lessons on a certain day."""
-        week, weekday = week_weekday_from_date(day)
+        return self.filter(date=day).annotate_week(CalendarWeek.from_date(day))
 
-        return self.in_week(week).filter(lesson_period__period__weekday=weekday)
+    def sync_dates(self) -> int:
+        """Update the stored dates of all substitutions whose lesson periods have moved.
+
+        Returns the number of updated substitutions.
+        """
+        subs = (
+            self.select_related(None).select_related("lesson_period__period").prefetch_related(None)
+        )
+
+        changed = []
+        for sub in subs:
+            new_date = sub.get_date()
+            if sub.date != new_date:
+                sub.date = new_date
+                changed.append(sub)
+
+        self.model.objects.bulk_update(changed, ["date"])
+        return len(changed)
 
     def at_time(self, when: Optional[datetime] = None):
         """Filter for the lessons taking place at a certain point in time."""
@@ -566,22 +658,24 @@ class SupervisionQuerySet(ValidityRangeRelatedQuerySet, WeekQuerySetMixin):
             | Q(break_item__after_period__weekday=weekday)
         )
 
-    def filter_by_teacher(self, teacher: Union[Person, int]):
-        """Filter for all supervisions given by a certain teacher."""
-        if self.count() > 0:
-            if hasattr(self[0], "_week"):
-                week = CalendarWeek(week=self[0]._week, year=self[0]._year)
-            else:
-                week = CalendarWeek.current_week()
+    def get_annotated_week(self) -> CalendarWeek:
+        """Get the week annotated to this QuerySet without evaluating it.
 
-            dates = [week[w] for w in range(0, 7)]
+        Defaults to the current week if no week is annotated.
+        """
+        annotations = self.query.annotations
+        if "_week" in annotations and "_year" in annotations:
+            return CalendarWeek(week=annotations["_week"].value, year=annotations["_year"].value)
+        return CalendarWeek()
 
-            return self.filter(
-                Q(substitutions__teacher=teacher, substitutions__date__in=dates)
-                | Q(teacher=teacher)
-            )
+    def filter_by_teacher(self, teacher: Union[Person, int]):
+        """Filter for all supervisions given by a certain teacher."""
+        week = self.get_annotated_week()
 
-        return self
+        return self.filter(
+            Q(substitutions__teacher=teacher, substitutions__date__range=(week[0], week[6]))
+            | Q(teacher=teacher)
+        ).distinct()
 
 
 class TimetableQuerySet(models.QuerySet):
@@ -672,31 +766,109 @@ class ExtraLessonQuerySet(TimetableQuerySet, SchoolTermRelatedQuerySet, GroupByP
 
     def within_dates(self, start: date, end: date):
         """Filter all extra lessons within a specific time range."""
-        return self.annotate_day().filter(day__gte=start, day__lte=end)
+        return self.filter(date__range=(start, end))
+
+    def in_week(self, wanted_week: CalendarWeek):
+        """Filter all extra lessons within a calendar week."""
+        return self.within_dates(wanted_week[0], wanted_week[6])
 
     def on_day(self, day: date):
         """Filter all extra lessons on a day."""
-        return self.within_dates(day, day)
-
-    def annotate_day(self):
-        weekday_to_date = ExpressionWrapper(
-            Func(
-                Concat(F("year"), F("week")),
-                Value("IYYYIW"),
-                output_field=DateField(),
-                function="TO_DATE",
-            )
-            + F("period__weekday"),
-            output_field=DateField(),
-        )
-        return self.annotate(day=weekday_to_date)
+        return self.filter(date=day)
 
     def exclude_holidays(self, holidays: Iterable["Holiday"]) -> QuerySet:
         """Exclude all extra lessons which are in the provided holidays."""
         q = Q()
         for holiday in holidays:
-            q = q | Q(day__lte=holiday.date_end, day__gte=holiday.date_start)
-        return self.annotate_day().exclude(q)
+            q = q | Q(date__range=(holiday.date_start, holiday.date_end))
+        return self.exclude(q)
+
+    def sync_dates(self) -> int:
+        """Update the stored dates of all extra lessons whose time periods have moved.
+
+        Returns the number of updated extra lessons.
+        """
+        extra_lessons = self.select_related(None).select_related("period").prefetch_related(None)
+
+        changed = []
+        for extra_lesson in extra_lessons:
+            new_date = extra_lesson.get_date()
+            if extra_lesson.date != new_date:
+                extra_lesson.date = new_date
+                changed.append(extra_lesson)
+
+        self.model.objects.bulk_update(changed, ["date"])
+        return len(changed)
+
+
+class LessonOccurrenceQuerySet(QuerySet):
+    """QuerySet with custom query methods for lesson occurrences."""
+
+    def within_dates(self, start: date, end: date):
+        """Filter for all occurrences within a date range."""
+        return self.filter(date__range=(start, end))
+
+    def in_week(self, wanted_week: CalendarWeek):
+        """Filter for all occurrences within a calendar week."""
+        return self.within_dates(wanted_week[0], wanted_week[6])
+
+    def on_day(self, day: date):
+        """Filter for all occurrences on a certain day."""
+        return self.filter(date=day)
+
+    def filter_participant(self, person: Union[Person, int]):
+        """Filter for all occurrences a participant (student) attends."""
+        return self.filter(lesson_period__lesson__groups__members=person).distinct()
+
+    def filter_group(self, group: Union[Group, int]):
+        """Filter for all occurrences a group (class) regularly attends."""
+        if isinstance(group, int):
+            group = Group.objects.get(pk=group)
+
+        if group.parent_groups.all():
+            # Prevent to show lessons multiple times
+            return self.filter(lesson_period__lesson__groups=group)
+        else:
+            return self.filter(
+                Q(lesson_period__lesson__groups=group)
+                | Q(lesson_period__lesson__groups__parent_groups=group)
+            ).distinct()
+
+    def filter_teacher(self, teacher: Union[Person, int]):
+        """Filter for all occurrences given by a certain teacher.
+
+        As in the smart timetable, this includes both the substituted lessons
+        of the teacher and the lessons the teacher substitutes.
+        """
+        from .models import Lesson, LessonOccurrence  # noqa
+
+        lessons = Lesson.objects.filter(pk=OuterRef("lesson_period__lesson"), teachers=teacher)
+        occurrences = LessonOccurrence.teachers.through.objects.filter(
+            lessonoccurrence=OuterRef("pk"), person=teacher
+        )
+
+        return self.filter(Q(Exists(lessons)) | Q(Exists(occurrences)))
+
+    def filter_room(self, room: Union["Room", int]):
+        """Filter for all occurrences taking place in a certain room.
+
+        As in the smart timetable, this includes both the lessons moved away
+        from the room and the lessons moved to it.
+        """
+        return self.filter(Q(lesson_period__room=room) | Q(room=room))
+
+    def filter_from_type(
+        self, type_: TimetableType, obj: Union[Group, Person, "Room", int]
+    ) -> Optional[models.QuerySet]:
+        """Filter occurrences for a group, teacher or room by provided type."""
+        if type_ == TimetableType.GROUP:
+            return self.filter_group(obj)
+        elif type_ == TimetableType.TEACHER:
+            return self.filter_teacher(obj)
+        elif type_ == TimetableType.ROOM:
+            return self.filter_room(obj)
+        else:
+            return None
 
 
 class GroupPropertiesMixin:
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+from calendarweek import CalendarWeek
+
+
+def fill_dates(apps, schema_editor):
+    LessonSubstitution = apps.get_model("chronos", "LessonSubstitution")
+
+    db_alias = schema_editor.connection.alias
+
+    subs = []
+    for sub in (
+        LessonSubstitution.objects.using(db_alias).select_related("lesson_period__period").all()
+    ):
+        sub.date = CalendarWeek(week=sub.week, year=sub.year)[sub.lesson_period.period.weekday]
+        subs.append(sub)
+
+    LessonSubstitution.objects.using(db_alias).bulk_update(subs, ["date"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chronos", "0004_substitution_extra_lesson_year"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lessonsubstitution",
+            name="date",
+            field=models.DateField(editable=False, null=True, verbose_name="Date"),
+        ),
+        migrations.RunPython(fill_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="lessonsubstitution",
+            name="date",
+            field=models.DateField(db_index=True, editable=False, verbose_name="Date"),
+        ),
+    ]
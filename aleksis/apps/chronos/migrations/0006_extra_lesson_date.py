@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+from calendarweek import CalendarWeek
+
+
+def fill_dates(apps, schema_editor):
+    ExtraLesson = apps.get_model("chronos", "ExtraLesson")
+
+    db_alias = schema_editor.connection.alias
+
+    extra_lessons = []
+    for extra_lesson in ExtraLesson.objects.using(db_alias).select_related("period").all():
+        week = CalendarWeek(week=extra_lesson.week, year=extra_lesson.year)
+        extra_lesson.date = week[extra_lesson.period.weekday]
+        extra_lessons.append(extra_lesson)
+
+    ExtraLesson.objects.using(db_alias).bulk_update(extra_lessons, ["date"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chronos", "0005_lesson_substitution_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="extralesson",
+            name="date",
+            field=models.DateField(editable=False, null=True, verbose_name="Date"),
+        ),
+        migrations.RunPython(fill_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="extralesson",
+            name="date",
+            field=models.DateField(db_index=True, editable=False, verbose_name="Date"),
+        ),
+    ]
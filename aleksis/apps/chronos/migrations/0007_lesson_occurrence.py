@@ -0,0 +1,114 @@
+import django.contrib.postgres.fields.jsonb
+import django.contrib.sites.managers
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_drop_image_cropping"),
+        ("sites", "0002_alter_domain_unique"),
+        ("chronos", "0006_extra_lesson_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LessonOccurrence",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "extended_data",
+                    django.contrib.postgres.fields.jsonb.JSONField(default=dict, editable=False),
+                ),
+                ("date", models.DateField(db_index=True, verbose_name="Date")),
+                ("cancelled", models.BooleanField(default=False, verbose_name="Cancelled?")),
+                (
+                    "cancelled_for_teachers",
+                    models.BooleanField(default=False, verbose_name="Cancelled for teachers?"),
+                ),
+                ("comment", models.TextField(blank=True, null=True, verbose_name="Comment")),
+                (
+                    "lesson_period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occurrences",
+                        to="chronos.LessonPeriod",
+                        verbose_name="Lesson period",
+                    ),
+                ),
+                (
+                    "period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occurrences",
+                        to="chronos.TimePeriod",
+                        verbose_name="Time period",
+                    ),
+                ),
+                (
+                    "room",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occurrences",
+                        to="chronos.Room",
+                        verbose_name="Room",
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        default=1,
+                        editable=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="sites.Site",
+                    ),
+                ),
+                (
+                    "subject",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occurrences",
+                        to="chronos.Subject",
+                        verbose_name="Subject",
+                    ),
+                ),
+                (
+                    "substitution",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="occurrences",
+                        to="chronos.LessonSubstitution",
+                        verbose_name="Substitution",
+                    ),
+                ),
+                (
+                    "teachers",
+                    models.ManyToManyField(
+                        blank=True,
+                        related_name="lesson_occurrences",
+                        to="core.Person",
+                        verbose_name="Teachers",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Lesson occurrence",
+                "verbose_name_plural": "Lesson occurrences",
+                "ordering": ["date", "period__period"],
+                "unique_together": {("lesson_period", "date")},
+            },
+            managers=[
+                ("objects", django.contrib.sites.managers.CurrentSiteManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+from aleksis.apps.chronos.util.series import build_series_key
+
+
+def fill_series_keys(apps, schema_editor):
+    Lesson = apps.get_model("chronos", "Lesson")
+
+    db_alias = schema_editor.connection.alias
+
+    lessons = []
+    for lesson in Lesson.objects.using(db_alias).prefetch_related("groups", "teachers"):
+        lesson.series_key = build_series_key(
+            lesson.subject_id,
+            [group.pk for group in lesson.groups.all()],
+            [teacher.pk for teacher in lesson.teachers.all()],
+        )
+        lessons.append(lesson)
+
+    Lesson.objects.using(db_alias).bulk_update(lessons, ["series_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chronos", "0007_lesson_occurrence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lesson",
+            name="series_key",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                max_length=40,
+                verbose_name="Series key",
+            ),
+        ),
+        migrations.RunPython(fill_series_keys, migrations.RunPython.noop),
+    ]
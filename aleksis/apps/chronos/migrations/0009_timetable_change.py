@@ -0,0 +1,73 @@
+import django.contrib.postgres.fields.jsonb
+import django.contrib.sites.managers
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("sites", "0002_alter_domain_unique"),
+        ("chronos", "0008_lesson_series_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimetableChange",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "extended_data",
+                    django.contrib.postgres.fields.jsonb.JSONField(default=dict, editable=False),
+                ),
+                ("object_id", models.PositiveIntegerField(verbose_name="Object ID")),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("updated", "Updated"),
+                            ("deleted", "Deleted"),
+                        ],
+                        max_length=10,
+                        verbose_name="Action",
+                    ),
+                ),
+                ("date_start", models.DateField(null=True, verbose_name="Start date")),
+                ("date_end", models.DateField(null=True, verbose_name="End date")),
+                ("changed_at", models.DateTimeField(auto_now_add=True, verbose_name="Changed at")),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="contenttypes.ContentType",
+                        verbose_name="Content type",
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        default=1,
+                        editable=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="sites.Site",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Timetable change",
+                "verbose_name_plural": "Timetable changes",
+                "ordering": ["pk"],
+            },
+            managers=[
+                ("objects", django.contrib.sites.managers.CurrentSiteManager()),
+            ],
+        ),
+    ]
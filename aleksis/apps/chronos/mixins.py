@@ -1,4 +1,3 @@
-from datetime import date
 from typing import Union
 
 from django.db import models
@@ -6,7 +5,6 @@ from django.utils.translation import gettext as _
 
 from calendarweek import CalendarWeek
 
-from aleksis.apps.chronos.util.date import week_weekday_to_date
 from aleksis.core.managers import CurrentSiteManagerWithoutMigrations
 from aleksis.core.mixins import ExtensibleModel
 
@@ -32,11 +30,6 @@ class ValidityRangeRelatedExtensibleModel(ExtensibleModel):
 
 
 class WeekRelatedMixin:
-    @property
-    def date(self) -> date:
-        period = self.lesson_period.period if hasattr(self, "lesson_period") else self.period
-        return week_weekday_to_date(self.calendar_week, period.weekday)
-
     @property
     def calendar_week(self) -> CalendarWeek:
         return CalendarWeek(week=self.week, year=self.year)
@@ -9,20 +9,22 @@ from aleksis.core.models import Announcement, Group, Person
 
 from .managers import TimetableType
 from .models import Lesson, LessonPeriod, Subject
+from .util.roles import get_person_role
 
 
 @Person.property_
 def is_teacher(self):
     """Check if the user has lessons as a teacher."""
-    return self.lesson_periods_as_teacher.exists()
+    return get_person_role(self.pk)[0] == TimetableType.TEACHER
 
 
 @Person.property_
 def timetable_type(self) -> Optional[TimetableType]:
     """Return which type of timetable this user has."""
-    if self.is_teacher:
+    type_, primary_group_id = get_person_role(self.pk)
+    if type_ == TimetableType.TEACHER:
         return TimetableType.TEACHER
-    elif self.primary_group:
+    elif primary_group_id:
         return TimetableType.GROUP
     else:
         return None
@@ -93,22 +95,10 @@ def _adjacent_lesson(
     """Get next/previous lesson of the person (either as participant or teacher) on the same day."""
     daily_lessons = self.lessons_on_day(day)
 
-    if not daily_lessons:
-        return None
-
-    ids = list(daily_lessons.values_list("id", flat=True))
-
-    # Check if the lesson period is one of the person's lesson periods on this day
-    # and return None if it's not so
-    if lesson_period.pk not in ids:
+    if daily_lessons is None:
         return None
 
-    index = ids.index(lesson_period.pk)
-
-    if (offset > 0 and index + offset < len(ids)) or (offset < 0 and index >= -offset):
-        return daily_lessons[index + offset]
-    else:
-        return None
+    return daily_lessons.adjacent_lesson(lesson_period, offset)
 
 
 @Person.method
@@ -5,10 +5,10 @@ from __future__ import annotations
 from datetime import date, datetime, time, timedelta
 from typing import Dict, Iterator, List, Optional, Tuple, Union
 
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Max, Min, Q
-from django.db.models.functions import Coalesce
+from django.db.models import Q
 from django.forms import Media
 from django.urls import reverse
 from django.utils import timezone
@@ -16,7 +16,6 @@ from django.utils.formats import date_format
 from django.utils.functional import classproperty
 from django.utils.translation import gettext_lazy as _
 
-from cache_memoize import cache_memoize
 from calendarweek.django import CalendarWeek, i18n_day_abbr_choices_lazy, i18n_day_name_choices_lazy
 from colorfield.fields import ColorField
 
@@ -30,6 +29,8 @@ from aleksis.apps.chronos.managers import (
     ExtraLessonQuerySet,
     GroupPropertiesMixin,
     HolidayQuerySet,
+    LessonOccurrenceManager,
+    LessonOccurrenceQuerySet,
     LessonPeriodManager,
     LessonPeriodQuerySet,
     LessonSubstitutionManager,
@@ -45,8 +46,15 @@ from aleksis.apps.chronos.mixins import (
     WeekAnnotationMixin,
     WeekRelatedMixin,
 )
-from aleksis.apps.chronos.util.date import get_current_year
+from aleksis.apps.chronos.util.date import get_current_year, week_weekday_to_date
 from aleksis.apps.chronos.util.format import format_m2m
+from aleksis.apps.chronos.util.holidays import get_holiday_calendar
+from aleksis.apps.chronos.util.period_grid import (
+    PeriodGrid,
+    get_current_validity_range,
+    get_period_grid,
+)
+from aleksis.apps.chronos.util.series import build_series_key
 from aleksis.core.managers import CurrentSiteManagerWithoutMigrations
 from aleksis.core.mixins import ExtensibleModel, SchoolTermRelatedExtensibleModel
 from aleksis.core.models import DashboardWidget, SchoolTerm
@@ -73,14 +81,8 @@ class ValidityRange(ExtensibleModel):
     date_end = models.DateField(verbose_name=_("End date"))
 
     @classmethod
-    @cache_memoize(3600)
     def get_current(cls, day: Optional[date] = None):
-        if not day:
-            day = timezone.now().date()
-        try:
-            return cls.objects.on_day(day).first()
-        except ValidityRange.DoesNotExist:
-            return None
+        return get_current_validity_range(day)
 
     @classproperty
     def current(cls):
@@ -131,12 +133,8 @@ class TimePeriod(ValidityRangeRelatedExtensibleModel):
         return f"{self.get_weekday_display()}, {self.period}."
 
     @classmethod
-    def get_times_dict(cls) -> Dict[int, Tuple[datetime, datetime]]:
-        periods = {}
-        for period in cls.objects.for_current_or_all().all():
-            periods[period.period] = (period.time_start, period.time_end)
-
-        return periods
+    def get_times_dict(cls, day: Optional[date] = None) -> Dict[int, Tuple[datetime, datetime]]:
+        return cls.get_grid(day).get_times_dict()
 
     def get_date(self, week: Optional[CalendarWeek] = None) -> date:
         if isinstance(week, CalendarWeek):
@@ -167,24 +165,26 @@ class TimePeriod(ValidityRangeRelatedExtensibleModel):
         if day is None:
             day = timezone.now().date()
 
-        if time is not None and cls.time_max and not prev:
-            if time > cls.time_max:
+        grid = cls.get_grid(day)
+
+        if time is not None and grid.time_max and not prev:
+            if time > grid.time_max:
                 day += timedelta(days=1)
 
         cw = CalendarWeek.from_date(day)
 
-        if day.weekday() > cls.weekday_max:
+        if day.weekday() > grid.weekday_max:
             if prev:
-                day = cw[cls.weekday_max]
+                day = cw[grid.weekday_max]
             else:
                 cw += 1
-                day = cw[cls.weekday_min]
-        elif day.weekday() < TimePeriod.weekday_min:
+                day = cw[grid.weekday_min]
+        elif day.weekday() < grid.weekday_min:
             if prev:
                 cw -= 1
-                day = cw[cls.weekday_max]
+                day = cw[grid.weekday_max]
             else:
-                day = cw[cls.weekday_min]
+                day = cw[grid.weekday_min]
 
         return day
 
@@ -198,10 +198,11 @@ class TimePeriod(ValidityRangeRelatedExtensibleModel):
         time = when.time()
 
         week = CalendarWeek.from_date(day)
+        grid = cls.get_grid(day)
 
-        if cls.weekday_max and day.weekday() > cls.weekday_max:
+        if grid.weekday_max and day.weekday() > grid.weekday_max:
             week += 1
-        elif cls.time_max and time > cls.time_max and day.weekday() == cls.weekday_max:
+        elif grid.time_max and time > grid.time_max and day.weekday() == grid.weekday_max:
             week += 1
 
         return week
@@ -223,71 +224,41 @@ class TimePeriod(ValidityRangeRelatedExtensibleModel):
 
         This will respect the relation to validity ranges.
         """
-        return cls.objects.on_day(day).filter(period=period, weekday=day.weekday()).first()
+        return cls.get_grid(day).get_period(day.weekday(), period)
+
+    @classmethod
+    def get_grid(cls, day: Optional[date] = None) -> PeriodGrid:
+        """Get the period grid of the validity range a day is in (defaults to today)."""
+        return get_period_grid(day)
 
     @classproperty
-    @cache_memoize(3600)
     def period_min(cls) -> int:
-
-        return (
-            cls.objects.for_current_or_all()
-            .aggregate(period__min=Coalesce(Min("period"), 1))
-            .get("period__min")
-        )
+        return cls.get_grid().period_min
 
     @classproperty
-    @cache_memoize(3600)
     def period_max(cls) -> int:
-        return (
-            cls.objects.for_current_or_all()
-            .aggregate(period__max=Coalesce(Max("period"), 7))
-            .get("period__max")
-        )
+        return cls.get_grid().period_max
 
     @classproperty
-    @cache_memoize(3600)
     def time_min(cls) -> Optional[time]:
-        return cls.objects.for_current_or_all().aggregate(Min("time_start")).get("time_start__min")
+        return cls.get_grid().time_min
 
     @classproperty
-    @cache_memoize(3600)
     def time_max(cls) -> Optional[time]:
-        return cls.objects.for_current_or_all().aggregate(Max("time_end")).get("time_end__max")
+        return cls.get_grid().time_max
 
     @classproperty
-    @cache_memoize(3600)
     def weekday_min(cls) -> int:
-        return (
-            cls.objects.for_current_or_all()
-            .aggregate(weekday__min=Coalesce(Min("weekday"), 0))
-            .get("weekday__min")
-        )
+        return cls.get_grid().weekday_min
 
     @classproperty
-    @cache_memoize(3600)
     def weekday_max(cls) -> int:
-        return (
-            cls.objects.for_current_or_all()
-            .aggregate(weekday__max=Coalesce(Max("weekday"), 6))
-            .get("weekday__max")
-        )
+        return cls.get_grid().weekday_max
 
     @classproperty
-    @cache_memoize(3600)
     def period_choices(cls) -> List[Tuple[Union[str, int], str]]:
         """Build choice list of periods for usage within Django."""
-        time_periods = (
-            cls.objects.filter(weekday=cls.weekday_min)
-            .for_current_or_all()
-            .values("period", "time_start", "time_end")
-            .distinct()
-        )
-
-        period_choices = [("", "")] + [
-            (period, f"{period}.") for period in time_periods.values_list("period", flat=True)
-        ]
-
-        return period_choices
+        return cls.get_grid().get_period_choices()
 
     class Meta:
         unique_together = [["weekday", "period", "validity"]]
@@ -341,6 +312,20 @@ class Lesson(ValidityRangeRelatedExtensibleModel, GroupPropertiesMixin, TeacherP
     )
     groups = models.ManyToManyField("core.Group", related_name="lessons", verbose_name=_("Groups"))
 
+    # Identifies all lessons with the same subject, groups and teachers
+    series_key = models.CharField(
+        verbose_name=_("Series key"), max_length=40, blank=True, db_index=True, editable=False
+    )
+
+    def update_series_key(self):
+        """Recalculate the series key from subject, groups and teachers and store it."""
+        self.series_key = build_series_key(
+            self.subject_id,
+            self.groups.values_list("pk", flat=True),
+            self.teachers.values_list("pk", flat=True),
+        )
+        Lesson.objects.filter(pk=self.pk).update(series_key=self.series_key)
+
     def get_year(self, week: int) -> int:
         year = self.validity.date_start.year
         if week < int(self.validity.date_start.strftime("%V")):
@@ -395,14 +380,23 @@ class LessonSubstitution(ExtensibleModel, WeekRelatedMixin):
 
     comment = models.TextField(verbose_name=_("Comment"), blank=True, null=True)
 
+    # Resolved from week, year and the weekday of the lesson period on save
+    date = models.DateField(verbose_name=_("Date"), db_index=True, editable=False)
+
     def clean(self) -> None:
         if self.subject and self.cancelled:
             raise ValidationError(_("Lessons can only be either substituted or cancelled."))
 
-    @property
-    def date(self):
-        week = CalendarWeek(week=self.week, year=self.year)
-        return week[self.lesson_period.period.weekday]
+    def get_date(self) -> date:
+        """Resolve the date of this substitution from week, year and lesson period."""
+        return week_weekday_to_date(self.calendar_week, self.lesson_period.period.weekday)
+
+    def save(self, *args, **kwargs):
+        self.date = self.get_date()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "date" not in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["date"]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.lesson_period}, {date_format(self.date)}"
@@ -441,16 +435,40 @@ class LessonPeriod(WeekAnnotationMixin, TeacherPropertiesMixin, ExtensibleModel)
         "Room", models.CASCADE, null=True, related_name="lesson_periods", verbose_name=_("Room"),
     )
 
+    def annotate_week(self, week: CalendarWeek):
+        """Annotate this lesson period with a calendar week.
+
+        Substitutions prefetched for another week are discarded, so that
+        `get_substitution` doesn't use them for the new week.
+        """
+        if (week.week, week.year) != (getattr(self, "_week", None), getattr(self, "_year", None)):
+            self.__dict__.pop("_week_substitutions", None)
+            self.__dict__.pop("_week_substitutions_map", None)
+        super().annotate_week(week)
+
     def get_substitution(self, week: Optional[CalendarWeek] = None) -> LessonSubstitution:
         wanted_week = week or self.week or CalendarWeek()
-
-        # We iterate over all substitutions because this can make use of
+        key = (wanted_week.week, wanted_week.year)
+
+        # If only the substitutions of the annotated week were prefetched,
+        # use them instead of loading the substitutions of all weeks
+        if hasattr(self, "_week_substitutions") and key == (self._week, self._year):
+            if not hasattr(self, "_week_substitutions_map"):
+                self._week_substitutions_map = {
+                    (substitution.week, substitution.year): substitution
+                    for substitution in self._week_substitutions
+                }
+            return self._week_substitutions_map.get(key)
+
+        # Loading all substitutions only once per instance makes use of
         # prefetching when this model is loaded from outside, in contrast
         # to .filter()
-        for substitution in self.substitutions.all():
-            if substitution.week == wanted_week.week and substitution.year == wanted_week.year:
-                return substitution
-        return None
+        if not hasattr(self, "_substitutions_map"):
+            self._substitutions_map = {
+                (substitution.week, substitution.year): substitution
+                for substitution in self.substitutions.all()
+            }
+        return self._substitutions_map.get(key)
 
     def get_subject(self) -> Optional[Subject]:
         if self.get_substitution() and self.get_substitution().subject:
@@ -478,17 +496,11 @@ class LessonPeriod(WeekAnnotationMixin, TeacherPropertiesMixin, ExtensibleModel)
 
     @property
     def _equal_lessons(self):
-        """Get all lesson periods with equal lessons in the whole school term."""
-
-        qs = LessonPeriod.objects.filter(
-            lesson__subject=self.lesson.subject,
-            lesson__validity__school_term=self.lesson.validity.school_term,
+        """Get all lesson periods of the same lesson series in the whole school term."""
+        return LessonPeriod.objects.filter(
+            lesson__series_key=self.lesson.series_key,
+            lesson__validity__school_term_id=self.lesson.validity.school_term_id,
         )
-        for group in self.lesson.groups.all():
-            qs = qs.filter(lesson__groups=group)
-        for teacher in self.lesson.teachers.all():
-            qs = qs.filter(lesson__teachers=teacher)
-        return qs
 
     @property
     def next(self) -> "LessonPeriod":
@@ -524,32 +536,12 @@ class TimetableWidget(DashboardWidget):
     template = "chronos/widget.html"
 
     def get_context(self, request):
-        from aleksis.apps.chronos.util.build import build_timetable  # noqa
-
-        context = {"has_plan": True}
-        wanted_day = TimePeriod.get_next_relevant_day(timezone.now().date(), datetime.now().time())
+        from aleksis.apps.chronos.util.widget import get_widget_payload  # noqa
 
-        if has_person(request.user):
-            person = request.user.person
-            type_ = person.timetable_type
+        if not has_person(request.user):
+            return {"has_plan": False}
 
-            # Build timetable
-            timetable = build_timetable("person", person, wanted_day)
-
-            if type_ is None:
-                # If no student or teacher, redirect to all timetables
-                context["has_plan"] = False
-            else:
-                context["timetable"] = timetable
-                context["holiday"] = Holiday.on_day(wanted_day)
-                context["type"] = type_
-                context["day"] = wanted_day
-                context["periods"] = TimePeriod.get_times_dict()
-                context["smart"] = True
-        else:
-            context["has_plan"] = False
-
-        return context
+        return get_widget_payload(request.user.person)
 
     media = Media(css={"all": ("css/chronos/timetable.css",)})
 
@@ -692,28 +684,17 @@ class Holiday(ExtensibleModel):
 
     @classmethod
     def on_day(cls, day: date) -> Optional["Holiday"]:
-        holidays = cls.objects.on_day(day)
-        if holidays.exists():
-            return holidays[0]
-        else:
-            return None
+        return get_holiday_calendar().on_day(day)
 
     @classmethod
     def in_week(cls, week: CalendarWeek) -> Dict[int, Optional["Holiday"]]:
-        per_weekday = {}
-        holidays = Holiday.objects.in_week(week)
-
-        for weekday in range(TimePeriod.weekday_min, TimePeriod.weekday_max + 1):
-            holiday_date = week[weekday]
-            filtered_holidays = list(
-                filter(
-                    lambda h: holiday_date >= h.date_start and holiday_date <= h.date_end, holidays,
-                )
-            )
-            if filtered_holidays:
-                per_weekday[weekday] = filtered_holidays[0]
+        grid = TimePeriod.get_grid(week[0])
+        return get_holiday_calendar().in_week(week, grid.weekday_min, grid.weekday_max)
 
-        return per_weekday
+    @classmethod
+    def days_within(cls, start: date, end: date) -> List[date]:
+        """Get all days within a date range which are part of a holiday."""
+        return get_holiday_calendar().get_all_days(start, end)
 
     def __str__(self):
         return self.title
@@ -784,12 +765,8 @@ class Break(ValidityRangeRelatedExtensibleModel):
         return self.before_period.time_start if self.before_period else None
 
     @classmethod
-    def get_breaks_dict(cls) -> Dict[int, Tuple[datetime, datetime]]:
-        breaks = {}
-        for break_ in cls.objects.all():
-            breaks[break_.before_period_number] = break_
-
-        return breaks
+    def get_breaks_dict(cls, day: Optional[date] = None) -> Dict[int, "Break"]:
+        return dict(TimePeriod.get_grid(day).breaks)
 
     def __str__(self):
         return f"{self.name} ({self.short_name})"
@@ -916,7 +893,7 @@ class Event(SchoolTermRelatedExtensibleModel, GroupPropertiesMixin, TeacherPrope
         """
         day = getattr(self, "_date", timezone.now().date())
         if day != self.date_start:
-            return TimePeriod.from_period(TimePeriod.period_min, day)
+            return TimePeriod.from_period(TimePeriod.get_grid(day).period_min, day)
         else:
             return self.period_from
 
@@ -928,7 +905,7 @@ class Event(SchoolTermRelatedExtensibleModel, GroupPropertiesMixin, TeacherPrope
         """
         day = getattr(self, "_date", timezone.now().date())
         if day != self.date_end:
-            return TimePeriod.from_period(TimePeriod.period_max, day)
+            return TimePeriod.from_period(TimePeriod.get_grid(day).period_max, day)
         else:
             return self.period_to
 
@@ -950,15 +927,17 @@ class Event(SchoolTermRelatedExtensibleModel, GroupPropertiesMixin, TeacherPrope
 
     def get_start_weekday(self, week: CalendarWeek) -> int:
         """Get start date of an event in a specific week."""
-        if self.date_start < week[TimePeriod.weekday_min]:
-            return TimePeriod.weekday_min
+        weekday_min = TimePeriod.get_grid(week[0]).weekday_min
+        if self.date_start < week[weekday_min]:
+            return weekday_min
         else:
             return self.date_start.weekday()
 
     def get_end_weekday(self, week: CalendarWeek) -> int:
         """Get end date of an event in a specific week."""
-        if self.date_end > week[TimePeriod.weekday_max]:
-            return TimePeriod.weekday_max
+        weekday_max = TimePeriod.get_grid(week[0]).weekday_max
+        if self.date_end > week[weekday_max]:
+            return weekday_max
         else:
             return self.date_end.weekday()
 
@@ -1012,6 +991,20 @@ class ExtraLesson(
 
     comment = models.CharField(verbose_name=_("Comment"), blank=True, null=True, max_length=255)
 
+    # Resolved from week, year and the weekday of the time period on save
+    date = models.DateField(verbose_name=_("Date"), db_index=True, editable=False)
+
+    def get_date(self) -> date:
+        """Resolve the date of this extra lesson from week, year and time period."""
+        return week_weekday_to_date(self.calendar_week, self.period.weekday)
+
+    def save(self, *args, **kwargs):
+        self.date = self.get_date()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "date" not in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["date"]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.week}, {self.period}, {self.subject}"
 
@@ -1032,6 +1025,94 @@ class ExtraLesson(
         verbose_name_plural = _("Extra lessons")
 
 
+class LessonOccurrence(ExtensibleModel):
+    """Concrete occurrence of a lesson period on one date.
+
+    Occurrences are generated from lesson periods, their validity ranges and
+    substitutions (see `aleksis.apps.chronos.util.occurrences`) and carry the effective
+    subject, teachers, room and cancellation state. Days within holidays have no occurrences.
+    """
+
+    objects = LessonOccurrenceManager.from_queryset(LessonOccurrenceQuerySet)()
+
+    lesson_period = models.ForeignKey(
+        "LessonPeriod", models.CASCADE, related_name="occurrences", verbose_name=_("Lesson period"),
+    )
+    substitution = models.ForeignKey(
+        "LessonSubstitution",
+        models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="occurrences",
+        verbose_name=_("Substitution"),
+    )
+    date = models.DateField(verbose_name=_("Date"), db_index=True)
+    period = models.ForeignKey(
+        "TimePeriod", models.CASCADE, related_name="occurrences", verbose_name=_("Time period"),
+    )
+
+    subject = models.ForeignKey(
+        "Subject", models.CASCADE, null=True, related_name="occurrences", verbose_name=_("Subject"),
+    )
+    teachers = models.ManyToManyField(
+        "core.Person", related_name="lesson_occurrences", blank=True, verbose_name=_("Teachers")
+    )
+    room = models.ForeignKey(
+        "Room", models.CASCADE, null=True, related_name="occurrences", verbose_name=_("Room")
+    )
+
+    cancelled = models.BooleanField(default=False, verbose_name=_("Cancelled?"))
+    cancelled_for_teachers = models.BooleanField(
+        default=False, verbose_name=_("Cancelled for teachers?")
+    )
+    comment = models.TextField(verbose_name=_("Comment"), blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.lesson_period}, {date_format(self.date)}"
+
+    class Meta:
+        unique_together = [["lesson_period", "date"]]
+        ordering = ["date", "period__period"]
+        verbose_name = _("Lesson occurrence")
+        verbose_name_plural = _("Lesson occurrences")
+
+
+class TimetableChange(ExtensibleModel):
+    """Recorded change of a substitution, an extra lesson or an event.
+
+    Changes are recorded after their transaction has been committed and numbered
+    by their primary key, so clients can fetch all changes after the last one
+    they have seen.
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ACTION_CHOICES = [
+        (CREATED, _("Created")),
+        (UPDATED, _("Updated")),
+        (DELETED, _("Deleted")),
+    ]
+
+    content_type = models.ForeignKey(
+        ContentType, models.CASCADE, related_name="+", verbose_name=_("Content type")
+    )
+    object_id = models.PositiveIntegerField(verbose_name=_("Object ID"))
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name=_("Action"))
+
+    date_start = models.DateField(verbose_name=_("Start date"), null=True)
+    date_end = models.DateField(verbose_name=_("End date"), null=True)
+    changed_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Changed at"))
+
+    def __str__(self):
+        return f"{self.pk}: {self.content_type} {self.object_id} {self.action}"
+
+    class Meta:
+        ordering = ["pk"]
+        verbose_name = _("Timetable change")
+        verbose_name_plural = _("Timetable changes")
+
+
 class ChronosGlobalPermissions(ExtensibleModel):
     class Meta:
         managed = False
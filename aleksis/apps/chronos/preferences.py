@@ -1,7 +1,7 @@
 from django.utils.translation import gettext as _
 
 from dynamic_preferences.preferences import Section
-from dynamic_preferences.types import BooleanPreference, IntegerPreference
+from dynamic_preferences.types import BooleanPreference, IntegerPreference, StringPreference
 
 from aleksis.core.registries import person_preferences_registry, site_preferences_registry
 
@@ -67,3 +67,43 @@ class AffectedGroupsUseParentGroups(BooleanPreference):
     verbose_name = _(
         "Show parent groups in header box in substitution views instead of original groups"
     )
+
+
+@site_preferences_registry.register
+class SubstitutionsSnapshots(BooleanPreference):
+    section = chronos
+    name = "substitutions_snapshots"
+    default = False
+    verbose_name = _("Pre-render substitution plans after changes")
+    help_text = _(
+        "Render the substitution plans of the next days into static files"
+        " whenever substitution data changes, e. g. for display boards."
+        " Without Celery, run chronos_render_substitutions --outdated regularly."
+    )
+
+
+@site_preferences_registry.register
+class ChangesRetentionDays(IntegerPreference):
+    section = chronos
+    name = "changes_retention_days"
+    default = 30
+    verbose_name = _("Number of days changes of substitutions are kept in the change feed")
+
+
+@site_preferences_registry.register
+class ChangesPrunedUntil(IntegerPreference):
+    section = chronos
+    name = "changes_pruned_until"
+    default = 0
+    verbose_name = _("Number of the newest pruned change of substitutions")
+    help_text = _("This is updated automatically when changes are pruned.")
+
+
+@person_preferences_registry.register
+class CalendarFeedSecret(StringPreference):
+    section = chronos
+    name = "calendar_feed_secret"
+    default = ""
+    required = False
+    verbose_name = _("Secret of links to calendar feeds")
+    help_text = _("Change this to make all links to your calendar feeds shared before invalid.")
@@ -0,0 +1,41 @@
+from datetime import date
+from typing import List, Optional
+
+from aleksis.core.util.core_helpers import celery_optional
+
+from .util.changes import prune_changes
+from .util.occurrences import rebuild_occurrences
+from .util.snapshots import render_substitution_snapshots
+from .util.widget import precompute_widget_payloads
+
+
+@celery_optional
+def rebuild_lesson_occurrences(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    lesson_periods: Optional[List[int]] = None,
+) -> int:
+    """Regenerate lesson occurrences within a date range (as ISO dates) and/or of lesson periods."""
+    return rebuild_occurrences(
+        date.fromisoformat(start) if start else None,
+        date.fromisoformat(end) if end else None,
+        lesson_periods,
+    )
+
+
+@celery_optional
+def precompute_timetable_widgets(day: Optional[str] = None) -> int:
+    """Precompute the timetable widget of all persons for a day (as ISO date)."""
+    return precompute_widget_payloads(date.fromisoformat(day) if day else None)
+
+
+@celery_optional
+def render_substitution_snapshots_task(number_of_days: Optional[int] = None) -> dict:
+    """Pre-render the substitution plans of the next relevant days into static files."""
+    return render_substitution_snapshots(number_of_days)
+
+
+@celery_optional
+def prune_timetable_changes(retention_days: Optional[int] = None) -> int:
+    """Delete changes older than the retention period from the change feed."""
+    return prune_changes(retention_days)
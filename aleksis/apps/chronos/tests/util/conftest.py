@@ -0,0 +1,134 @@
+from datetime import date, time
+
+import pytest
+from calendarweek import CalendarWeek
+
+from aleksis.apps.chronos.models import (
+    Break,
+    Event,
+    ExtraLesson,
+    Lesson,
+    LessonPeriod,
+    LessonSubstitution,
+    Room,
+    Subject,
+    Supervision,
+    SupervisionArea,
+    SupervisionSubstitution,
+    TimePeriod,
+    ValidityRange,
+)
+from aleksis.core.models import Group, Person, SchoolTerm
+
+WEEK = CalendarWeek(year=2020, week=38)
+PERIODS = 6
+
+
+@pytest.fixture
+def school():
+    school_term = SchoolTerm.objects.create(
+        name="2020/21", date_start=date(2020, 8, 1), date_end=date(2021, 7, 31)
+    )
+    validity = ValidityRange.objects.create(
+        school_term=school_term, date_start=date(2020, 8, 1), date_end=date(2021, 7, 31)
+    )
+    time_periods = {
+        (weekday, period): TimePeriod.objects.create(
+            validity=validity,
+            weekday=weekday,
+            period=period,
+            time_start=time(7 + period),
+            time_end=time(7 + period, 45),
+        )
+        for weekday in range(5)
+        for period in range(1, PERIODS + 1)
+    }
+    breaks = [
+        Break.objects.create(
+            validity=validity,
+            short_name=f"B{period}",
+            name=f"Break {period}",
+            after_period=time_periods[(weekday, period)],
+            before_period=time_periods[(weekday, period + 1)],
+        )
+        for weekday in range(5)
+        for period in range(1, PERIODS)
+    ]
+
+    parent_group = Group.objects.create(school_term=school_term, name="Grade 5", short_name="5")
+    group = Group.objects.create(school_term=school_term, name="Class 5a", short_name="5a")
+    group.parent_groups.add(parent_group)
+
+    student = Person.objects.create(first_name="Jane", last_name="Doe", primary_group=group)
+    group.members.add(student)
+
+    return {
+        "validity": validity,
+        "time_periods": time_periods,
+        "breaks": breaks,
+        "subject": Subject.objects.create(short_name="M", name="Mathematics"),
+        "area": SupervisionArea.objects.create(
+            short_name="Y", name="Schoolyard", colour_bg="#ffffff"
+        ),
+        "teacher": Person.objects.create(first_name="John", last_name="Doe", short_name="DOE"),
+        "group": group,
+        "room": Room.objects.create(short_name="R1", name="Room 1"),
+        "student": student,
+        "week": WEEK,
+        "count": 0,
+    }
+
+
+@pytest.fixture
+def add_data():
+    """Get a function adding lessons and substitutions to the timetables of a school."""
+    return _add_data
+
+
+def _add_data(school: dict, number: int):
+    """Add lessons, substitutions, supervisions, events and extra lessons to the timetables."""
+    teacher, group, room = school["teacher"], school["group"], school["room"]
+
+    for i in range(school["count"], school["count"] + number):
+        weekday, period = i % 5, i // 5 % PERIODS + 1
+        time_period = school["time_periods"][(weekday, period)]
+        substitute = Person.objects.create(first_name="Substitute", last_name=str(i))
+        substitute_room = Room.objects.create(short_name=f"S{i}", name=f"Substitution room {i}")
+
+        lesson = Lesson.objects.create(validity=school["validity"], subject=school["subject"])
+        lesson.groups.add(group)
+        lesson.teachers.add(teacher)
+        lesson_period = LessonPeriod.objects.create(lesson=lesson, period=time_period, room=room)
+        substitution = LessonSubstitution.objects.create(
+            lesson_period=lesson_period, week=WEEK.week, year=WEEK.year, room=substitute_room
+        )
+        substitution.teachers.add(substitute)
+
+        supervision = Supervision.objects.create(
+            validity=school["validity"],
+            area=school["area"],
+            break_item=school["breaks"][i],
+            teacher=teacher,
+        )
+        SupervisionSubstitution.objects.create(
+            supervision=supervision, date=WEEK[school["breaks"][i].weekday], teacher=substitute
+        )
+
+        event = Event.objects.create(
+            title=f"Event {i}",
+            date_start=WEEK[weekday],
+            date_end=WEEK[weekday],
+            period_from=time_period,
+            period_to=time_period,
+        )
+        event.groups.add(group)
+        event.teachers.add(teacher)
+        event.rooms.add(room)
+
+        extra_lesson = ExtraLesson.objects.create(
+            week=WEEK.week, year=WEEK.year, period=time_period, subject=school["subject"], room=room
+        )
+        extra_lesson.groups.add(group)
+        extra_lesson.teachers.add(teacher)
+
+    school["count"] += number
@@ -0,0 +1,143 @@
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from aleksis.apps.chronos.managers import TimetableType
+from aleksis.apps.chronos.models import LessonPeriod
+from aleksis.apps.chronos.util.api import encode_timetable
+from aleksis.apps.chronos.util.build import (
+    build_timetable,
+    build_timetables_bulk,
+    load_timetable_data,
+    project_timetable_day,
+)
+from aleksis.apps.chronos.util.caching import (
+    get_timetable_cache_key,
+    get_timetable_cache_stats,
+    invalidate_timetable_cache,
+    reset_timetable_cache_stats,
+)
+
+pytestmark = pytest.mark.django_db
+
+# Upper limit of queries for loading or building one timetable
+MAX_TIMETABLE_QUERIES = 20
+
+
+def _count_queries(func) -> int:
+    """Count the queries of a function with loaded period grids, holidays and person roles."""
+    func()
+    invalidate_timetable_cache()
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len(context.captured_queries)
+
+
+@pytest.mark.parametrize("date_ref", ["week", "day"])
+@pytest.mark.parametrize("func", [load_timetable_data, build_timetable])
+@pytest.mark.parametrize(
+    "type_, key",
+    [
+        (TimetableType.TEACHER, "teacher"),
+        (TimetableType.GROUP, "group"),
+        (TimetableType.ROOM, "room"),
+        ("person", "student"),
+    ],
+)
+def test_timetable_queries_dont_depend_on_data(school, add_data, type_, key, func, date_ref):
+    obj = school[key]
+    date_ref = school["week"] if date_ref == "week" else school["week"][0]
+
+    add_data(school, 1)
+    queries_few = _count_queries(lambda: func(type_, obj, date_ref))
+
+    add_data(school, 9)
+    queries_many = _count_queries(lambda: func(type_, obj, date_ref))
+
+    assert queries_few == queries_many
+    assert queries_many <= MAX_TIMETABLE_QUERIES
+
+
+def test_substitutions_of_lesson_periods_without_week_are_prefetched(school, add_data):
+    week = school["week"]
+
+    def _get_substitutions():
+        return [
+            lesson_period.get_substitution(week) for lesson_period in LessonPeriod.objects.all()
+        ]
+
+    add_data(school, 1)
+    queries_few = _count_queries(_get_substitutions)
+
+    add_data(school, 9)
+    queries_many = _count_queries(_get_substitutions)
+
+    assert all(_get_substitutions())
+    assert queries_few == queries_many
+
+
+@pytest.mark.parametrize("date_ref", ["week", "day"])
+@pytest.mark.parametrize(
+    "type_, key",
+    [
+        (TimetableType.TEACHER, "teacher"),
+        (TimetableType.GROUP, "group"),
+        (TimetableType.ROOM, "room"),
+    ],
+)
+def test_bulk_timetables_equal_single_timetables(school, add_data, type_, key, date_ref):
+    week = school["week"]
+    add_data(school, 10)
+
+    # Substitutes, substitution rooms and parent groups share the data of the week
+    objects = list(type(school[key]).objects.all())
+    bulk_timetables = build_timetables_bulk(type_, objects, week)
+
+    # Bulk building stores the timetables in the cache, so build the single ones from scratch
+    invalidate_timetable_cache()
+    for obj in objects:
+        if date_ref == "week":
+            bulk_rows = bulk_timetables[obj]
+            rows = build_timetable(type_, obj, week)
+        else:
+            bulk_rows = project_timetable_day(bulk_timetables[obj], week[0])
+            rows = build_timetable(type_, obj, week[0])
+
+        assert bulk_rows == rows
+
+
+def test_only_fields_shown_in_timetables_invalidate_timetables(school):
+    teacher, week = school["teacher"], school["week"]
+    key = get_timetable_cache_key(TimetableType.TEACHER, teacher.pk, week)
+
+    teacher.email = "doe@example.com"
+    teacher.save()
+    assert get_timetable_cache_key(TimetableType.TEACHER, teacher.pk, week) == key
+
+    teacher.short_name = "DOX"
+    teacher.save()
+    assert get_timetable_cache_key(TimetableType.TEACHER, teacher.pk, week) != key
+
+
+@pytest.mark.django_db(transaction=True)
+def test_timetables_are_invalidated_again_after_commit(school):
+    room, week = school["room"], school["week"]
+
+    with transaction.atomic():
+        invalidate_timetable_cache([week])
+        # Other processes could still build timetables from the data before the commit
+        key = get_timetable_cache_key(TimetableType.ROOM, room.pk, week)
+
+    assert get_timetable_cache_key(TimetableType.ROOM, room.pk, week) != key
+
+
+def test_encoded_timetables_count_each_lookup_once(school):
+    group, week = school["group"], school["week"]
+    reset_timetable_cache_stats()
+
+    encode_timetable(TimetableType.GROUP, group, week)
+    assert get_timetable_cache_stats() == {"hits": 0, "misses": 1}
+
+    encode_timetable(TimetableType.GROUP, group, week)
+    assert get_timetable_cache_stats() == {"hits": 1, "misses": 1}
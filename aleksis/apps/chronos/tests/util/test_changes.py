@@ -0,0 +1,71 @@
+from datetime import timedelta
+from typing import List
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+import pytest
+
+from aleksis.apps.chronos.models import LessonSubstitution, TimetableChange
+from aleksis.apps.chronos.util.changes import get_changes_since, prune_changes
+
+pytestmark = pytest.mark.django_db
+
+
+def _record_changes(age: timedelta = timedelta(days=1)) -> List[TimetableChange]:
+    """Record an update of every substitution which happened some time ago."""
+    changes = [
+        TimetableChange.objects.create(
+            content_type=ContentType.objects.get_for_model(substitution),
+            object_id=substitution.pk,
+            action=TimetableChange.UPDATED,
+            date_start=substitution.date,
+            date_end=substitution.date,
+        )
+        for substitution in LessonSubstitution.objects.order_by("pk")
+    ]
+    TimetableChange.objects.filter(pk__in=[change.pk for change in changes]).update(
+        changed_at=timezone.now() - age
+    )
+    return changes
+
+
+def test_changes_are_paginated(school, add_data):
+    add_data(school, 3)
+    changes = _record_changes()
+
+    page = get_changes_since(0, limit=2)
+    assert [change["id"] for change in page["changes"]] == [changes[0].pk, changes[1].pk]
+    assert page["changes"][0]["object"]["room"] == LessonSubstitution.objects.first().room_id
+    assert page["more"]
+    assert not page["reset"]
+
+    page = get_changes_since(page["last"], limit=2)
+    assert [change["id"] for change in page["changes"]] == [changes[2].pk]
+    assert not page["more"]
+    assert get_changes_since(page["last"])["changes"] == []
+
+
+def test_young_changes_are_held_back(school, add_data):
+    add_data(school, 1)
+    _record_changes(timedelta())
+
+    assert get_changes_since(0)["changes"] == []
+
+
+def test_pruned_changes_reset_clients(school, add_data):
+    add_data(school, 3)
+    pruned = _record_changes(timedelta(days=30))
+    changes = _record_changes()
+
+    assert prune_changes(7) == 3
+
+    page = get_changes_since(pruned[1].pk)
+    assert page["reset"]
+    assert [change["id"] for change in page["changes"]] == [change.pk for change in changes]
+
+    # Gaps in the numbers of retained changes don't reset clients
+    changes[0].delete()
+    page = get_changes_since(pruned[2].pk)
+    assert not page["reset"]
+    assert [change["id"] for change in page["changes"]] == [changes[1].pk, changes[2].pk]
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+
+import pytest
+
+from aleksis.apps.chronos.util.conditional import conditional_view
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def view(school):
+    """Get a view showing the first day of the school's week, which can be changed."""
+    scope = {"day": school["week"][0]}
+
+    @conditional_view(lambda: ([school["week"]], [scope["day"]]))
+    def _view(request):
+        return HttpResponse(str(scope["day"]))
+
+    _view.scope = scope
+    return _view
+
+
+def _get(rf, view, **headers) -> HttpResponse:
+    request = rf.get("/", **headers)
+    request.user = AnonymousUser()
+    return view(request)
+
+
+def test_unchanged_view_is_not_modified(rf, view):
+    etag = _get(rf, view)["ETag"]
+
+    assert _get(rf, view, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+def test_changed_data_is_modified(rf, school, add_data, view):
+    etag = _get(rf, view)["ETag"]
+
+    add_data(school, 1)
+
+    response = _get(rf, view, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_changed_day_is_modified(rf, school, view):
+    response = _get(rf, view)
+    etag = response["ETag"]
+    assert not response.has_header("Last-Modified")
+
+    # The day shown by views without a date changes without any change to the data
+    view.scope["day"] = school["week"][1]
+
+    assert _get(rf, view, HTTP_IF_NONE_MATCH=etag).status_code == 200
+    assert _get(rf, view, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT").status_code == 200
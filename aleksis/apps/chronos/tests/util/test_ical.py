@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+import pytest
+
+from aleksis.apps.chronos.util.ical import check_ical_token, get_ical_token
+from aleksis.apps.chronos.util.occurrences import rebuild_occurrences
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user(school):
+    user = get_user_model().objects.create_user("jane")
+    school["student"].user = user
+    school["student"].save()
+    return user
+
+
+def test_ical_tokens_are_bound_to_timetable(school, user):
+    token = get_ical_token(user, "my")
+
+    assert check_ical_token(token, "my") == user
+    assert check_ical_token(token, "group", school["group"].pk) is None
+
+
+def test_changed_secret_revokes_ical_tokens(user):
+    token = get_ical_token(user, "my")
+
+    user.person.preferences["chronos__calendar_feed_secret"] = "changed"
+
+    assert check_ical_token(token, "my") is None
+    assert check_ical_token(get_ical_token(user, "my"), "my") == user
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuilt_occurrences_change_ical_etag(client, school, add_data, user):
+    week = school["week"]
+    add_data(school, 1)
+
+    url = reverse("my_timetable_ical")
+    params = {
+        "token": get_ical_token(user, "my"),
+        "start": week[0].isoformat(),
+        "end": week[6].isoformat(),
+    }
+    etag = client.get(url, params)["ETag"]
+    assert client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # Occurrences can be regenerated after the data they are built from has been committed
+    rebuild_occurrences(week[0], week[6])
+
+    assert client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code == 200
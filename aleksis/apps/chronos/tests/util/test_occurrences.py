@@ -0,0 +1,75 @@
+from django.db import transaction
+
+import pytest
+
+from aleksis.apps.chronos.models import Holiday, LessonOccurrence, LessonPeriod, LessonSubstitution
+from aleksis.apps.chronos.util.occurrences import rebuild_occurrences
+
+pytestmark = pytest.mark.django_db
+
+
+def test_occurrences_follow_substitutions(school, add_data):
+    week = school["week"]
+    add_data(school, 2)
+
+    assert rebuild_occurrences(week[0], week[6]) == 2
+
+    occurrences = LessonOccurrence.objects.within_dates(week[0], week[6])
+    assert occurrences.count() == 2
+    for occurrence in occurrences.select_related("substitution").prefetch_related("teachers"):
+        substitution = occurrence.substitution
+        assert occurrence.date == substitution.date
+        assert occurrence.room_id == substitution.room_id
+        assert list(occurrence.teachers.all()) == list(substitution.teachers.all())
+
+
+def test_substituted_occurrences_stay_with_teacher_and_room(school, add_data):
+    week = school["week"]
+    add_data(school, 2)
+    rebuild_occurrences(week[0], week[6])
+
+    occurrences = LessonOccurrence.objects.within_dates(week[0], week[6])
+    assert occurrences.filter_teacher(school["teacher"]).count() == 2
+    assert occurrences.filter_room(school["room"]).count() == 2
+    for substitution in LessonSubstitution.objects.all():
+        assert occurrences.filter_teacher(substitution.teachers.get()).count() == 1
+        assert occurrences.filter_room(substitution.room).count() == 1
+
+
+def test_holidays_have_no_occurrences(school, add_data):
+    week = school["week"]
+    add_data(school, 2)
+    Holiday.objects.create(title="Holidays", date_start=week[0], date_end=week[6])
+
+    assert rebuild_occurrences(week[0], week[6]) == 0
+    assert not LessonOccurrence.objects.within_dates(week[0], week[6]).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rolled_back_rebuilds_are_discarded(school, add_data):
+    next_week = school["week"] + 1
+    add_data(school, 2)
+    rolled_back, committed = LessonPeriod.objects.order_by("pk")
+
+    # Rebuilding the occurrences of the rolled back lesson period would restore this one
+    rolled_back_day = next_week[rolled_back.period.weekday]
+    LessonOccurrence.objects.filter(lesson_period=rolled_back, date=rolled_back_day).delete()
+
+    with pytest.raises(RuntimeError), transaction.atomic():
+        LessonSubstitution.objects.create(
+            lesson_period=rolled_back, week=next_week.week, year=next_week.year, cancelled=True
+        )
+        raise RuntimeError()
+
+    with transaction.atomic():
+        LessonSubstitution.objects.create(
+            lesson_period=committed, week=next_week.week, year=next_week.year, cancelled=True
+        )
+
+    occurrence = LessonOccurrence.objects.get(
+        lesson_period=committed, date=next_week[committed.period.weekday]
+    )
+    assert occurrence.cancelled
+    assert not LessonOccurrence.objects.filter(
+        lesson_period=rolled_back, date=rolled_back_day
+    ).exists()
@@ -10,7 +10,11 @@ urlpatterns = [
         views.my_timetable,
         name="my_timetable_by_date",
     ),
+    path("timetable/my/calendar.ics", views.my_timetable_ical, name="my_timetable_ical"),
     path("timetable/<str:type_>/<int:pk>/", views.timetable, name="timetable"),
+    path(
+        "timetable/<str:type_>/<int:pk>/calendar.ics", views.timetable_ical, name="timetable_ical",
+    ),
     path(
         "timetable/<str:type_>/<int:pk>/<int:year>/<int:week>/",
         views.timetable,
@@ -48,4 +52,22 @@ urlpatterns = [
         {"is_print": True},
         name="substitutions_print_by_date",
     ),
+    path("substitutions/stream/", views.substitutions_stream, name="substitutions_stream"),
+    path(
+        "substitutions/<int:year>/<int:month>/<int:day>/stream/",
+        views.substitutions_stream,
+        name="substitutions_stream_by_date",
+    ),
+    path("changes/", views.changes, name="timetable_changes"),
+    path("api/timetable/<str:type_>/<int:pk>/", views.timetable_api, name="timetable_api"),
+    path(
+        "api/timetable/<str:type_>/<int:pk>/<int:year>/<int:week>/",
+        views.timetable_api,
+        name="timetable_api_by_week",
+    ),
+    path(
+        "api/timetable/<str:type_>/<int:pk>/<int:year>/<int:month>/<int:day>/",
+        views.timetable_api,
+        name="timetable_api_by_date",
+    ),
 ]
@@ -0,0 +1,228 @@
+from datetime import date
+from typing import Any, Dict, List, Optional, Union
+
+from calendarweek import CalendarWeek
+
+from aleksis.core.models import Group, Person
+
+from ..managers import TimetableType
+from .build import build_timetable
+from .caching import get_cached_timetable, get_timetable_cache_key, set_cached_timetable
+
+# Fields of the encoded cells per kind, following the kind index as first item
+CELL_KINDS = ["lesson", "extra_lesson", "event", "supervision"]
+CELL_SCHEMA = {
+    "lesson": ["id", "subject", "teachers", "room", "groups", "substitution"],
+    "substitution": [
+        "subject",
+        "teachers",
+        "room",
+        "cancelled",
+        "cancelled_for_teachers",
+        "comment",
+    ],
+    "extra_lesson": ["id", "subject", "teachers", "room", "groups", "comment"],
+    "event": ["id", "title", "teachers", "rooms", "groups"],
+    "supervision": ["id", "area", "teacher", "substitution_teacher"],
+}
+
+# Columns of the lookup tables
+TABLE_COLUMNS = {
+    "subjects": ["id", "short_name", "name", "colour_fg", "colour_bg"],
+    "teachers": ["id", "short_name", "name"],
+    "rooms": ["id", "short_name", "name"],
+    "groups": ["id", "short_name", "name"],
+    "areas": ["id", "short_name", "name", "colour_fg", "colour_bg"],
+}
+
+
+class TimetableEncoder:
+    """Encoder for timetable rows with interned lookup tables.
+
+    Subjects, teachers, rooms, groups and supervision areas are stored once
+    in columnar lookup tables, and cells refer to them by their index.
+
+    Regular timetables of teachers and rooms leave out lessons and supervisions
+    which are only part of them because of a substitution.
+    """
+
+    def __init__(
+        self,
+        smart: bool = True,
+        type_: Optional[TimetableType] = None,
+        obj: Optional[Union[Group, Person, "Room"]] = None,
+    ):
+        self.smart = smart
+        self.type = type_
+        self.obj = obj
+        self.tables = {
+            name: {column: [] for column in columns} for name, columns in TABLE_COLUMNS.items()
+        }
+        self._indices = {name: {} for name in TABLE_COLUMNS}
+
+    def _intern(self, table: str, obj: Optional[Any]) -> Optional[int]:
+        """Get the index of an object in a lookup table, adding it if necessary."""
+        if obj is None:
+            return None
+
+        indices = self._indices[table]
+        if obj.pk not in indices:
+            indices[obj.pk] = len(indices)
+            for column in TABLE_COLUMNS[table]:
+                if column == "id":
+                    value = obj.pk
+                elif column == "name" and isinstance(obj, Person):
+                    value = obj.full_name
+                else:
+                    value = getattr(obj, column, None)
+                self.tables[table][column].append(value)
+        return indices[obj.pk]
+
+    def _intern_many(self, table: str, objects) -> List[int]:
+        return [self._intern(table, obj) for obj in objects]
+
+    def _in_regular_timetable(self, lesson_period: "LessonPeriod") -> bool:
+        """Check whether a lesson period is part of the timetable without substitutions."""
+        if self.type == TimetableType.TEACHER:
+            return any(teacher.pk == self.obj.pk for teacher in lesson_period.lesson.teachers.all())
+        elif self.type == TimetableType.ROOM:
+            return lesson_period.room_id == self.obj.pk
+        return True
+
+    def _encode_lesson_period(self, lesson_period: "LessonPeriod") -> list:
+        lesson = lesson_period.lesson
+        encoded_sub = None
+        sub = lesson_period.get_substitution() if self.smart else None
+        if sub:
+            encoded_sub = [
+                self._intern("subjects", sub.subject),
+                self._intern_many("teachers", sub.teachers.all()),
+                self._intern("rooms", sub.room),
+                sub.cancelled,
+                sub.cancelled_for_teachers,
+                sub.comment,
+            ]
+        return [
+            CELL_KINDS.index("lesson"),
+            lesson_period.pk,
+            self._intern("subjects", lesson.subject),
+            self._intern_many("teachers", lesson.teachers.all()),
+            self._intern("rooms", lesson_period.room),
+            self._intern_many("groups", lesson.groups.all()),
+            encoded_sub,
+        ]
+
+    def _encode_extra_lesson(self, extra_lesson: "ExtraLesson") -> list:
+        return [
+            CELL_KINDS.index("extra_lesson"),
+            extra_lesson.pk,
+            self._intern("subjects", extra_lesson.subject),
+            self._intern_many("teachers", extra_lesson.teachers.all()),
+            self._intern("rooms", extra_lesson.room),
+            self._intern_many("groups", extra_lesson.groups.all()),
+            extra_lesson.comment,
+        ]
+
+    def _encode_event(self, event: "Event") -> list:
+        return [
+            CELL_KINDS.index("event"),
+            event.pk,
+            str(event),
+            self._intern_many("teachers", event.teachers.all()),
+            self._intern_many("rooms", event.rooms.all()),
+            self._intern_many("groups", event.groups.all()),
+        ]
+
+    def _encode_supervision(self, supervision: Optional["Supervision"]) -> Optional[list]:
+        if supervision is None:
+            return None
+        if (
+            not self.smart
+            and self.type == TimetableType.TEACHER
+            and supervision.teacher_id != self.obj.pk
+        ):
+            # Only part of the teacher's timetable because of a substitution
+            return None
+
+        sub = supervision.get_substitution() if self.smart else None
+        return [
+            CELL_KINDS.index("supervision"),
+            supervision.pk,
+            self._intern("areas", supervision.area),
+            self._intern("teachers", supervision.teacher),
+            self._intern("teachers", sub.teacher) if sub else None,
+        ]
+
+    def _encode_elements(self, elements: List) -> List[list]:
+        encoded = []
+        for element in elements:
+            if element.label_ == "lesson_period":
+                if self.smart or self._in_regular_timetable(element):
+                    encoded.append(self._encode_lesson_period(element))
+            elif not self.smart:
+                # Extra lessons and events are only part of smart timetables
+                continue
+            elif element.label_ == "extra_lesson":
+                encoded.append(self._encode_extra_lesson(element))
+            elif element.label_ == "event":
+                encoded.append(self._encode_event(element))
+        return encoded
+
+    def encode_row(self, row: dict) -> dict:
+        """Encode a timetable row, replacing its elements by encoded cells."""
+        encoded = {
+            key: value.isoformat(timespec="minutes") if key.startswith("time_") and value else value
+            for key, value in row.items()
+            if key not in ("col", "cols")
+        }
+        encode = self._encode_supervision if row["type"] == "break" else self._encode_elements
+        if "cols" in row:
+            encoded["cols"] = [encode(col) for col in row["cols"]]
+        else:
+            encoded["col"] = encode(row["col"])
+        return encoded
+
+
+def encode_timetable(
+    type_: Union[TimetableType, str],
+    obj: Union[Group, Person, "Room"],
+    date_ref: Union[CalendarWeek, date],
+    smart: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """Get the timetable of a group, teacher or room in a week or on a day in a compact form.
+
+    The timetable is built by `build_timetable`, and the encoded form is cached
+    alongside it until timetable data of the respective week changes.
+    """
+    mode = "smart" if smart else "regular"
+    key = f"{get_timetable_cache_key(type_, obj.pk, date_ref)}_{mode}_json"
+    payload = get_cached_timetable(key, count_miss=False)
+    if payload is not None:
+        return payload
+
+    rows = build_timetable(type_, obj, date_ref)
+    if rows is None:
+        return None
+
+    timetable_type = obj.timetable_type if type_ == "person" else type_
+    if isinstance(timetable_type, str):
+        timetable_type = TimetableType.from_string(timetable_type)
+    encoder = TimetableEncoder(smart, timetable_type, obj)
+    encoded_rows = [encoder.encode_row(row) for row in rows]
+    if isinstance(date_ref, CalendarWeek):
+        ref = {"year": date_ref.year, "week": date_ref.week}
+    else:
+        ref = {"date": date_ref.isoformat()}
+
+    payload = {
+        "type": getattr(type_, "value", type_),
+        "id": obj.pk,
+        "ref": ref,
+        "smart": smart,
+        "kinds": CELL_KINDS,
+        "schema": CELL_SCHEMA,
+        **encoder.tables,
+        "rows": encoded_rows,
+    }
+    set_cached_timetable(key, payload)
+    return payload
@@ -0,0 +1,152 @@
+from datetime import date
+from statistics import median
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from calendarweek import CalendarWeek
+
+from .build import build_substitutions_list, build_timetable
+from .caching import invalidate_timetable_cache
+from .conditional import invalidate_view_data
+
+Benchmark = Tuple[str, Callable[[], object]]
+
+
+def _measure(func: Callable[[], object], repeat: int, cold: bool) -> Dict[str, float]:
+    """Run a function several times and measure its wall time and number of queries.
+
+    Cold runs start with invalidated timetable caches, warm runs are
+    preceded by one run which is not measured.
+    """
+    if not cold:
+        func()
+
+    times, queries = [], []
+    for __ in range(repeat):
+        if cold:
+            invalidate_timetable_cache()
+            invalidate_view_data()
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            func()
+            times.append(perf_counter() - start)
+        queries.append(len(context.captured_queries))
+
+    return {
+        "min_ms": min(times) * 1000,
+        "median_ms": median(times) * 1000,
+        "queries": max(queries),
+    }
+
+
+def _get_sample_objects(day: date) -> Dict[str, object]:
+    """Get a group, teacher, room and student having lessons on a day."""
+    Person = apps.get_model("core", "Person")
+    Group = apps.get_model("core", "Group")
+    Room = apps.get_model("chronos", "Room")
+    LessonPeriod = apps.get_model("chronos", "LessonPeriod")
+
+    lesson_periods = LessonPeriod.objects.on_day(day)
+    group = (
+        Group.objects.filter(lessons__lesson_periods__in=lesson_periods, members__isnull=False)
+        .order_by("pk")
+        .first()
+    )
+    return {
+        "group": group,
+        "teacher": Person.objects.filter(lessons_as_teacher__lesson_periods__in=lesson_periods)
+        .order_by("pk")
+        .first(),
+        "room": Room.objects.filter(lesson_periods__in=lesson_periods).order_by("pk").first(),
+        "person": Person.objects.filter(primary_group=group).order_by("pk").first(),
+    }
+
+
+def _view_request(url: str, person: Optional["Person"]):
+    """Build a request for an URL as a superuser linked to a person."""
+    request = RequestFactory().get(url)
+    request.user = get_user_model()(username="chronos-benchmark", is_superuser=True)
+    if person:
+        request.user.person = person
+    request.site = Site.objects.get_current()
+    request.session = {}
+    return request
+
+
+def get_benchmarks(day: date) -> List[Benchmark]:
+    """Get the hot paths of timetables and substitutions to measure for a day."""
+    from ..views import all_timetables, my_timetable, substitutions
+
+    week = CalendarWeek.from_date(day)
+    objects = _get_sample_objects(day)
+
+    benchmarks = []
+    for type_, obj in objects.items():
+        if obj is None:
+            continue
+        for label, date_ref in (("day", day), ("week", week)):
+            benchmarks.append(
+                (
+                    f"build_timetable({type_}, {label})",
+                    lambda type_=type_, obj=obj, date_ref=date_ref: build_timetable(
+                        type_, obj, date_ref
+                    ),
+                )
+            )
+    benchmarks.append(("build_substitutions_list", lambda: build_substitutions_list(day)))
+
+    date_kwargs = {"year": day.year, "month": day.month, "day": day.day}
+    benchmarks.append(
+        (
+            "view all_timetables",
+            lambda: all_timetables(_view_request(reverse("all_timetables"), None)),
+        )
+    )
+    benchmarks.append(
+        (
+            "view substitutions",
+            lambda: substitutions(
+                _view_request(reverse("substitutions_by_date", kwargs=date_kwargs), None),
+                **date_kwargs,
+            ),
+        )
+    )
+    if objects["person"]:
+        benchmarks.append(
+            (
+                "view my_timetable",
+                lambda: my_timetable(
+                    _view_request(
+                        reverse("my_timetable_by_date", kwargs=date_kwargs), objects["person"]
+                    ),
+                    **date_kwargs,
+                ),
+            )
+        )
+    return benchmarks
+
+
+def run_benchmarks(day: Optional[date] = None, repeat: int = 5) -> List[Dict[str, object]]:
+    """Measure wall time and number of queries of the timetable hot paths.
+
+    Every path is measured with cold and with warm caches on the configured
+    default database. Returns one result per path and cache state.
+    """
+    TimePeriod = apps.get_model("chronos", "TimePeriod")
+
+    day = day or TimePeriod.get_next_relevant_day()
+    results = []
+    for name, func in get_benchmarks(day):
+        for cold in (True, False):
+            result = {"name": name, "cache": "cold" if cold else "warm"}
+            result.update(_measure(func, repeat, cold))
+            results.append(result)
+    return results
@@ -0,0 +1,45 @@
+from threading import Condition
+from typing import Optional
+
+from django.db import transaction
+
+
+class ChangeBroker:
+    """In-process broker waking up waiting streams after substitution data has changed.
+
+    It only knows about changes made in the same process. Streams therefore also
+    wake up regularly to compare the data versions in the cache, which covers
+    changes made in other processes.
+    """
+
+    def __init__(self):
+        self._condition = Condition()
+        self._sequence = 0
+
+    @property
+    def sequence(self) -> int:
+        """Get the number of the last published change."""
+        return self._sequence
+
+    def publish(self):
+        """Wake up all waiting streams."""
+        with self._condition:
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def wait(self, sequence: int, timeout: Optional[float] = None) -> int:
+        """Wait until a change after the change `sequence` is published or the timeout passes.
+
+        Returns the number of the last published change.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence != sequence, timeout)
+            return self._sequence
+
+
+broker = ChangeBroker()
+
+
+def publish_change():
+    """Wake up waiting streams after the current transaction has been committed."""
+    transaction.on_commit(broker.publish)
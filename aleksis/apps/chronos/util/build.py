@@ -1,15 +1,26 @@
 from collections import OrderedDict
-from datetime import date
-from typing import List, Tuple, Union
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from django.apps import apps
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
+from django.urls import reverse
 
 from calendarweek import CalendarWeek
 
-from aleksis.apps.chronos.managers import TimetableType
+from aleksis.apps.chronos.managers import TimetableType, group_by_periods
 from aleksis.apps.chronos.models import Room
-from aleksis.core.models import Group, Person
-
+from aleksis.apps.chronos.util.caching import (
+    get_cached_timetable,
+    get_timetable_cache_key,
+    set_cached_timetable,
+)
+from aleksis.apps.chronos.util.js import date_unix
+from aleksis.apps.chronos.util.period_grid import PeriodGrid
+from aleksis.core.models import Announcement, Group, Person
+from aleksis.core.util.core_helpers import get_site_preferences
+
+Lesson = apps.get_model("chronos", "Lesson")
 LessonPeriod = apps.get_model("chronos", "LessonPeriod")
 TimePeriod = apps.get_model("chronos", "TimePeriod")
 Break = apps.get_model("chronos", "Break")
@@ -19,61 +30,114 @@ SupervisionSubstitution = apps.get_model("chronos", "SupervisionSubstitution")
 Event = apps.get_model("chronos", "Event")
 Holiday = apps.get_model("chronos", "Holiday")
 ExtraLesson = apps.get_model("chronos", "ExtraLesson")
+Absence = apps.get_model("chronos", "Absence")
 
 
 def build_timetable(
     type_: Union[TimetableType, str],
     obj: Union[Group, Room, Person],
     date_ref: Union[CalendarWeek, date],
-):
-    needed_breaks = []
+) -> Optional[List[dict]]:
+    """Build the timetable rows for a group, teacher, room or person in a week or on a day.
+
+    Built timetables are cached until timetable data of the respective week changes.
+    """
+    key = get_timetable_cache_key(type_, obj.pk, date_ref)
+    rows = get_cached_timetable(key)
+    if rows is None:
+        rows = _build_timetable(type_, obj, date_ref)
+        if rows is not None:
+            set_cached_timetable(key, rows)
+    return rows
 
-    is_person = False
-    if type_ == "person":
-        is_person = True
-        type_ = obj.timetable_type
 
-    is_week = False
-    if type(date_ref) == CalendarWeek:
-        is_week = True
+def project_timetable_day(rows: List[dict], day: date) -> List[dict]:
+    """Get the rows of a day from the rows of a week timetable.
+
+    The result equals the rows built for the day itself, except on holidays
+    where break rows of supervisions are left out.
+    """
+    grid = TimePeriod.get_grid(CalendarWeek.from_date(day)[0])
+    index = day.weekday() - grid.weekday_min
+    in_grid = grid.weekday_min <= day.weekday() <= grid.weekday_max
+
+    day_rows = []
+    for row in rows:
+        day_row = {key: value for key, value in row.items() if key != "cols"}
+        if row["type"] == "break":
+            day_row["col"] = row["cols"][index] if in_grid else None
+            if day_row["col"] is None:
+                # Breaks are only shown on days with supervisions
+                continue
+        else:
+            day_row["col"] = row["cols"][index] if in_grid else []
+        day_rows.append(day_row)
+    return day_rows
+
+
+def build_timetable_with_days(
+    type_: Union[TimetableType, str], obj: Union[Group, Room, Person], week: CalendarWeek,
+) -> Optional[Tuple[List[dict], Dict[date, List[dict]]]]:
+    """Build the timetable rows of a week together with the rows of all its days.
+
+    The rows of the days are projected from the week timetable, so only one
+    timetable has to be built.
+    """
+    rows = build_timetable(type_, obj, week)
+    if rows is None:
+        return None
+
+    grid = TimePeriod.get_grid(week[0])
+    days = {
+        week[weekday]: project_timetable_day(rows, week[weekday])
+        for weekday in range(grid.weekday_min, grid.weekday_max + 1)
+    }
+    return rows, days
+
 
+def load_timetable_data(
+    type_: Union[TimetableType, str],
+    obj: Union[Group, Room, Person],
+    date_ref: Union[CalendarWeek, date],
+) -> Optional[dict]:
+    """Load all timetable data of a group, teacher, room or person in a week or on a day.
+
+    All lesson periods, extra lessons, events and supervisions are fetched together
+    with their related data, so the number of queries doesn't depend on the amount of data.
+    """
+    is_person = type_ == "person"
+    if is_person:
+        type_ = obj.timetable_type
     if type_ is None:
         return None
 
-    # Get matching holidays
-    if is_week:
-        holidays_per_weekday = Holiday.in_week(date_ref)
-    else:
-        holiday = Holiday.on_day(date_ref)
+    is_week = isinstance(date_ref, CalendarWeek)
+    week = date_ref if is_week else CalendarWeek.from_date(date_ref)
+
+    if type_ == TimetableType.GROUP and not is_person:
+        # Load parent groups once instead of once per filter
+        prefetch_related_objects([obj], "parent_groups")
+
+    def _filter(qs: QuerySet) -> QuerySet:
+        if is_person and type_ == TimetableType.GROUP:
+            return qs.filter_participant(obj)
+        return qs.filter_from_type(type_, obj)
 
     # Get matching lesson periods
-    lesson_periods = LessonPeriod.objects
+    lesson_periods = _lesson_periods_with_related()
     if is_week:
         lesson_periods = lesson_periods.in_week(date_ref)
     else:
         lesson_periods = lesson_periods.on_day(date_ref)
+    lesson_periods = _filter(lesson_periods)
 
-    if is_person:
-        lesson_periods = lesson_periods.filter_from_person(obj)
-    else:
-        lesson_periods = lesson_periods.filter_from_type(type_, obj)
-
-    # Sort lesson periods in a dict
-    lesson_periods_per_period = lesson_periods.group_by_periods(is_week=is_week)
-
-    # Get events
+    # Get extra lessons
     extra_lessons = ExtraLesson.objects
     if is_week:
-        extra_lessons = extra_lessons.filter(week=date_ref.week, year=date_ref.year)
+        extra_lessons = extra_lessons.in_week(date_ref)
     else:
         extra_lessons = extra_lessons.on_day(date_ref)
-    if is_person:
-        extra_lessons = extra_lessons.filter_from_person(obj)
-    else:
-        extra_lessons = extra_lessons.filter_from_type(type_, obj)
-
-    # Sort lesson periods in a dict
-    extra_lessons_per_period = extra_lessons.group_by_periods(is_week=is_week)
+    extra_lessons = _filter(extra_lessons)
 
     # Get events
     events = Event.objects
@@ -81,77 +145,261 @@ def build_timetable(
         events = events.in_week(date_ref)
     else:
         events = events.on_day(date_ref)
+    events = _filter(events)
 
-    if is_person:
-        events = events.filter_from_person(obj)
+    # Get matching supervisions together with their substitutions in this week
+    supervisions = Supervision.objects.none()
+    if type_ == TimetableType.TEACHER:
+        supervisions = _supervisions_in_week(week).filter_by_teacher(obj)
+        if not is_week:
+            supervisions = supervisions.filter_by_weekday(date_ref.weekday())
+
+    return {
+        "type": type_,
+        "is_week": is_week,
+        "holidays": Holiday.in_week(date_ref) if is_week else Holiday.on_day(date_ref),
+        "grid": TimePeriod.get_grid(week[0] if is_week else date_ref),
+        "lesson_periods": list(lesson_periods),
+        "extra_lessons": list(extra_lessons),
+        "events": list(events),
+        "supervisions": list(supervisions),
+    }
+
+
+def _lesson_periods_with_related() -> QuerySet:
+    """Get lesson periods with all related data needed in timetables."""
+    return LessonPeriod.objects.prefetch_related("lesson__groups__parent_groups")
+
+
+def _supervisions_in_week(week: CalendarWeek) -> QuerySet:
+    """Get supervisions in a week together with their substitutions in this week."""
+    return (
+        Supervision.objects.in_week(week)
+        .annotate_week(week)
+        .prefetch_related(
+            Prefetch(
+                "substitutions",
+                queryset=SupervisionSubstitution.objects.filter(date__range=(week[0], week[6])),
+            )
+        )
+    )
+
+
+def _split_by_keys(items: List, get_keys: Callable[[Any], Iterable[Any]]) -> Dict[Any, List[int]]:
+    """Index the positions of items by all keys returned for them."""
+    per_key = {}
+    for index, item in enumerate(items):
+        for key in set(get_keys(item)):
+            per_key.setdefault(key, []).append(index)
+    return per_key
+
+
+def _group_keys(groups: Iterable[Group]) -> Iterator[Tuple[str, int]]:
+    """Get keys for groups and their parent groups."""
+    for group in groups:
+        yield ("group", group.pk)
+        for parent_group in group.parent_groups.all():
+            yield ("parent_group", parent_group.pk)
+
+
+def _lesson_period_keys(type_: TimetableType, lesson_period: LessonPeriod) -> Iterator[Any]:
+    """Get keys of all timetables a lesson period is shown in.
+
+    This matches the filters in LessonDataQuerySet.
+    """
+    substitution = lesson_period.get_substitution()
+    if type_ == TimetableType.GROUP:
+        yield from _group_keys(lesson_period.lesson.groups.all())
+    elif type_ == TimetableType.TEACHER:
+        yield from (teacher.pk for teacher in lesson_period.lesson.teachers.all())
+        if substitution:
+            yield from (teacher.pk for teacher in substitution.teachers.all())
+    elif type_ == TimetableType.ROOM:
+        yield lesson_period.room_id
+        if substitution:
+            yield substitution.room_id
+
+
+def _timetable_object_keys(type_: TimetableType, obj: Union[ExtraLesson, Event]) -> Iterator[Any]:
+    """Get keys of all timetables an extra lesson or an event is shown in.
+
+    This matches the filters in TimetableQuerySet.
+    """
+    if type_ == TimetableType.GROUP:
+        yield from _group_keys(obj.groups.all())
+    elif type_ == TimetableType.TEACHER:
+        yield from (teacher.pk for teacher in obj.teachers.all())
+    elif type_ == TimetableType.ROOM:
+        if isinstance(obj, ExtraLesson):
+            yield obj.room_id
+        else:
+            yield from (room.pk for room in obj.rooms.all())
+
+
+def _supervision_keys(supervision: Supervision) -> Iterator[int]:
+    """Get keys of all teacher timetables a supervision is shown in."""
+    yield supervision.teacher_id
+    yield from (substitution.teacher_id for substitution in supervision.substitutions.all())
+
+
+def _get_for_object(
+    type_: TimetableType, obj: Union[Group, Room, Person], items: List, per_key: dict
+) -> List:
+    """Get all items of a timetable from an index built by _split_by_keys."""
+    if type_ == TimetableType.GROUP:
+        indices = per_key.get(("group", obj.pk), [])
+        if not obj.parent_groups.all():
+            # Groups without parent groups also get the lessons of their child groups
+            indices = sorted(set(indices) | set(per_key.get(("parent_group", obj.pk), [])))
     else:
-        events = events.filter_from_type(type_, obj)
+        indices = per_key.get(obj.pk, [])
+    return [items[index] for index in indices]
+
+
+def build_timetables_bulk(
+    type_: Union[TimetableType, str],
+    objects: Iterable[Union[Group, Room, Person]],
+    week: CalendarWeek,
+) -> Dict[Union[Group, Room, Person], List[dict]]:
+    """Build week timetables for many groups, teachers or rooms at once.
+
+    The data of the week is loaded only once and then split up in memory,
+    so the number of queries doesn't depend on the number of timetables.
+    The rows of each timetable are the same as returned by `build_timetable`.
+    """
+    if isinstance(type_, str):
+        type_ = TimetableType.from_string(type_)
+
+    objects = list(objects)
+    if type_ == TimetableType.GROUP:
+        prefetch_related_objects(objects, "parent_groups")
+
+    # Keys are built before the data is loaded, so that timetables built from
+    # outdated data can't be stored under a newer version
+    keys = {obj.pk: get_timetable_cache_key(type_, obj.pk, week) for obj in objects}
+
+    lesson_periods = list(_lesson_periods_with_related().in_week(week))
+    extra_lessons = list(ExtraLesson.objects.in_week(week))
+    events = list(Event.objects.in_week(week))
+    supervisions = list(_supervisions_in_week(week)) if type_ == TimetableType.TEACHER else []
+
+    lesson_periods_per_key = _split_by_keys(
+        lesson_periods, lambda lesson_period: _lesson_period_keys(type_, lesson_period)
+    )
+    extra_lessons_per_key = _split_by_keys(
+        extra_lessons, lambda extra_lesson: _timetable_object_keys(type_, extra_lesson)
+    )
+    events_per_key = _split_by_keys(events, lambda event: _timetable_object_keys(type_, event))
+    supervisions_per_key = _split_by_keys(supervisions, _supervision_keys)
+
+    holidays = Holiday.in_week(week)
+    grid = TimePeriod.get_grid(week[0])
+
+    timetables = {}
+    for obj in objects:
+        data = {
+            "type": type_,
+            "is_week": True,
+            "holidays": holidays,
+            "grid": grid,
+            "lesson_periods": _get_for_object(type_, obj, lesson_periods, lesson_periods_per_key),
+            "extra_lessons": _get_for_object(type_, obj, extra_lessons, extra_lessons_per_key),
+            "events": _get_for_object(type_, obj, events, events_per_key),
+            "supervisions": _get_for_object(type_, obj, supervisions, supervisions_per_key),
+        }
+        rows = _build_timetable_rows(data, week)
+        set_cached_timetable(keys[obj.pk], rows)
+        timetables[obj] = rows
+
+    return timetables
+
+
+def _build_timetable(
+    type_: Union[TimetableType, str],
+    obj: Union[Group, Room, Person],
+    date_ref: Union[CalendarWeek, date],
+) -> Optional[List[dict]]:
+    data = load_timetable_data(type_, obj, date_ref)
+    if data is None:
+        return None
+
+    return _build_timetable_rows(data, date_ref)
+
+
+def group_events_by_periods(
+    events: Iterable[Event], week: CalendarWeek, grid: Optional[PeriodGrid] = None
+) -> Dict[int, Dict[int, List[Event]]]:
+    """Group events by the periods and weekdays they cover in a week.
+
+    All (weekday, period) slots of the week are numbered consecutively, so every event
+    covers one contiguous interval of slots which is placed without looking
+    at any other slot.
+    """
+    if grid is None:
+        grid = TimePeriod.get_grid(week[0])
+    weekday_min, weekday_max = grid.weekday_min, grid.weekday_max
+    period_min, period_max = grid.period_min, grid.period_max
+    periods_per_day = period_max - period_min + 1
+    week_start, week_end = week[weekday_min], week[weekday_max]
+
+    def _slot(weekday: int, period: int) -> int:
+        return (weekday - weekday_min) * periods_per_day + period - period_min
 
-    # Sort events in a dict
     events_per_period = {}
     for event in events:
-        if is_week and event.date_start < date_ref[TimePeriod.weekday_min]:
-            # If start date not in current week, set weekday and period to min
-            weekday_from = TimePeriod.weekday_min
-            period_from_first_weekday = TimePeriod.period_min
+        if event.date_start < week_start:
+            # If start date not in this week, start with the first slot
+            slot_from = 0
         else:
-            weekday_from = event.date_start.weekday()
-            period_from_first_weekday = event.period_from.period
+            slot_from = _slot(event.date_start.weekday(), max(event.period_from.period, period_min))
 
-        if is_week and event.date_end > date_ref[TimePeriod.weekday_max]:
-            # If end date not in current week, set weekday and period to max
-            weekday_to = TimePeriod.weekday_max
-            period_to_last_weekday = TimePeriod.period_max
+        if event.date_end > week_end:
+            # If end date not in this week, end with the last slot
+            slot_to = _slot(weekday_max, period_max)
         else:
-            weekday_to = event.date_end.weekday()
-            period_to_last_weekday = event.period_to.period
+            slot_to = _slot(event.date_end.weekday(), min(event.period_to.period, period_max))
 
-        for weekday in range(weekday_from, weekday_to + 1):
-            if not is_week and weekday != date_ref.weekday():
-                # If daily timetable for person, skip other weekdays
-                continue
+        for slot in range(slot_from, min(slot_to, _slot(weekday_max, period_max)) + 1):
+            day_index, period_index = divmod(slot, periods_per_day)
+            per_weekday = events_per_period.setdefault(period_min + period_index, {})
+            per_weekday.setdefault(weekday_min + day_index, []).append(event)
 
-            if weekday == weekday_from:
-                # If start day, use start period
-                period_from = period_from_first_weekday
-            else:
-                # If not start day, use min period
-                period_from = TimePeriod.period_min
+    return events_per_period
 
-            if weekday == weekday_to:
-                # If end day, use end period
-                period_to = period_to_last_weekday
-            else:
-                # If not end day, use max period
-                period_to = TimePeriod.period_max
 
-            for period in range(period_from, period_to + 1):
-                if period not in events_per_period:
-                    events_per_period[period] = [] if is_person else {}
+def _build_timetable_rows(data: dict, date_ref: Union[CalendarWeek, date]) -> List[dict]:
+    """Sort loaded timetable data into timetable rows."""
+    type_ = data["type"]
+    is_week = data["is_week"]
+    week = date_ref if is_week else CalendarWeek.from_date(date_ref)
+    grid = data["grid"]
+    needed_breaks = []
 
-                if is_week and weekday not in events_per_period[period]:
-                    events_per_period[period][weekday] = []
+    # Get matching holidays
+    if is_week:
+        holidays_per_weekday = data["holidays"]
+    else:
+        holiday = data["holidays"]
 
-                if not is_week:
-                    events_per_period[period].append(event)
-                else:
-                    events_per_period[period][weekday].append(event)
+    # Sort lesson periods in a dict
+    lesson_periods_per_period = group_by_periods(data["lesson_periods"], is_week=is_week)
 
-    if type_ == TimetableType.TEACHER:
-        # Get matching supervisions
-        if not is_week:
-            week = CalendarWeek.from_date(date_ref)
-        else:
-            week = date_ref
-        supervisions = (
-            Supervision.objects.in_week(week).all().annotate_week(week).filter_by_teacher(obj)
-        )
+    # Sort extra lessons in a dict
+    extra_lessons_per_period = group_by_periods(data["extra_lessons"], is_week=is_week)
 
-        if not is_week:
-            supervisions = supervisions.filter_by_weekday(date_ref.weekday())
+    # Sort events in a dict
+    events_per_period = group_events_by_periods(data["events"], week, grid)
+    if not is_week:
+        weekday = date_ref.weekday()
+        events_per_period = {
+            period: per_weekday[weekday]
+            for period, per_weekday in events_per_period.items()
+            if weekday in per_weekday
+        }
 
+    if type_ == TimetableType.TEACHER:
         supervisions_per_period_after = {}
-        for supervision in supervisions:
+        for supervision in data["supervisions"]:
             weekday = supervision.break_item.weekday
             period_after_break = supervision.break_item.before_period_number
 
@@ -167,7 +415,7 @@ def build_timetable(
                 supervisions_per_period_after[period_after_break][weekday] = supervision
 
     # Get ordered breaks
-    breaks = OrderedDict(sorted(Break.get_breaks_dict().items()))
+    breaks = OrderedDict(sorted(grid.breaks.items()))
 
     rows = []
     for period, break_ in breaks.items():  # period is period after break
@@ -184,7 +432,7 @@ def build_timetable(
             if is_week:
                 cols = []
 
-                for weekday in range(TimePeriod.weekday_min, TimePeriod.weekday_max + 1):
+                for weekday in range(grid.weekday_min, grid.weekday_max + 1):
                     col = None
                     if (
                         period in supervisions_per_period_after
@@ -203,7 +451,7 @@ def build_timetable(
             rows.append(row)
 
         # Period
-        if period <= TimePeriod.period_max:
+        if period <= grid.period_max:
             row = {
                 "type": "period",
                 "period": period,
@@ -213,7 +461,7 @@ def build_timetable(
 
             if is_week:
                 cols = []
-                for weekday in range(TimePeriod.weekday_min, TimePeriod.weekday_max + 1):
+                for weekday in range(grid.weekday_min, grid.weekday_max + 1):
                     col = []
 
                     # Add lesson periods
@@ -256,49 +504,73 @@ def build_timetable(
     return rows
 
 
+def _groups_to_show_names(lesson: Lesson, use_parent_groups: bool) -> str:
+    """Get the names of the groups shown for a lesson, using only prefetched data."""
+    groups = list(lesson.groups.all())
+    if len(groups) == 1 and use_parent_groups:
+        parent_groups = list(groups[0].parent_groups.all())
+        if parent_groups:
+            groups = parent_groups
+    return ", ".join([group.short_name for group in groups])
+
+
+def _substitution_merge_key(sub: LessonSubstitution) -> tuple:
+    """Get the values which have to be equal for merging consecutive substitutions."""
+    return (
+        sub.comment,
+        sub.cancelled,
+        sub.subject_id,
+        sub.room_id,
+        sub.lesson_period.lesson_id,
+        frozenset(teacher.pk for teacher in sub.teachers.all()),
+    )
+
+
+def _merge_substitutions(subs: Iterable[LessonSubstitution]) -> Iterator[tuple]:
+    """Merge runs of consecutive equal substitutions in one pass.
+
+    Yields the last substitution of each run together with the first period of the run.
+    """
+    last_sub, last_key, start_period = None, None, None
+    for sub in subs:
+        key = _substitution_merge_key(sub)
+        if last_sub is not None and key != last_key:
+            yield last_sub, start_period
+            start_period = None
+
+        if start_period is None:
+            start_period = sub.lesson_period.period.period
+        last_sub, last_key = sub, key
+
+    if last_sub is not None:
+        yield last_sub, start_period
+
+
 def build_substitutions_list(wanted_day: date) -> List[dict]:
     rows = []
 
-    subs = LessonSubstitution.objects.on_day(wanted_day).order_by(
-        "lesson_period__lesson__groups", "lesson_period__period"
+    subs = list(
+        LessonSubstitution.objects.on_day(wanted_day).order_by(
+            "lesson_period__lesson__groups", "lesson_period__period"
+        )
     )
+    use_parent_groups = get_site_preferences()["chronos__use_parent_groups"]
 
-    start_period = None
-    for i, sub in enumerate(subs):
+    for sub, start_period in _merge_substitutions(subs):
+        lesson = sub.lesson_period.lesson
         if not sub.cancelled_for_teachers:
-            sort_a = sub.lesson_period.lesson.groups_to_show_names
+            sort_a = _groups_to_show_names(lesson, use_parent_groups)
         else:
-            sort_a = f"Z.{sub.lesson_period.lesson.teacher_names}"
-
-        # Get next substitution
-        next_sub = subs[i + 1] if i + 1 < len(subs) else None
-
-        # Check if next substitution is equal with this substitution
-        if (
-            next_sub
-            and sub.comment == next_sub.comment
-            and sub.cancelled == next_sub.cancelled
-            and sub.subject == next_sub.subject
-            and sub.room == next_sub.room
-            and sub.lesson_period.lesson == next_sub.lesson_period.lesson
-            and set(sub.teachers.all()) == set(next_sub.teachers.all())
-        ):
-            if not start_period:
-                start_period = sub.lesson_period.period.period
-            continue
+            sort_a = f"Z.{lesson.teacher_names}"
 
         row = {
             "type": "substitution",
             "sort_a": sort_a,
             "sort_b": str(sub.lesson_period.period.period),
             "el": sub,
-            "start_period": start_period if start_period else sub.lesson_period.period.period,
+            "start_period": start_period,
             "end_period": sub.lesson_period.period.period,
         }
-
-        if start_period:
-            start_period = None
-
         rows.append(row)
 
     # Get supervision substitutions
@@ -351,11 +623,157 @@ def build_substitutions_list(wanted_day: date) -> List[dict]:
     return rows
 
 
+def _days_within(start: date, end: date) -> Dict[date, Any]:
+    """Get a dict with an empty set for every day within a date range."""
+    return {start + timedelta(days=i): set() for i in range((end - start).days + 1)}
+
+
+def build_header_box(start: date, end: date) -> Dict[date, Dict[str, list]]:
+    """Build the header box of the substitutions list for all days within a date range.
+
+    Absent and affected teachers and groups are loaded for the whole range at once
+    and then grouped by date, so the number of queries doesn't depend on the number of days.
+    """
+    absent_teachers_per_day = _days_within(start, end)
+    absent_groups_per_day = _days_within(start, end)
+    for date_start, date_end, teacher_id, group_id in Absence.objects.within_dates(
+        start, end
+    ).values_list("date_start", "date_end", "teacher_id", "group_id"):
+        for day in _days_within(max(date_start, start), min(date_end, end)):
+            if teacher_id:
+                absent_teachers_per_day[day].add(teacher_id)
+            if group_id:
+                absent_groups_per_day[day].add(group_id)
+
+    # One row per substitution and substituting teacher
+    lessons_per_day = _days_within(start, end)
+    affected_teachers_per_day = _days_within(start, end)
+    for day, lesson_id, teacher_id in (
+        LessonSubstitution.objects.within_dates(start, end)
+        .prefetch_related(None)
+        .values_list("date", "lesson_period__lesson", "teachers")
+    ):
+        lessons_per_day[day].add(lesson_id)
+        if teacher_id:
+            affected_teachers_per_day[day].add(teacher_id)
+
+    lesson_ids = set().union(*lessons_per_day.values())
+    teachers_per_lesson, groups_per_lesson = {}, {}
+    for lesson_id, teacher_id in Lesson.teachers.through.objects.filter(
+        lesson_id__in=lesson_ids
+    ).values_list("lesson_id", "person_id"):
+        teachers_per_lesson.setdefault(lesson_id, set()).add(teacher_id)
+    for lesson_id, group_id in Lesson.groups.through.objects.filter(
+        lesson_id__in=lesson_ids
+    ).values_list("lesson_id", "group_id"):
+        groups_per_lesson.setdefault(lesson_id, set()).add(group_id)
+
+    affected_groups_per_day = _days_within(start, end)
+    for day, lesson_ids_on_day in lessons_per_day.items():
+        for lesson_id in lesson_ids_on_day:
+            affected_teachers_per_day[day] |= teachers_per_lesson.get(lesson_id, set())
+            affected_groups_per_day[day] |= groups_per_lesson.get(lesson_id, set())
+
+    teacher_ids = set().union(
+        *absent_teachers_per_day.values(), *affected_teachers_per_day.values()
+    )
+    group_ids = set().union(*absent_groups_per_day.values(), *affected_groups_per_day.values())
+    teachers = {teacher.pk: teacher for teacher in Person.objects.filter(pk__in=teacher_ids)}
+    groups = {
+        group.pk: group
+        for group in Group.objects.filter(pk__in=group_ids).prefetch_related(
+            "parent_groups", "parent_groups__parent_groups"
+        )
+    }
+
+    use_parent_groups = get_site_preferences()["chronos__affected_groups_parent_groups"]
+
+    def _sorted(objs: Iterable[Union[Person, Group]]) -> list:
+        return sorted(objs, key=lambda obj: obj.short_name or "")
+
+    def _affected_groups(ids: Iterable[int]) -> List[Group]:
+        affected_groups = {}
+        for group_id in ids:
+            group = groups[group_id]
+            parent_groups = list(group.parent_groups.all()) if use_parent_groups else []
+            for affected_group in parent_groups or [group]:
+                affected_groups[affected_group.pk] = affected_group
+        return _sorted(affected_groups.values())
+
+    return {
+        day: {
+            "absent_teachers": _sorted(teachers[pk] for pk in absent_teachers_per_day[day]),
+            "absent_groups": _sorted(groups[pk] for pk in absent_groups_per_day[day]),
+            "affected_teachers": _sorted(teachers[pk] for pk in affected_teachers_per_day[day]),
+            "affected_groups": _affected_groups(affected_groups_per_day[day]),
+        }
+        for day in lessons_per_day
+    }
+
+
+def get_substitution_days(wanted_day: date, is_print: bool = False) -> List[date]:
+    """Get the days shown in the (printed) substitution plan starting at a day."""
+    if not is_print:
+        return [wanted_day]
+
+    days = [wanted_day]
+    for __ in range(get_site_preferences()["chronos__substitutions_print_number_of_days"] - 1):
+        days.append(TimePeriod.get_next_relevant_day(days[-1] + timedelta(days=1)))
+    return days
+
+
+def build_substitution_day_contexts(days: List[date]) -> Dict[date, dict]:
+    """Build the context data of the substitution plans of days."""
+    day_contexts = {day: {"day": day} for day in days}
+
+    for day in day_contexts:
+        subs = build_substitutions_list(day)
+        day_contexts[day]["substitutions"] = subs
+
+        day_contexts[day]["announcements"] = (
+            Announcement.for_timetables().on_date(day).filter(show_in_timetables=True)
+        )
+
+    if get_site_preferences()["chronos__substitutions_show_header_box"]:
+        header_box = build_header_box(min(day_contexts), max(day_contexts))
+        for day in day_contexts:
+            day_contexts[day].update(header_box[day])
+
+    return day_contexts
+
+
+def build_substitutions_context(wanted_day: date, is_print: bool = False) -> Tuple[str, dict]:
+    """Build the template name and the context of the (printed) substitution plan of a day."""
+    context = {}
+    day_contexts = build_substitution_day_contexts(
+        get_substitution_days(wanted_day, is_print=is_print)
+    )
+
+    if not is_print:
+        context = day_contexts[wanted_day]
+        context["datepicker"] = {
+            "date": date_unix(wanted_day),
+            "dest": reverse("substitutions"),
+        }
+
+        context["url_prev"], context["url_next"] = TimePeriod.get_prev_next_by_day(
+            wanted_day, "substitutions_by_date"
+        )
+
+        template_name = "chronos/substitutions.html"
+    else:
+        context["days"] = day_contexts
+        template_name = "chronos/substitutions_print.html"
+
+    return template_name, context
+
+
 def build_weekdays(base: List[Tuple[int, str]], wanted_week: CalendarWeek) -> List[dict]:
     holidays_per_weekday = Holiday.in_week(wanted_week)
+    grid = TimePeriod.get_grid(wanted_week[0])
 
     weekdays = []
-    for key, name in base[TimePeriod.weekday_min : TimePeriod.weekday_max + 1]:
+    for key, name in base[grid.weekday_min : grid.weekday_max + 1]:
 
         weekday = {
             "key": key,
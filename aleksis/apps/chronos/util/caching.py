@@ -0,0 +1,156 @@
+import time
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from django.core.cache import cache
+from django.db import transaction
+
+from calendarweek import CalendarWeek
+
+TIMETABLE_CACHE_TIMEOUT = 24 * 3600
+TIMETABLE_CACHE_PREFIX = "chronos_timetable"
+TIMETABLE_CACHE_VERSION_KEY = f"{TIMETABLE_CACHE_PREFIX}_version"
+TIMETABLE_CACHE_HITS_KEY = f"{TIMETABLE_CACHE_PREFIX}_hits"
+TIMETABLE_CACHE_MISSES_KEY = f"{TIMETABLE_CACHE_PREFIX}_misses"
+
+
+def _new_version() -> int:
+    """Get a fresh cache version.
+
+    The version is based on the current time so that a version key which got evicted
+    from the cache can't be recreated with a number that was already in use.
+    """
+    return time.time_ns()
+
+
+def _week_version_key(week: CalendarWeek) -> str:
+    return f"{TIMETABLE_CACHE_VERSION_KEY}_{week.year}_{week.week}"
+
+
+def _incr(key: str):
+    """Increment a counter in the cache, creating it if necessary."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def _set_versions(keys: Iterable[str]):
+    """Move version keys to new versions now and again after the transaction has been committed.
+
+    Otherwise, other processes could read data before it has been committed and
+    store results built from it under the new versions.
+    """
+    keys = list(keys)
+    cache.set_many({key: _new_version() for key in keys}, None)
+    transaction.on_commit(lambda: cache.set_many({key: _new_version() for key in keys}, None))
+
+
+def bump_version(key: str):
+    """Move a version key to a new version, also after the current transaction is committed."""
+    _set_versions([key])
+
+
+def get_version(key: str) -> int:
+    """Get the current version stored in a version key, initialising it if necessary."""
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_timetable_data_versions(weeks: Iterable[CalendarWeek]) -> List[int]:
+    """Get the global version and the week-specific versions of timetable data of weeks."""
+    version_keys = [TIMETABLE_CACHE_VERSION_KEY] + [_week_version_key(week) for week in weeks]
+    versions = cache.get_many(version_keys)
+
+    for key in version_keys:
+        if key not in versions:
+            versions[key] = _new_version()
+            if not cache.add(key, versions[key], None):
+                versions[key] = cache.get(key, versions[key])
+
+    return [versions[key] for key in version_keys]
+
+
+def get_timetable_cache_versions(week: CalendarWeek) -> str:
+    """Get the combined global and week-specific version for cached timetables of a week."""
+    return ".".join(str(version) for version in get_timetable_data_versions([week]))
+
+
+def get_timetable_cache_key(type_: Any, pk: int, date_ref: Union[CalendarWeek, date]) -> str:
+    """Build the cache key for a timetable of an object in a week or on a day.
+
+    The key includes the current cache versions, so invalidating a version
+    makes all keys built with the old version unreachable. Smart and regular
+    timetables share their rows, so the mode isn't part of the key.
+    """
+    if isinstance(date_ref, CalendarWeek):
+        week = date_ref
+        ref = f"{date_ref.year}-W{date_ref.week}"
+    else:
+        week = CalendarWeek.from_date(date_ref)
+        ref = date_ref.isoformat()
+
+    type_ = getattr(type_, "value", type_)
+    version = get_timetable_cache_versions(week)
+
+    return f"{TIMETABLE_CACHE_PREFIX}_{version}_{type_}_{pk}_{ref}"
+
+
+def get_cached_timetable(key: str, count_miss: bool = True) -> Optional[Any]:
+    """Get a cached timetable and count the lookup as hit or miss.
+
+    Without `count_miss`, misses aren't counted, e.g. because the timetable is
+    built from another cached timetable whose lookup is counted itself.
+    """
+    value = cache.get(key)
+    if value is not None:
+        _incr(TIMETABLE_CACHE_HITS_KEY)
+    elif count_miss:
+        _incr(TIMETABLE_CACHE_MISSES_KEY)
+    return value
+
+
+def set_cached_timetable(key: str, value: Any):
+    """Store a built timetable in the cache."""
+    cache.set(key, value, TIMETABLE_CACHE_TIMEOUT)
+
+
+def weeks_between(start: date, end: date) -> Iterable[CalendarWeek]:
+    """Get all calendar weeks touched by a date range."""
+    week = CalendarWeek.from_date(start)
+    end_week = CalendarWeek.from_date(end)
+    while week[0] <= end_week[0]:
+        yield week
+        week += 1
+
+
+def invalidate_timetable_cache(weeks: Optional[Iterable[CalendarWeek]] = None):
+    """Invalidate cached timetables.
+
+    If weeks are provided, only timetables of these weeks (or days within them)
+    are invalidated; otherwise, all cached timetables are. The versions are moved
+    on again once the current transaction has been committed.
+    """
+    if weeks is None:
+        bump_version(TIMETABLE_CACHE_VERSION_KEY)
+        return
+
+    _set_versions(_week_version_key(week) for week in weeks)
+
+
+def get_timetable_cache_stats() -> Dict[str, int]:
+    """Get hit and miss counters of the timetable cache."""
+    stats = cache.get_many([TIMETABLE_CACHE_HITS_KEY, TIMETABLE_CACHE_MISSES_KEY])
+    hits = stats.get(TIMETABLE_CACHE_HITS_KEY, 0)
+    misses = stats.get(TIMETABLE_CACHE_MISSES_KEY, 0)
+    return {"hits": hits, "misses": misses}
+
+
+def reset_timetable_cache_stats():
+    """Reset hit and miss counters of the timetable cache."""
+    cache.delete_many([TIMETABLE_CACHE_HITS_KEY, TIMETABLE_CACHE_MISSES_KEY])
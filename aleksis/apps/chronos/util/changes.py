@@ -0,0 +1,136 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Max, Model
+from django.utils import timezone
+
+from aleksis.core.util.core_helpers import get_site_preferences
+
+CHANGES_PAGE_SIZE = 100
+CHANGES_MAX_PAGE_SIZE = 1000
+
+# Changes are only served once they are older than this, so that changes
+# which got a lower number but were committed later can't be skipped
+CHANGES_SAFETY_LAG = timedelta(seconds=5)
+
+
+def _get_dates(instance: Model) -> Tuple[Optional[date], Optional[date]]:
+    """Get the range of dates affected by a substitution, an extra lesson or an event."""
+    if hasattr(instance, "date_start"):
+        return instance.date_start, instance.date_end
+    return instance.date, instance.date
+
+
+def record_change(instance: Model, action: str):
+    """Record a change of a substitution, an extra lesson or an event in the change feed.
+
+    The change is recorded after the current transaction has been committed,
+    so changes are numbered in the order they became visible.
+    """
+    TimetableChange = apps.get_model("chronos", "TimetableChange")
+
+    date_start, date_end = _get_dates(instance)
+    change = TimetableChange(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        action=action,
+        date_start=date_start,
+        date_end=date_end,
+    )
+    transaction.on_commit(change.save)
+
+
+def _serialize_objects(changes: List["TimetableChange"]) -> Dict[Tuple[int, int], Dict[str, Any]]:
+    """Get the current data of all still existing objects of changes, with one query per model."""
+    ids_per_type = {}
+    for change in changes:
+        if change.action != change.DELETED:
+            ids_per_type.setdefault(change.content_type_id, set()).add(change.object_id)
+
+    objects = {}
+    for content_type_id, ids in ids_per_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        qs = model.objects.filter(pk__in=ids)
+        for data in serializers.serialize("python", qs):
+            objects[(content_type_id, data["pk"])] = data["fields"]
+    return objects
+
+
+def get_changes_since(since: int = 0, limit: int = CHANGES_PAGE_SIZE) -> Dict[str, Any]:
+    """Get one page of changes recorded after the change with the number `since`.
+
+    Each change contains the current data of the changed object unless it has
+    been deleted in the meantime. Clients continue with the returned `last`
+    number as long as `more` is set. Changes younger than `CHANGES_SAFETY_LAG`
+    are held back until all changes with lower numbers are surely visible.
+
+    If changes after `since` have already been pruned, `reset` is set and the
+    page starts with the oldest retained change. Clients then have to discard
+    their state and load all data again before applying the changes.
+    """
+    TimetableChange = apps.get_model("chronos", "TimetableChange")
+
+    limit = max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+
+    pruned_until = get_site_preferences()["chronos__changes_pruned_until"]
+    reset = since < pruned_until
+    if reset:
+        since = pruned_until
+
+    changes = list(
+        TimetableChange.objects.filter(
+            pk__gt=since, changed_at__lte=timezone.now() - CHANGES_SAFETY_LAG
+        ).select_related("content_type")[: limit + 1]
+    )
+    more = len(changes) > limit
+    changes = changes[:limit]
+    objects = _serialize_objects(changes)
+
+    return {
+        "changes": [
+            {
+                "id": change.pk,
+                "type": change.content_type.model,
+                "object_id": change.object_id,
+                "action": change.action,
+                "date_start": change.date_start,
+                "date_end": change.date_end,
+                "changed_at": change.changed_at,
+                "object": objects.get((change.content_type_id, change.object_id)),
+            }
+            for change in changes
+        ],
+        "last": changes[-1].pk if changes else since,
+        "more": more,
+        "reset": reset,
+    }
+
+
+def prune_changes(retention_days: Optional[int] = None) -> int:
+    """Delete all changes older than the retention period and return their number.
+
+    The number of the newest pruned change is recorded, so that clients which
+    missed pruned changes can be told to load all data again.
+    """
+    TimetableChange = apps.get_model("chronos", "TimetableChange")
+
+    prefs = get_site_preferences()
+    if retention_days is None:
+        retention_days = prefs["chronos__changes_retention_days"]
+
+    with transaction.atomic():
+        qs = TimetableChange.objects.filter(
+            changed_at__lt=timezone.now() - timedelta(days=retention_days)
+        )
+        newest_pruned = qs.aggregate(newest=Max("pk"))["newest"]
+        if newest_pruned is None:
+            return 0
+
+        if newest_pruned > prefs["chronos__changes_pruned_until"]:
+            prefs["chronos__changes_pruned_until"] = newest_pruned
+        deleted, __ = qs.filter(pk__lte=newest_pruned).delete()
+    return deleted
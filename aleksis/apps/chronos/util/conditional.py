@@ -0,0 +1,60 @@
+from hashlib import sha1
+from typing import Any, Callable, Iterable, List, Tuple
+
+from django.http import HttpRequest
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+
+from calendarweek import CalendarWeek
+
+from .caching import bump_version, get_timetable_data_versions, get_version
+from .roles import PERSON_ROLES_VERSION_KEY
+
+VIEW_DATA_VERSION_KEY = "chronos_view_data_version"
+
+
+def get_view_data_versions(weeks: Iterable[CalendarWeek]) -> List[int]:
+    """Get the versions of all data shown in timetable and substitution views of weeks.
+
+    Besides the versions of the timetable data, this includes the versions
+    of announcements and absences and of the person role index.
+    """
+    return get_timetable_data_versions(weeks) + [
+        get_version(VIEW_DATA_VERSION_KEY),
+        get_version(PERSON_ROLES_VERSION_KEY),
+    ]
+
+
+def get_view_etag(request: HttpRequest, weeks: Iterable[CalendarWeek], *parts: Any) -> str:
+    """Build an ETag for a view showing data of weeks to the requesting user.
+
+    The parts should contain everything the response depends on besides the data,
+    e.g. the resolved date and the shown timetable.
+    """
+    versions = get_view_data_versions(weeks)
+    value = "|".join(str(part) for part in [request.user.pk, get_language(), *parts, *versions])
+    return sha1(value.encode()).hexdigest()  # noqa: S303
+
+
+def invalidate_view_data():
+    """Mark data shown in views besides timetables (announcements, absences) as changed."""
+    bump_version(VIEW_DATA_VERSION_KEY)
+
+
+def conditional_view(get_scope: Callable[..., Tuple[Iterable[CalendarWeek], List[Any]]]):
+    """Answer conditional GET requests to a view by the versions of the shown data.
+
+    `get_scope` gets the arguments of the view and returns the shown weeks
+    together with all other parts the response depends on. It is called
+    before the view, so it has to be cheap.
+
+    Only ETags are used as validators: the day shown by views without a date
+    changes without any change to the data, so a modification time of the data
+    alone could make clients keep the page of a previous day.
+    """
+
+    def _etag(request: HttpRequest, *args, **kwargs) -> str:
+        weeks, parts = get_scope(*args, **kwargs)
+        return get_view_etag(request, weeks, *parts)
+
+    return condition(etag_func=_etag)
@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional
+
+from django.apps import apps
+from django.core.cache import cache
+
+from .caching import bump_version, get_version
+
+TIMETABLE_DIRECTORY_VERSION_KEY = "chronos_timetable_directory_version"
+TIMETABLE_DIRECTORY_TIMEOUT = 24 * 3600
+
+TimetableDirectory = Dict[str, List[int]]
+
+
+def _build_timetable_directory(validity_range: Optional["ValidityRange"]) -> TimetableDirectory:
+    """Get the IDs of all teachers, classes and rooms with lessons in a validity range."""
+    Group = apps.get_model("core", "Group")
+    Lesson = apps.get_model("chronos", "Lesson")
+    LessonPeriod = apps.get_model("chronos", "LessonPeriod")
+
+    lessons = Lesson.objects.all()
+    if validity_range:
+        lessons = lessons.filter(validity=validity_range)
+
+    teacher_ids = (
+        Lesson.teachers.through.objects.filter(lesson__in=lessons)
+        .values_list("person_id", flat=True)
+        .distinct()
+    )
+
+    # Classes are top-level groups which have lessons themselves or through their child groups
+    group_ids = set(
+        Lesson.groups.through.objects.filter(lesson__in=lessons).values_list("group_id", flat=True)
+    )
+    group_ids.update(
+        Group.parent_groups.through.objects.filter(from_group_id__in=group_ids).values_list(
+            "to_group_id", flat=True
+        )
+    )
+    class_ids = Group.objects.for_current_school_term_or_all().filter(
+        pk__in=group_ids, parent_groups=None
+    )
+
+    room_ids = (
+        LessonPeriod.objects.select_related(None)
+        .prefetch_related(None)
+        .filter(lesson__in=lessons, room__isnull=False)
+        .values_list("room_id", flat=True)
+        .distinct()
+    )
+
+    return {
+        "teachers": list(teacher_ids),
+        "classes": list(class_ids.values_list("pk", flat=True)),
+        "rooms": list(room_ids),
+    }
+
+
+def get_timetable_directory() -> TimetableDirectory:
+    """Get the IDs of all teachers, classes and rooms with timetables in the current validity range.
+
+    The directory is kept in the cache until lessons or groups change.
+    """
+    ValidityRange = apps.get_model("chronos", "ValidityRange")
+
+    validity_range = ValidityRange.get_current()
+    validity_range_id = validity_range.pk if validity_range else "all"
+    version = get_version(TIMETABLE_DIRECTORY_VERSION_KEY)
+    key = f"{TIMETABLE_DIRECTORY_VERSION_KEY}_{version}_{validity_range_id}"
+
+    directory = cache.get(key)
+    if directory is None:
+        directory = _build_timetable_directory(validity_range)
+        cache.set(key, directory, TIMETABLE_DIRECTORY_TIMEOUT)
+    return directory
+
+
+def invalidate_timetable_directory():
+    """Make the timetable directory be rebuilt on next access."""
+    bump_version(TIMETABLE_DIRECTORY_VERSION_KEY)
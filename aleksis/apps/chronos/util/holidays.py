@@ -0,0 +1,104 @@
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from django.apps import apps
+
+from calendarweek import CalendarWeek
+
+from .caching import bump_version, get_version
+
+HOLIDAY_CALENDAR_VERSION_KEY = "chronos_holiday_calendar_version"
+
+
+class HolidayCalendar:
+    """Sorted interval index of all holidays.
+
+    Holidays are sorted by their start dates. Together with the running maximum
+    of their end dates, this allows answering all lookups by bisecting
+    without querying the database.
+    """
+
+    def __init__(self, holidays: List["Holiday"]):
+        self.holidays = sorted(
+            (holiday for holiday in holidays if holiday.date_start and holiday.date_end),
+            key=lambda holiday: holiday.date_start,
+        )
+        self.starts = [holiday.date_start for holiday in self.holidays]
+
+        self.max_ends = []
+        max_end = date.min
+        for holiday in self.holidays:
+            max_end = max(max_end, holiday.date_end)
+            self.max_ends.append(max_end)
+
+    def within_dates(self, start: date, end: date) -> List["Holiday"]:
+        """Get all holidays overlapping with a date range, ordered by start date."""
+        holidays = []
+        index = bisect_right(self.starts, end) - 1
+
+        # Once the running maximum of end dates is before the start date,
+        # no holiday with an earlier start date can overlap with the range
+        while index >= 0 and self.max_ends[index] >= start:
+            if self.holidays[index].date_end >= start:
+                holidays.append(self.holidays[index])
+            index -= 1
+
+        holidays.reverse()
+        return holidays
+
+    def on_day(self, day: date) -> Optional["Holiday"]:
+        """Get the first holiday on a day."""
+        holidays = self.within_dates(day, day)
+        return holidays[0] if holidays else None
+
+    def in_week(
+        self, week: CalendarWeek, weekday_min: int, weekday_max: int
+    ) -> Dict[int, "Holiday"]:
+        """Get the first holiday per weekday of a week."""
+        holidays = self.within_dates(week[weekday_min], week[weekday_max])
+
+        per_weekday = {}
+        for weekday in range(weekday_min, weekday_max + 1):
+            day = week[weekday]
+            for holiday in holidays:
+                if holiday.date_start <= day <= holiday.date_end:
+                    per_weekday[weekday] = holiday
+                    break
+
+        return per_weekday
+
+    def get_all_days(self, start: date, end: date) -> List[date]:
+        """Get all days within a date range which are part of a holiday."""
+        days = set()
+        for holiday in self.within_dates(start, end):
+            day = max(holiday.date_start, start)
+            while day <= min(holiday.date_end, end):
+                days.add(day)
+                day += timedelta(days=1)
+        return sorted(days)
+
+
+_calendar = None
+_calendar_version = None
+
+
+def get_holiday_calendar() -> HolidayCalendar:
+    """Get the holiday calendar of this process.
+
+    It is loaded from the database once and reloaded only after holidays have changed.
+    """
+    global _calendar, _calendar_version
+
+    version = get_version(HOLIDAY_CALENDAR_VERSION_KEY)
+    if _calendar is None or version != _calendar_version:
+        Holiday = apps.get_model("chronos", "Holiday")
+        _calendar = HolidayCalendar(list(Holiday.objects.all()))
+        _calendar_version = version
+
+    return _calendar
+
+
+def invalidate_holiday_calendar():
+    """Make all processes reload their holiday calendar."""
+    bump_version(HOLIDAY_CALENDAR_VERSION_KEY)
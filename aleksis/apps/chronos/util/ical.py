@@ -0,0 +1,226 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, Optional, Union
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from aleksis.core.models import Group, Person
+from aleksis.core.util.core_helpers import has_person
+
+from ..managers import TimetableType
+from .holidays import get_holiday_calendar
+
+# Salt separating signed feed tokens from other signed values, not a secret
+ICAL_TOKEN_SALT = "aleksis.apps.chronos.ical"  # noqa: S105
+ICAL_CHUNK_SIZE = 500
+ICAL_MAX_DAYS = 400
+ICAL_PRODID = "-//AlekSIS//Chronos//EN"
+
+
+def _get_ical_fingerprint(user) -> str:
+    """Get a fingerprint of the calendar feed secret of a user.
+
+    Changing the secret in the person's preferences revokes all tokens issued before.
+    """
+    secret = user.person.preferences["chronos__calendar_feed_secret"] if has_person(user) else ""
+    return salted_hmac(ICAL_TOKEN_SALT, secret).hexdigest()[:16]
+
+
+def get_ical_token(user, type_: str, pk: Optional[int] = None) -> str:
+    """Get a token allowing to subscribe to a timetable without logging in."""
+    return signing.dumps(
+        [user.pk, type_, pk, _get_ical_fingerprint(user)], salt=ICAL_TOKEN_SALT, compress=True
+    )
+
+
+def check_ical_token(token: str, type_: str, pk: Optional[int] = None):
+    """Get the active user a token has been issued to if it is valid for a timetable."""
+    try:
+        user_id, token_type, token_pk, fingerprint = signing.loads(token, salt=ICAL_TOKEN_SALT)
+    except (signing.BadSignature, ValueError):
+        return None
+    if token_type != type_ or token_pk != pk:
+        return None
+
+    user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+    if not user or not constant_time_compare(fingerprint, _get_ical_fingerprint(user)):
+        return None
+    return user
+
+
+def _escape(value: str) -> str:
+    """Escape a text value for iCalendar."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Fold a content line to at most 75 octets per line and terminate it."""
+    encoded = line.encode("utf-8")
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Don't split multi-byte characters
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _format_datetime(day: date, time_: time) -> str:
+    """Format a local date and time as UTC date time value."""
+    value = timezone.make_aware(datetime.combine(day, time_))
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _event(
+    uid: str,
+    start: str,
+    end: str,
+    summary: str,
+    location: Optional[str] = None,
+    description: Optional[str] = None,
+    cancelled: bool = False,
+    all_day: bool = False,
+) -> str:
+    """Build a VEVENT component."""
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{timezone.now():%Y%m%dT%H%M%SZ}"]
+    if all_day:
+        lines += [f"DTSTART;VALUE=DATE:{start}", f"DTEND;VALUE=DATE:{end}"]
+    else:
+        lines += [f"DTSTART:{start}", f"DTEND:{end}"]
+    lines.append(f"SUMMARY:{_escape(summary)}")
+    if location:
+        lines.append(f"LOCATION:{_escape(location)}")
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(description)}")
+    if cancelled:
+        lines.append("STATUS:CANCELLED")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def _in_chunks(qs: QuerySet) -> Iterator:
+    """Iterate over a queryset in chunks, loading related data per chunk.
+
+    Only the primary keys are loaded at once, so memory usage doesn't
+    grow with the number of objects.
+    """
+    pks = list(qs.select_related(None).prefetch_related(None).values_list("pk", flat=True))
+    for index in range(0, len(pks), ICAL_CHUNK_SIZE):
+        yield from qs.model.objects.filter(pk__in=pks[index : index + ICAL_CHUNK_SIZE])
+
+
+def _names(objects: Iterable[Union[Person, Group, "Room"]]) -> str:
+    return ", ".join(obj.short_name or str(obj) for obj in objects)
+
+
+def _filter(qs: QuerySet, type_: TimetableType, obj: Union[Group, Person, "Room"], is_person: bool):
+    if is_person and type_ == TimetableType.GROUP:
+        return qs.filter_participant(obj)
+    return qs.filter_from_type(type_, obj)
+
+
+def generate_ical(
+    type_: Union[TimetableType, str],
+    obj: Union[Group, Person, "Room"],
+    start: date,
+    end: date,
+    name: str,
+) -> Iterator[str]:
+    """Generate an iCalendar feed of a timetable within a date range.
+
+    Lessons are taken from the occurrence table, so substitutions, cancellations
+    and holidays are applied as in the smart timetable. Extra lessons, events
+    and holidays are added. The feed is generated in chunks of components.
+    """
+    Event = apps.get_model("chronos", "Event")
+    ExtraLesson = apps.get_model("chronos", "ExtraLesson")
+    LessonOccurrence = apps.get_model("chronos", "LessonOccurrence")
+    Site = apps.get_model("sites", "Site")
+
+    domain = Site.objects.get_current().domain
+    holidays = get_holiday_calendar()
+    is_person = type_ == "person"
+    if is_person:
+        type_ = obj.timetable_type
+
+    yield "".join(
+        _fold(line)
+        for line in [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            f"PRODID:{ICAL_PRODID}",
+            "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH",
+            f"X-WR-CALNAME:{_escape(name)}",
+        ]
+    )
+
+    if type_ is not None:
+        occurrences = _filter(
+            LessonOccurrence.objects.within_dates(start, end), type_, obj, is_person
+        )
+        for occurrence in _in_chunks(occurrences):
+            lesson = occurrence.lesson_period.lesson
+            yield _event(
+                f"lesson-{occurrence.lesson_period_id}-{occurrence.date:%Y%m%d}@{domain}",
+                _format_datetime(occurrence.date, occurrence.period.time_start),
+                _format_datetime(occurrence.date, occurrence.period.time_end),
+                f"{occurrence.subject.name if occurrence.subject else ''} "
+                f"({_names(occurrence.teachers.all())})",
+                occurrence.room.name if occurrence.room else None,
+                "\n".join(filter(None, [_names(lesson.groups.all()), occurrence.comment])),
+                cancelled=occurrence.cancelled,
+            )
+
+        extra_lessons = ExtraLesson.objects.within_dates(start, end).exclude_holidays(
+            holidays.within_dates(start, end)
+        )
+        for extra_lesson in _in_chunks(_filter(extra_lessons, type_, obj, is_person)):
+            yield _event(
+                f"extra-lesson-{extra_lesson.pk}@{domain}",
+                _format_datetime(extra_lesson.date, extra_lesson.period.time_start),
+                _format_datetime(extra_lesson.date, extra_lesson.period.time_end),
+                f"{extra_lesson.subject.name} ({_names(extra_lesson.teachers.all())})",
+                extra_lesson.room.name if extra_lesson.room else None,
+                "\n".join(filter(None, [_names(extra_lesson.groups.all()), extra_lesson.comment])),
+            )
+
+        events = Event.objects.within_dates(start, end)
+        for event in _in_chunks(_filter(events, type_, obj, is_person)):
+            days = (event.date_end - event.date_start).days + 1
+            if len(holidays.get_all_days(event.date_start, event.date_end)) == days:
+                # Events completely within holidays aren't shown in timetables
+                continue
+            yield _event(
+                f"event-{event.pk}@{domain}",
+                _format_datetime(event.date_start, event.period_from.time_start),
+                _format_datetime(event.date_end, event.period_to.time_end),
+                str(event),
+                _names(event.rooms.all()),
+                "\n".join(filter(None, [_names(event.groups.all()), _names(event.teachers.all())])),
+            )
+
+    for holiday in holidays.within_dates(start, end):
+        yield _event(
+            f"holiday-{holiday.pk}@{domain}",
+            f"{holiday.date_start:%Y%m%d}",
+            f"{holiday.date_end + timedelta(days=1):%Y%m%d}",
+            holiday.title,
+            all_day=True,
+        )
+
+    yield _fold("END:VCALENDAR")
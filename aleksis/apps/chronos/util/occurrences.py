@@ -0,0 +1,153 @@
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .caching import bump_version
+from .holidays import get_holiday_calendar
+
+OCCURRENCES_BATCH_SIZE = 1000
+LESSON_OCCURRENCES_VERSION_KEY = "chronos_lesson_occurrences_version"
+
+
+def _dates_on_weekday(start: date, end: date, weekday: int) -> Iterator[date]:
+    """Get all dates on a weekday within a date range."""
+    day = start + timedelta(days=(weekday - start.weekday()) % 7)
+    while day <= end:
+        yield day
+        day += timedelta(days=7)
+
+
+def rebuild_occurrences(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    lesson_periods: Optional[Iterable[int]] = None,
+) -> int:
+    """Regenerate the occurrences of lesson periods within a date range.
+
+    Without a date range, all occurrences within the validity ranges of the lessons
+    are regenerated; without lesson periods, the occurrences of all lesson periods are.
+    Returns the number of generated occurrences.
+
+    Once the regenerated occurrences have been committed, the version of the
+    occurrences is moved on, so that data derived from them can be validated.
+    """
+    Lesson = apps.get_model("chronos", "Lesson")
+    LessonPeriod = apps.get_model("chronos", "LessonPeriod")
+    LessonSubstitution = apps.get_model("chronos", "LessonSubstitution")
+    LessonOccurrence = apps.get_model("chronos", "LessonOccurrence")
+
+    lesson_period_qs = LessonPeriod.objects.select_related(
+        "lesson__validity", "lesson__subject", "period", "room"
+    ).prefetch_related(None)
+    occurrences_qs = LessonOccurrence.objects.select_related(None).prefetch_related(None)
+    substitutions_qs = (
+        LessonSubstitution.objects.select_related(None)
+        .prefetch_related(None)
+        .prefetch_related("teachers")
+    )
+
+    if lesson_periods is not None:
+        lesson_periods = list(lesson_periods)
+        lesson_period_qs = lesson_period_qs.filter(pk__in=lesson_periods)
+        occurrences_qs = occurrences_qs.filter(lesson_period__in=lesson_periods)
+        substitutions_qs = substitutions_qs.filter(lesson_period__in=lesson_periods)
+    if start and end:
+        lesson_period_qs = lesson_period_qs.filter(
+            lesson__validity__date_start__lte=end, lesson__validity__date_end__gte=start
+        )
+        occurrences_qs = occurrences_qs.within_dates(start, end)
+        substitutions_qs = substitutions_qs.within_dates(start, end)
+
+    lesson_period_list = list(lesson_period_qs)
+    teachers_per_lesson = {}
+    lesson_ids = {lesson_period.lesson_id for lesson_period in lesson_period_list}
+    for lesson_id, teacher_id in Lesson.teachers.through.objects.filter(
+        lesson_id__in=lesson_ids
+    ).values_list("lesson_id", "person_id"):
+        teachers_per_lesson.setdefault(lesson_id, set()).add(teacher_id)
+
+    substitutions = {(sub.lesson_period_id, sub.date): sub for sub in substitutions_qs}
+    holidays = get_holiday_calendar()
+
+    occurrences, teacher_ids = [], {}
+    for lesson_period in lesson_period_list:
+        validity = lesson_period.lesson.validity
+        if not validity:
+            continue
+
+        range_start = max(start, validity.date_start) if start else validity.date_start
+        range_end = min(end, validity.date_end) if end else validity.date_end
+        holiday_days = set(holidays.get_all_days(range_start, range_end))
+
+        for day in _dates_on_weekday(range_start, range_end, lesson_period.period.weekday):
+            if day in holiday_days:
+                continue
+
+            sub = substitutions.get((lesson_period.pk, day))
+            sub_teachers = {teacher.pk for teacher in sub.teachers.all()} if sub else set()
+
+            occurrences.append(
+                LessonOccurrence(
+                    lesson_period=lesson_period,
+                    substitution=sub,
+                    date=day,
+                    period=lesson_period.period,
+                    subject_id=(
+                        sub.subject_id
+                        if sub and sub.subject_id
+                        else lesson_period.lesson.subject_id
+                    ),
+                    room_id=sub.room_id if sub and sub.room_id else lesson_period.room_id,
+                    cancelled=sub.cancelled if sub else False,
+                    cancelled_for_teachers=sub.cancelled_for_teachers if sub else False,
+                    comment=sub.comment if sub else None,
+                )
+            )
+            teacher_ids[(lesson_period.pk, day)] = sub_teachers or teachers_per_lesson.get(
+                lesson_period.lesson_id, set()
+            )
+
+    with transaction.atomic():
+        occurrences_qs.delete()
+        LessonOccurrence.objects.bulk_create(occurrences, batch_size=OCCURRENCES_BATCH_SIZE)
+
+        # Primary keys aren't returned by bulk inserts on all databases, so look them up
+        created = occurrences_qs.values_list("pk", "lesson_period", "date")
+        through = LessonOccurrence.teachers.through
+        through.objects.bulk_create(
+            [
+                through(lessonoccurrence_id=pk, person_id=teacher_id)
+                for pk, lesson_period_id, day in created
+                for teacher_id in teacher_ids.get((lesson_period_id, day), ())
+            ],
+            batch_size=OCCURRENCES_BATCH_SIZE,
+        )
+
+        transaction.on_commit(lambda: bump_version(LESSON_OCCURRENCES_VERSION_KEY))
+
+    return len(occurrences)
+
+
+def rebuild_current_occurrences() -> int:
+    """Regenerate the occurrences of the current school term and of all later lessons.
+
+    Without a current school term, the occurrences starting today are regenerated.
+    Returns the number of generated occurrences.
+    """
+    SchoolTerm = apps.get_model("core", "SchoolTerm")
+    ValidityRange = apps.get_model("chronos", "ValidityRange")
+
+    end = ValidityRange.objects.aggregate(end=Max("date_end"))["end"]
+    if not end:
+        return 0
+
+    school_term = SchoolTerm.current
+    start = school_term.date_start if school_term else timezone.now().date()
+    if start > end:
+        return 0
+
+    return rebuild_occurrences(start, end)
@@ -0,0 +1,173 @@
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from django.apps import apps
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import bump_version, get_version
+
+PERIOD_GRID_VERSION_KEY = "chronos_period_grid_version"
+PERIOD_GRID_TIMEOUT = 24 * 3600
+
+
+class PeriodGrid:
+    """Immutable snapshot of all time periods and breaks of one validity range.
+
+    It replaces separate aggregate queries for the minimum and maximum periods,
+    times and weekdays and is built from one query for time periods and one for breaks.
+    """
+
+    __slots__ = (
+        "validity_range_id",
+        "period_min",
+        "period_max",
+        "time_min",
+        "time_max",
+        "weekday_min",
+        "weekday_max",
+        "period_choices",
+        "times_dict",
+        "breaks",
+        "periods",
+    )
+
+    def __init__(
+        self,
+        validity_range_id: Optional[int],
+        time_periods: Iterable["TimePeriod"],
+        breaks: Iterable["Break"],
+    ):
+        time_periods = list(time_periods)
+
+        periods = {}
+        times_dict = {}
+        for time_period in time_periods:
+            periods[(time_period.weekday, time_period.period)] = time_period
+            times_dict[time_period.period] = (time_period.time_start, time_period.time_end)
+
+        period_numbers = [time_period.period for time_period in time_periods]
+        weekdays = [time_period.weekday for time_period in time_periods]
+
+        object.__setattr__(self, "validity_range_id", validity_range_id)
+        object.__setattr__(self, "period_min", min(period_numbers, default=1))
+        object.__setattr__(self, "period_max", max(period_numbers, default=7))
+        object.__setattr__(
+            self,
+            "time_min",
+            min((time_period.time_start for time_period in time_periods), default=None),
+        )
+        object.__setattr__(
+            self,
+            "time_max",
+            max((time_period.time_end for time_period in time_periods), default=None),
+        )
+        object.__setattr__(self, "weekday_min", min(weekdays, default=0))
+        object.__setattr__(self, "weekday_max", max(weekdays, default=6))
+        object.__setattr__(self, "times_dict", times_dict)
+        object.__setattr__(self, "periods", periods)
+        object.__setattr__(
+            self,
+            "period_choices",
+            [("", "")]
+            + [
+                (period, f"{period}.")
+                for period in sorted(
+                    {
+                        time_period.period
+                        for time_period in time_periods
+                        if time_period.weekday == self.weekday_min
+                    }
+                )
+            ],
+        )
+        object.__setattr__(
+            self, "breaks", {break_.before_period_number: break_ for break_ in breaks}
+        )
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError("PeriodGrid objects are immutable.")
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def get_period(self, weekday: int, period: int) -> Optional["TimePeriod"]:
+        """Get the time period with a period number on a weekday."""
+        return self.periods.get((weekday, period))
+
+    def get_times_dict(self) -> Dict[int, Tuple[time, time]]:
+        """Get start and end times per period number."""
+        return dict(self.times_dict)
+
+    def get_period_choices(self) -> List[Tuple[Union[str, int], str]]:
+        """Get a choice list of periods for usage within Django."""
+        return list(self.period_choices)
+
+
+def _build_period_grid(validity_range: Optional["ValidityRange"]) -> PeriodGrid:
+    TimePeriod = apps.get_model("chronos", "TimePeriod")
+    Break = apps.get_model("chronos", "Break")
+
+    time_periods = TimePeriod.objects.all()
+    breaks = Break.objects.all()
+    if validity_range:
+        time_periods = time_periods.for_validity_range(validity_range)
+        breaks = breaks.filter(validity=validity_range)
+
+    return PeriodGrid(validity_range.pk if validity_range else None, time_periods, breaks)
+
+
+def get_current_validity_range(day: Optional[date] = None) -> Optional["ValidityRange"]:
+    """Get the validity range a day is in.
+
+    It is cached together with the period grids, so it is reloaded as soon as
+    validity ranges change.
+    """
+    ValidityRange = apps.get_model("chronos", "ValidityRange")
+
+    day = day or timezone.now().date()
+    version = get_version(PERIOD_GRID_VERSION_KEY)
+    key = f"{PERIOD_GRID_VERSION_KEY}_{version}_current_{day.isoformat()}"
+
+    # The validity range is wrapped so that days without one are cached as well
+    cached = cache.get(key)
+    if cached is None:
+        cached = (ValidityRange.objects.on_day(day).first(),)
+        cache.set(key, cached, PERIOD_GRID_TIMEOUT)
+    return cached[0]
+
+
+_grids = {}
+
+
+def get_period_grid(day: Optional[date] = None) -> PeriodGrid:
+    """Get the period grid of the validity range a day is in.
+
+    If there is no validity range on this day, the grid is built from all time periods.
+    Grids are kept in this process and in the cache until
+    time periods, breaks or validity ranges change.
+    """
+    validity_range = get_current_validity_range(day)
+    validity_range_id = validity_range.pk if validity_range else None
+
+    version = get_version(PERIOD_GRID_VERSION_KEY)
+    if validity_range_id in _grids and _grids[validity_range_id][0] == version:
+        return _grids[validity_range_id][1]
+
+    key = f"{PERIOD_GRID_VERSION_KEY}_{version}_{validity_range_id or 'all'}"
+    grid = cache.get(key)
+    if grid is None:
+        grid = _build_period_grid(validity_range)
+        cache.set(key, grid, PERIOD_GRID_TIMEOUT)
+
+    _grids[validity_range_id] = (version, grid)
+    return grid
+
+
+def invalidate_period_grids():
+    """Make all processes rebuild their period grids."""
+    bump_version(PERIOD_GRID_VERSION_KEY)
@@ -0,0 +1,74 @@
+from typing import Dict, Optional, Tuple
+
+from django.apps import apps
+from django.core.cache import cache
+
+from aleksis.apps.chronos.managers import TimetableType
+
+from .caching import bump_version, get_version
+
+PERSON_ROLES_VERSION_KEY = "chronos_person_roles_version"
+PERSON_ROLES_TIMEOUT = 24 * 3600
+
+PersonRole = Tuple[Optional[TimetableType], Optional[int]]
+
+
+def _build_person_roles() -> Dict[int, PersonRole]:
+    """Map the IDs of all teachers and persons with a primary group to their roles."""
+    LessonPeriod = apps.get_model("chronos", "LessonPeriod")
+    Person = apps.get_model("core", "Person")
+
+    roles = {
+        pk: (TimetableType.GROUP, primary_group_id)
+        for pk, primary_group_id in Person.objects.filter(primary_group__isnull=False).values_list(
+            "pk", "primary_group_id"
+        )
+    }
+
+    teacher_ids = (
+        LessonPeriod.objects.select_related(None)
+        .prefetch_related(None)
+        .filter(lesson__teachers__isnull=False)
+        .values_list("lesson__teachers", flat=True)
+        .distinct()
+    )
+    for pk in teacher_ids:
+        roles[pk] = (TimetableType.TEACHER, roles.get(pk, (None, None))[1])
+
+    return roles
+
+
+_roles = None
+_roles_version = None
+
+
+def get_person_roles() -> Dict[int, PersonRole]:
+    """Get the role index of all persons.
+
+    It is kept in this process and in the cache until lesson teachers,
+    group memberships or persons change.
+    """
+    global _roles, _roles_version
+
+    version = get_version(PERSON_ROLES_VERSION_KEY)
+    if _roles is not None and version == _roles_version:
+        return _roles
+
+    key = f"{PERSON_ROLES_VERSION_KEY}_{version}"
+    roles = cache.get(key)
+    if roles is None:
+        roles = _build_person_roles()
+        cache.set(key, roles, PERSON_ROLES_TIMEOUT)
+
+    _roles, _roles_version = roles, version
+    return roles
+
+
+def get_person_role(person_id: int) -> PersonRole:
+    """Get the timetable type and primary group ID of a person."""
+    return get_person_roles().get(person_id, (None, None))
+
+
+def invalidate_person_roles():
+    """Make all processes rebuild their person role index."""
+    bump_version(PERSON_ROLES_VERSION_KEY)
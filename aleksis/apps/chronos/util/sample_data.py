@@ -0,0 +1,441 @@
+from datetime import date, datetime, time, timedelta
+from random import Random
+from typing import Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.db import transaction
+
+from calendarweek import CalendarWeek
+
+from .caching import invalidate_timetable_cache
+from .directory import invalidate_timetable_directory
+from .holidays import invalidate_holiday_calendar
+from .occurrences import rebuild_occurrences
+from .period_grid import invalidate_period_grids
+from .roles import invalidate_person_roles
+
+SAMPLE_SUBJECTS = [
+    ("M", "Mathematics", "#ffffff", "#1565c0"),
+    ("D", "German", "#ffffff", "#c62828"),
+    ("E", "English", "#ffffff", "#2e7d32"),
+    ("F", "French", "#000000", "#ffeb3b"),
+    ("L", "Latin", "#000000", "#ffcc80"),
+    ("PH", "Physics", "#ffffff", "#6a1b9a"),
+    ("CH", "Chemistry", "#ffffff", "#00838f"),
+    ("BI", "Biology", "#ffffff", "#558b2f"),
+    ("GE", "History", "#ffffff", "#4e342e"),
+    ("EK", "Geography", "#000000", "#a5d6a7"),
+    ("KU", "Arts", "#000000", "#f48fb1"),
+    ("MU", "Music", "#000000", "#b39ddb"),
+    ("SP", "Physical education", "#000000", "#90caf9"),
+    ("RE", "Religious education", "#000000", "#e0e0e0"),
+    ("IF", "Computer science", "#ffffff", "#37474f"),
+]
+SAMPLE_FIRST_NAMES = (
+    "Anna Ben Clara David Emma Felix Greta Hannes Ida Jonas "
+    "Klara Leon Mia Noah Olivia Paul Romy Samuel Tilda Vincent"
+).split()
+SAMPLE_LAST_NAMES = (
+    "Bauer Becker Fischer Hoffmann Koch Meyer Müller Neumann "
+    "Richter Schäfer Schmidt Schneider Schulz Wagner Weber Wolf"
+).split()
+
+PERIOD_LENGTH = timedelta(minutes=45)
+DAY_START = time(8, 0)
+# Periods after which a long break starts, all other periods are followed by five minutes
+LONG_BREAKS = {2: timedelta(minutes=20), 4: timedelta(minutes=15), 6: timedelta(minutes=45)}
+
+
+def _get_period_times(periods_per_day: int) -> List[Tuple[time, time]]:
+    """Get the start and end times of the periods of a day."""
+    times = []
+    start = datetime.combine(date.today(), DAY_START)
+    for period in range(1, periods_per_day + 1):
+        end = start + PERIOD_LENGTH
+        times.append((start.time(), end.time()))
+        start = end + LONG_BREAKS.get(period, timedelta(minutes=5))
+    return times
+
+
+def _random_day(rng: Random, start: date, end: date) -> date:
+    """Get a random school day (Monday to Friday) within a date range."""
+    while True:
+        day = start + timedelta(days=rng.randint(0, (end - start).days))
+        if day.weekday() < 5:
+            return day
+
+
+def _random_name(rng: Random) -> Tuple[str, str]:
+    return rng.choice(SAMPLE_FIRST_NAMES), rng.choice(SAMPLE_LAST_NAMES)
+
+
+@transaction.atomic
+def generate_school_data(
+    prefix: str = "Sample",
+    start: Optional[date] = None,
+    weeks: int = 20,
+    validity_ranges: int = 2,
+    grades: int = 6,
+    classes_per_grade: int = 3,
+    students_per_class: int = 25,
+    teachers: int = 60,
+    rooms: int = 40,
+    periods_per_day: int = 8,
+    periods_per_class: int = 30,
+    substitutions: int = 300,
+    supervision_substitutions: int = 30,
+    events: int = 20,
+    extra_lessons: int = 30,
+    holidays: int = 2,
+    absences: int = 30,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """Generate the timetable data of a synthetic school.
+
+    A school term named after the prefix is created, starting in the week of
+    `start` (today by default) and lasting `weeks` weeks, which are split into
+    `validity_ranges` validity ranges. Each grade is a parent group of its
+    classes, which get timetables of `periods_per_class` periods per week
+    without clashes between classes, teachers and rooms. The same seed
+    always results in the same school. Returns the number of created objects
+    by model name.
+    """
+    SchoolTerm = apps.get_model("core", "SchoolTerm")
+    Person = apps.get_model("core", "Person")
+    Group = apps.get_model("core", "Group")
+    ValidityRange = apps.get_model("chronos", "ValidityRange")
+    TimePeriod = apps.get_model("chronos", "TimePeriod")
+    Break = apps.get_model("chronos", "Break")
+    Subject = apps.get_model("chronos", "Subject")
+    Room = apps.get_model("chronos", "Room")
+    Lesson = apps.get_model("chronos", "Lesson")
+    LessonPeriod = apps.get_model("chronos", "LessonPeriod")
+    LessonSubstitution = apps.get_model("chronos", "LessonSubstitution")
+    SupervisionArea = apps.get_model("chronos", "SupervisionArea")
+    Supervision = apps.get_model("chronos", "Supervision")
+    SupervisionSubstitution = apps.get_model("chronos", "SupervisionSubstitution")
+    Event = apps.get_model("chronos", "Event")
+    ExtraLesson = apps.get_model("chronos", "ExtraLesson")
+    Holiday = apps.get_model("chronos", "Holiday")
+    AbsenceReason = apps.get_model("chronos", "AbsenceReason")
+    Absence = apps.get_model("chronos", "Absence")
+
+    if SchoolTerm.objects.filter(name=prefix).exists():
+        raise ValueError(f"A school term named {prefix} already exists.")
+
+    rng = Random(seed)
+    start = CalendarWeek.from_date(start or date.today())[0]
+    end = start + timedelta(weeks=weeks) - timedelta(days=1)
+    counts = {}
+
+    # School term and validity ranges with their period grids
+    school_term = SchoolTerm.objects.create(name=prefix, date_start=start, date_end=end)
+    validity_ranges = max(1, min(validity_ranges, weeks))
+    range_list = []
+    for i in range(validity_ranges):
+        range_start = start + timedelta(weeks=weeks * i // validity_ranges)
+        range_end = start + timedelta(weeks=weeks * (i + 1) // validity_ranges) - timedelta(days=1)
+        range_list.append(
+            ValidityRange.objects.create(
+                school_term=school_term,
+                name=f"{prefix} {i + 1}",
+                date_start=range_start,
+                date_end=range_end,
+            )
+        )
+    counts["ValidityRange"] = len(range_list)
+
+    period_times = _get_period_times(periods_per_day)
+    TimePeriod.objects.bulk_create(
+        [
+            TimePeriod(
+                validity=validity_range,
+                weekday=weekday,
+                period=period,
+                time_start=time_start,
+                time_end=time_end,
+            )
+            for validity_range in range_list
+            for weekday in range(5)
+            for period, (time_start, time_end) in enumerate(period_times, 1)
+        ]
+    )
+    time_periods = {
+        (time_period.validity_id, time_period.weekday, time_period.period): time_period
+        for time_period in TimePeriod.objects.filter(validity__in=range_list)
+    }
+    counts["TimePeriod"] = len(time_periods)
+
+    Break.objects.bulk_create(
+        [
+            Break(
+                validity=validity_range,
+                short_name=f"P{period}",
+                name=f"Break after period {period}",
+                after_period=time_periods[(validity_range.pk, weekday, period)],
+                before_period=time_periods[(validity_range.pk, weekday, period + 1)],
+            )
+            for validity_range in range_list
+            for weekday in range(5)
+            for period in LONG_BREAKS
+            if period < periods_per_day
+        ]
+    )
+    break_list = list(Break.objects.filter(validity__in=range_list))
+    counts["Break"] = len(break_list)
+
+    # Subjects and rooms are shared with other school terms
+    subject_list = [
+        Subject.objects.get_or_create(
+            short_name=short_name,
+            defaults={"name": name, "colour_fg": colour_fg, "colour_bg": colour_bg},
+        )[0]
+        for short_name, name, colour_fg, colour_bg in SAMPLE_SUBJECTS
+    ]
+    room_list = [
+        Room.objects.get_or_create(short_name=f"R{i:03d}", defaults={"name": f"Room {i:03d}"})[0]
+        for i in range(1, rooms + 1)
+    ]
+
+    # Teachers, grades with their classes and students
+    teacher_short_names = [f"{prefix}{i:03d}" for i in range(1, teachers + 1)]
+    Person.objects.bulk_create(
+        [
+            Person(first_name=first_name, last_name=last_name, short_name=short_name)
+            for short_name, (first_name, last_name) in zip(
+                teacher_short_names, (_random_name(rng) for __ in range(teachers))
+            )
+        ]
+    )
+    teacher_list = list(Person.objects.filter(short_name__in=teacher_short_names).order_by("pk"))
+
+    class_list = []
+    for grade in range(5, 5 + grades):
+        parent_group = Group.objects.create(
+            school_term=school_term, name=f"Grade {grade}", short_name=str(grade)
+        )
+        for letter in "abcdefghijklmnopqrstuvwxyz"[:classes_per_grade]:
+            group = Group.objects.create(
+                school_term=school_term,
+                name=f"Class {grade}{letter}",
+                short_name=f"{grade}{letter}",
+            )
+            group.parent_groups.add(parent_group)
+            group.owners.add(rng.choice(teacher_list))
+            class_list.append(group)
+    counts["Group"] = grades + len(class_list)
+
+    Person.objects.bulk_create(
+        [
+            Person(first_name=first_name, last_name=last_name, primary_group=group)
+            for group in class_list
+            for first_name, last_name in (_random_name(rng) for __ in range(students_per_class))
+        ]
+    )
+    Group.members.through.objects.bulk_create(
+        [
+            Group.members.through(group_id=group_id, person_id=person_id)
+            for person_id, group_id in Person.objects.filter(
+                primary_group__in=class_list
+            ).values_list("pk", "primary_group_id")
+        ]
+    )
+    counts["Person"] = teachers + len(class_list) * students_per_class
+
+    # Lessons without clashes of classes, teachers and rooms
+    periods_per_class = min(periods_per_class, 5 * periods_per_day)
+    lesson_periods = []
+    for validity_range in range_list:
+        teachers_busy, rooms_busy = set(), set()
+        for group in class_list:
+            slots = rng.sample(
+                [
+                    (weekday, period)
+                    for weekday in range(5)
+                    for period in range(1, periods_per_day + 1)
+                ],
+                periods_per_class,
+            )
+            while slots:
+                length = rng.randint(1, 3)
+                lesson_slots, slots = slots[:length], slots[length:]
+                free_teachers = [
+                    teacher
+                    for teacher in teacher_list
+                    if not any((teacher.pk, slot) in teachers_busy for slot in lesson_slots)
+                ]
+                if not free_teachers:
+                    continue
+                teacher = rng.choice(free_teachers)
+
+                lesson = Lesson.objects.create(
+                    validity=validity_range, subject=rng.choice(subject_list)
+                )
+                lesson.groups.add(group)
+                lesson.teachers.add(teacher)
+
+                for slot in lesson_slots:
+                    teachers_busy.add((teacher.pk, slot))
+                    free_rooms = [room for room in room_list if (room.pk, slot) not in rooms_busy]
+                    room = rng.choice(free_rooms) if free_rooms else None
+                    if room:
+                        rooms_busy.add((room.pk, slot))
+                    lesson_periods.append(
+                        LessonPeriod(
+                            lesson=lesson,
+                            period=time_periods[(validity_range.pk, *slot)],
+                            room=room,
+                        )
+                    )
+    LessonPeriod.objects.bulk_create(lesson_periods)
+    counts["Lesson"] = Lesson.objects.filter(validity__in=range_list).count()
+    counts["LessonPeriod"] = len(lesson_periods)
+
+    # Substitutions, cancellations and supervisions
+    lesson_period_list = list(
+        LessonPeriod.objects.filter(lesson__validity__in=range_list).select_related(
+            "lesson__validity", "period"
+        )
+    )
+    substituted = set()
+    for __ in range(substitutions):
+        lesson_period = rng.choice(lesson_period_list)
+        validity_range = lesson_period.lesson.validity
+        week = CalendarWeek.from_date(
+            _random_day(rng, validity_range.date_start, validity_range.date_end)
+        )
+        if (lesson_period.pk, week.year, week.week) in substituted:
+            continue
+        substituted.add((lesson_period.pk, week.year, week.week))
+
+        cancelled = rng.random() < 0.3
+        substitution = LessonSubstitution.objects.create(
+            lesson_period=lesson_period,
+            week=week.week,
+            year=week.year,
+            cancelled=cancelled,
+            room=None if cancelled or rng.random() < 0.5 else rng.choice(room_list),
+            comment=rng.choice([None, "Substitution", "Self-study"]),
+        )
+        if not cancelled:
+            substitution.teachers.add(rng.choice(teacher_list))
+    counts["LessonSubstitution"] = len(substituted)
+
+    area_list = [
+        SupervisionArea.objects.create(
+            short_name=f"{prefix}-{i}",
+            name=f"Schoolyard {i}",
+            colour_fg="#000000",
+            colour_bg=rng.choice(SAMPLE_SUBJECTS)[3],
+        )
+        for i in range(1, 4)
+    ]
+    Supervision.objects.bulk_create(
+        [
+            Supervision(
+                validity_id=break_item.validity_id,
+                area=area,
+                break_item=break_item,
+                teacher=rng.choice(teacher_list),
+            )
+            for break_item in break_list
+            for area in area_list
+        ]
+    )
+    supervision_list = list(
+        Supervision.objects.filter(validity__in=range_list).select_related(
+            "validity", "break_item__after_period"
+        )
+    )
+    counts["Supervision"] = len(supervision_list)
+
+    supervision_substitutions = min(supervision_substitutions, len(supervision_list))
+    for supervision in rng.sample(supervision_list, supervision_substitutions):
+        day = _random_day(rng, supervision.validity.date_start, supervision.validity.date_end)
+        day += timedelta(days=supervision.break_item.weekday - day.weekday())
+        SupervisionSubstitution.objects.create(
+            supervision=supervision, date=day, teacher=rng.choice(teacher_list)
+        )
+    counts["SupervisionSubstitution"] = supervision_substitutions
+
+    # Events, extra lessons, absences and holidays
+    def _random_period(validity_range: "ValidityRange") -> Tuple[date, "TimePeriod"]:
+        day = _random_day(rng, validity_range.date_start, validity_range.date_end)
+        period = rng.randint(1, periods_per_day)
+        return day, time_periods[(validity_range.pk, day.weekday(), period)]
+
+    for i in range(events):
+        validity_range = rng.choice(range_list)
+        day, period_from = _random_period(validity_range)
+        period_to = time_periods[
+            (validity_range.pk, day.weekday(), rng.randint(period_from.period, periods_per_day))
+        ]
+        event = Event.objects.create(
+            school_term=school_term,
+            title=f"Event {i + 1}",
+            date_start=day,
+            date_end=day,
+            period_from=period_from,
+            period_to=period_to,
+        )
+        event.groups.add(*rng.sample(class_list, min(2, len(class_list))))
+        event.teachers.add(rng.choice(teacher_list))
+        event.rooms.add(rng.choice(room_list))
+    counts["Event"] = events
+
+    for __ in range(extra_lessons):
+        day, period = _random_period(rng.choice(range_list))
+        week = CalendarWeek.from_date(day)
+        extra_lesson = ExtraLesson.objects.create(
+            school_term=school_term,
+            week=week.week,
+            year=week.year,
+            period=period,
+            subject=rng.choice(subject_list),
+            room=rng.choice(room_list),
+            comment="Extra lesson",
+        )
+        extra_lesson.groups.add(rng.choice(class_list))
+        extra_lesson.teachers.add(rng.choice(teacher_list))
+    counts["ExtraLesson"] = extra_lessons
+
+    reason = AbsenceReason.objects.get_or_create(short_name="K", defaults={"name": "Sick"})[0]
+    for __ in range(absences):
+        validity_range = rng.choice(range_list)
+        day = _random_day(rng, validity_range.date_start, validity_range.date_end)
+        absent = {
+            "teacher": rng.choice(teacher_list),
+            "group": rng.choice(class_list),
+            "room": rng.choice(room_list),
+        }
+        kind = rng.choice(list(absent))
+        Absence.objects.create(
+            school_term=school_term,
+            reason=reason,
+            date_start=day,
+            date_end=day,
+            period_from=time_periods[(validity_range.pk, day.weekday(), 1)],
+            period_to=time_periods[(validity_range.pk, day.weekday(), periods_per_day)],
+            **{kind: absent[kind]},
+        )
+    counts["Absence"] = absences
+
+    # Holidays are spread evenly over the school term and last up to a week
+    for i in range(1, holidays + 1):
+        holiday_start = start + timedelta(weeks=weeks * i // (holidays + 1))
+        Holiday.objects.create(
+            title=f"{prefix} holidays {i}",
+            date_start=holiday_start,
+            date_end=holiday_start + timedelta(days=rng.randint(0, 4)),
+        )
+    counts["Holiday"] = holidays
+
+    # Bulk creations don't send signals, so derived data has to be rebuilt
+    invalidate_person_roles()
+    invalidate_period_grids()
+    invalidate_holiday_calendar()
+    invalidate_timetable_directory()
+    invalidate_timetable_cache()
+    counts["LessonOccurrence"] = rebuild_occurrences(start, end)
+
+    return counts
@@ -0,0 +1,11 @@
+from hashlib import sha1
+from typing import Iterable, Optional
+
+
+def build_series_key(
+    subject_id: Optional[int], group_ids: Iterable[int], teacher_ids: Iterable[int]
+) -> str:
+    """Build the key identifying all lessons of one subject with the same groups and teachers."""
+    groups = ",".join(str(pk) for pk in sorted(group_ids))
+    teachers = ",".join(str(pk) for pk in sorted(teacher_ids))
+    return sha1(f"{subject_id}|{groups}|{teachers}".encode()).hexdigest()  # noqa: S303
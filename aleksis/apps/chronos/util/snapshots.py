@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta
+from hashlib import sha1
+from tempfile import NamedTemporaryFile, mkdtemp
+from typing import Any, Dict, List, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from aleksis.core.util.core_helpers import get_site_preferences
+
+from .build import build_substitutions_context
+
+SNAPSHOTS_DIR = os.path.join("chronos", "substitutions")
+SNAPSHOTS_MANIFEST = "manifest.json"
+SNAPSHOTS_OUTDATED_KEY = "chronos_substitution_snapshots_outdated"
+
+
+def get_snapshots_root() -> str:
+    """Get the directory containing the pre-rendered substitution plans."""
+    return os.path.join(settings.MEDIA_ROOT, SNAPSHOTS_DIR)
+
+
+def _write_atomic(path: str, content: str):
+    """Write a file so that readers see either the complete old or the complete new content."""
+    with NamedTemporaryFile(
+        "w", dir=os.path.dirname(path), delete=False, encoding="utf-8"
+    ) as tmp_file:
+        tmp_file.write(content)
+    os.chmod(tmp_file.name, 0o644)  # noqa: S103
+    os.replace(tmp_file.name, path)
+
+
+def _render(url: str, template_name: str, context: dict) -> str:
+    """Render a template as it would be shown to an anonymous user at an URL."""
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    request.site = Site.objects.get_current()
+    return render_to_string(template_name, context, request)
+
+
+def _get_days(number_of_days: int) -> List[date]:
+    """Get the next relevant days starting now."""
+    TimePeriod = apps.get_model("chronos", "TimePeriod")
+
+    days = [TimePeriod.get_next_relevant_day(timezone.now().date(), datetime.now().time())]
+    for __ in range(number_of_days - 1):
+        days.append(TimePeriod.get_next_relevant_day(days[-1] + timedelta(days=1)))
+    return days
+
+
+def read_snapshots_manifest() -> Optional[Dict[str, Any]]:
+    """Read the manifest of the current pre-rendered substitution plans."""
+    try:
+        with open(os.path.join(get_snapshots_root(), SNAPSHOTS_MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def mark_snapshots_outdated() -> bool:
+    """Mark the pre-rendered substitution plans as outdated.
+
+    Returns whether they haven't been marked before, so that only one
+    rendering is scheduled until they have been rendered again.
+    """
+    return cache.add(SNAPSHOTS_OUTDATED_KEY, True, None)
+
+
+def snapshots_outdated() -> bool:
+    """Check whether the pre-rendered substitution plans have been marked as outdated."""
+    return bool(cache.get(SNAPSHOTS_OUTDATED_KEY))
+
+
+def render_substitution_snapshots(number_of_days: Optional[int] = None) -> Dict[str, Any]:
+    """Pre-render the substitution plans of the next relevant days into static files.
+
+    The pages of one run are stored in a directory named after their version, and
+    the manifest pointing to them as well as the stable `current.html` and
+    `print.html` are replaced atomically afterwards. Files of older versions
+    are removed, except for the previous one which readers might still use.
+    Returns the manifest.
+
+    The plans are no longer marked as outdated, unless substitution data
+    changes again while they are rendered.
+    """
+    cache.delete(SNAPSHOTS_OUTDATED_KEY)
+
+    if number_of_days is None:
+        number_of_days = get_site_preferences()["chronos__substitutions_print_number_of_days"]
+    days = _get_days(max(number_of_days, 1))
+
+    pages = {}
+    for day in days:
+        template_name, context = build_substitutions_context(day)
+        url = reverse("substitutions_by_date", args=[day.year, day.month, day.day])
+        pages[f"{day.isoformat()}.html"] = _render(url, template_name, context)
+    template_name, context = build_substitutions_context(days[0], is_print=True)
+    pages["print.html"] = _render(reverse("substitutions_print"), template_name, context)
+
+    version = sha1("".join(pages.values()).encode()).hexdigest()[:16]  # noqa: S303
+    root = get_snapshots_root()
+    os.makedirs(root, exist_ok=True)
+
+    previous = read_snapshots_manifest()
+    if previous and previous["version"] == version:
+        return previous
+
+    version_dir = os.path.join(root, version)
+    if not os.path.isdir(version_dir):
+        tmp_dir = mkdtemp(dir=root, prefix=".tmp-")
+        for name, content in pages.items():
+            with open(os.path.join(tmp_dir, name), "w", encoding="utf-8") as f:
+                f.write(content)
+        os.chmod(tmp_dir, 0o755)  # noqa: S103
+        try:
+            os.replace(tmp_dir, version_dir)
+        except OSError:
+            # A concurrent run has stored the same version in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(version_dir):
+                raise
+
+    manifest = {
+        "version": version,
+        "generated_at": timezone.now().isoformat(),
+        "days": {day.isoformat(): f"{version}/{day.isoformat()}.html" for day in days},
+        "print": f"{version}/print.html",
+    }
+    _write_atomic(os.path.join(root, "current.html"), pages[f"{days[0].isoformat()}.html"])
+    _write_atomic(os.path.join(root, "print.html"), pages["print.html"])
+    _write_atomic(os.path.join(root, SNAPSHOTS_MANIFEST), json.dumps(manifest))
+
+    keep = {version, previous["version"] if previous else None}
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        # Temporary directories of concurrent runs start with a dot
+        if os.path.isdir(path) and not name.startswith(".") and name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+    return manifest
@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from django.apps import apps
+from django.core.cache import cache
+from django.utils import timezone
+
+from calendarweek import CalendarWeek
+
+from .caching import TIMETABLE_CACHE_TIMEOUT, get_timetable_cache_versions, get_version
+from .roles import PERSON_ROLES_VERSION_KEY, get_person_roles
+
+WIDGET_CACHE_PREFIX = "chronos_widget"
+
+
+def get_widget_day() -> date:
+    """Get the day shown in the timetable widget right now."""
+    TimePeriod = apps.get_model("chronos", "TimePeriod")
+    return TimePeriod.get_next_relevant_day(timezone.now().date(), datetime.now().time())
+
+
+def get_widget_cache_key(person_id: int, day: date) -> str:
+    """Build the cache key for the widget payload of a person on a day.
+
+    The key includes the versions of the cached timetables of the week and of the
+    person role index, so the payload is rebuilt after the timetable or the role
+    of the person could have changed.
+    """
+    versions = get_timetable_cache_versions(CalendarWeek.from_date(day))
+    roles_version = get_version(PERSON_ROLES_VERSION_KEY)
+    return f"{WIDGET_CACHE_PREFIX}_{versions}.{roles_version}_{person_id}_{day.isoformat()}"
+
+
+def build_widget_payload(person: "Person", day: date) -> dict:
+    """Build the context data of the timetable widget for a person on a day."""
+    from .build import build_timetable  # noqa
+
+    Holiday = apps.get_model("chronos", "Holiday")
+    TimePeriod = apps.get_model("chronos", "TimePeriod")
+
+    type_ = person.timetable_type
+    if type_ is None:
+        return {"has_plan": False}
+
+    return {
+        "has_plan": True,
+        "timetable": build_timetable("person", person, day),
+        "holiday": Holiday.on_day(day),
+        "type": type_,
+        "day": day,
+        "periods": TimePeriod.get_times_dict(day),
+        "smart": True,
+    }
+
+
+def get_widget_payload(person: "Person", day: Optional[date] = None) -> dict:
+    """Get the (precomputed) context data of the timetable widget for a person."""
+    day = day or get_widget_day()
+    key = get_widget_cache_key(person.pk, day)
+
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_widget_payload(person, day)
+        cache.set(key, payload, TIMETABLE_CACHE_TIMEOUT)
+    return payload
+
+
+def precompute_widget_payloads(
+    day: Optional[date] = None, persons: Optional[Iterable["Person"]] = None
+) -> int:
+    """Build and cache the widget payloads of persons for a day.
+
+    Without persons, the payloads of all persons with a timetable are built.
+    Returns the number of built payloads.
+    """
+    Person = apps.get_model("core", "Person")
+
+    day = day or get_widget_day()
+    if persons is None:
+        persons = Person.objects.filter(pk__in=get_person_roles().keys())
+
+    payloads = {}
+    for person in persons:
+        # The key has to be built before the data is loaded, so that a payload
+        # built from outdated data can't be stored under a newer version
+        key = get_widget_cache_key(person.pk, day)
+        payloads[key] = build_widget_payload(person, day)
+    cache.set_many(payloads, TIMETABLE_CACHE_TIMEOUT)
+    return len(payloads)
@@ -1,11 +1,26 @@
-from datetime import datetime, timedelta
-from typing import Optional
-
-from django.db.models import Count, Q
-from django.http import HttpRequest, HttpResponse, HttpResponseNotFound
+import json
+import time
+from datetime import date, datetime, timedelta
+from hashlib import sha1
+from typing import Any, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotFound,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.utils.translation import ugettext as _
 from django.views.decorators.cache import never_cache
 
@@ -18,12 +33,126 @@ from aleksis.core.util.core_helpers import get_site_preferences, has_person
 
 from .forms import LessonSubstitutionForm
 from .managers import TimetableType
-from .models import Absence, Holiday, LessonPeriod, LessonSubstitution, Room, TimePeriod
+from .models import Holiday, LessonPeriod, Room, TimePeriod, ValidityRange
 from .tables import LessonsTable
-from .util.build import build_substitutions_list, build_timetable, build_weekdays
+from .util.api import encode_timetable
+from .util.broker import broker
+from .util.build import (
+    build_substitution_day_contexts,
+    build_substitutions_context,
+    build_timetable,
+    build_timetable_with_days,
+    build_weekdays,
+    get_substitution_days,
+)
+from .util.caching import get_version, weeks_between
+from .util.changes import CHANGES_PAGE_SIZE, get_changes_since
 from .util.chronos_helpers import get_el_by_pk, get_substitution_by_id
+from .util.conditional import conditional_view, get_view_etag
 from .util.date import CalendarWeek, get_weeks_for_year
+from .util.directory import get_timetable_directory
+from .util.ical import ICAL_MAX_DAYS, check_ical_token, generate_ical, get_ical_token
 from .util.js import date_unix
+from .util.occurrences import LESSON_OCCURRENCES_VERSION_KEY
+
+# Maximum time a substitution stream waits for a change before it is closed (in seconds).
+# Every open stream occupies a worker of a synchronous WSGI server for this time.
+SUBSTITUTIONS_STREAM_TIMEOUT = 5
+# Interval for checking for changes made in other processes (in seconds)
+SUBSTITUTIONS_STREAM_POLL_INTERVAL = 2
+# Time clients wait before reconnecting to a closed stream (in milliseconds)
+SUBSTITUTIONS_STREAM_RETRY = 1000
+
+# Default number of days in calendar feeds without a current validity range
+ICAL_DEFAULT_DAYS = 90
+
+
+def _get_wanted_day(
+    year: Optional[int] = None, month: Optional[int] = None, day: Optional[int] = None
+) -> date:
+    """Get the next relevant day starting at a date or, without a date, now."""
+    if day:
+        wanted_day = timezone.datetime(year=year, month=month, day=day).date()
+        return TimePeriod.get_next_relevant_day(wanted_day)
+    return TimePeriod.get_next_relevant_day(timezone.now().date(), datetime.now().time())
+
+
+def _get_wanted_week(year: Optional[int] = None, week: Optional[int] = None) -> CalendarWeek:
+    """Get a calendar week or, without a week, the relevant week now."""
+    if year and week:
+        return CalendarWeek(year=year, week=week)
+    return TimePeriod.get_relevant_week_from_datetime()
+
+
+def _my_timetable_scope(
+    year: Optional[int] = None, month: Optional[int] = None, day: Optional[int] = None
+) -> Tuple[List[CalendarWeek], List[Any]]:
+    wanted_day = _get_wanted_day(year, month, day)
+    return [CalendarWeek.from_date(wanted_day)], [wanted_day, timezone.now().date()]
+
+
+def _timetable_scope(
+    type_: str,
+    pk: int,
+    year: Optional[int] = None,
+    week: Optional[int] = None,
+    regular: Optional[str] = None,
+) -> Tuple[List[CalendarWeek], List[Any]]:
+    wanted_week = _get_wanted_week(year, week)
+    return [wanted_week], [type_, pk, wanted_week.year, wanted_week.week, regular]
+
+
+def _substitutions_scope(
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+    is_print: bool = False,
+) -> Tuple[List[CalendarWeek], List[Any]]:
+    days = get_substitution_days(_get_wanted_day(year, month, day), is_print)
+    weeks = list(weeks_between(days[0], days[-1]))
+    preferences = get_site_preferences()
+    return (
+        weeks,
+        [
+            is_print,
+            *days,
+            preferences["chronos__substitutions_show_header_box"],
+            preferences["chronos__use_parent_groups"],
+        ],
+    )
+
+
+def _timetable_api_scope(
+    type_: str,
+    pk: int,
+    year: Optional[int] = None,
+    week: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+) -> Tuple[List[CalendarWeek], List[Any]]:
+    try:
+        date_ref = _get_timetable_api_ref(year, week, month, day)
+    except ValueError:
+        # Invalid dates are rejected by the view
+        return [], [type_, pk]
+    week_ref = date_ref if isinstance(date_ref, CalendarWeek) else CalendarWeek.from_date(date_ref)
+    return [week_ref], [type_, pk, date_ref]
+
+
+def _get_timetable_api_ref(
+    year: Optional[int] = None,
+    week: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+) -> Union[CalendarWeek, date]:
+    """Get the week or the day requested from the timetable API."""
+    if day:
+        return date(year, month, day)
+    return _get_wanted_week(year, week)
+
+
+def _get_el_for_api(request: HttpRequest, type_: str, pk: int, *args, **kwargs):
+    return get_el_by_pk(request, type_, pk)
 
 
 @permission_required("chronos.view_timetable_overview")
@@ -31,22 +160,12 @@ def all_timetables(request: HttpRequest) -> HttpResponse:
     """View all timetables for persons, groups and rooms."""
     context = {}
 
-    teachers = (
-        Person.objects.annotate(lessons_count=Count("lessons_as_teacher"))
-        .filter(lessons_count__gt=0)
-        .order_by("short_name", "last_name")
-    )
-    groups = Group.objects.for_current_school_term_or_all().annotate(
-        lessons_count=Count("lessons"), child_lessons_count=Count("child_groups__lessons"),
-    )
-    classes = groups.filter(lessons_count__gt=0, parent_groups=None) | groups.filter(
-        child_lessons_count__gt=0, parent_groups=None
-    ).order_by("short_name", "name")
-    rooms = (
-        Room.objects.annotate(lessons_count=Count("lesson_periods"))
-        .filter(lessons_count__gt=0)
-        .order_by("short_name", "name")
+    directory = get_timetable_directory()
+    teachers = Person.objects.filter(pk__in=directory["teachers"]).order_by(
+        "short_name", "last_name"
     )
+    classes = Group.objects.filter(pk__in=directory["classes"]).order_by("short_name", "name")
+    rooms = Room.objects.filter(pk__in=directory["rooms"]).order_by("short_name", "name")
 
     context["teachers"] = teachers
     context["classes"] = classes
@@ -56,6 +175,7 @@ def all_timetables(request: HttpRequest) -> HttpResponse:
 
 
 @permission_required("chronos.view_my_timetable")
+@conditional_view(_my_timetable_scope)
 def my_timetable(
     request: HttpRequest,
     year: Optional[int] = None,
@@ -65,11 +185,7 @@ def my_timetable(
     """View personal timetable on a specified date."""
     context = {}
 
-    if day:
-        wanted_day = timezone.datetime(year=year, month=month, day=day).date()
-        wanted_day = TimePeriod.get_next_relevant_day(wanted_day)
-    else:
-        wanted_day = TimePeriod.get_next_relevant_day(timezone.now().date(), datetime.now().time())
+    wanted_day = _get_wanted_day(year, month, day)
 
     wanted_week = CalendarWeek.from_date(wanted_day)
 
@@ -78,13 +194,15 @@ def my_timetable(
         type_ = person.timetable_type
 
         # Build timetable
-        timetable = build_timetable("person", person, wanted_day)
-        week_timetable = build_timetable("person", person, wanted_week)
+        timetables = build_timetable_with_days("person", person, wanted_week)
 
-        if type_ is None:
+        if type_ is None or timetables is None:
             # If no student or teacher, redirect to all timetables
             return redirect("all_timetables")
 
+        week_timetable, day_timetables = timetables
+        timetable = day_timetables.get(wanted_day, [])
+
         super_el = person.timetable_object
 
         context["timetable"] = timetable
@@ -95,8 +213,9 @@ def my_timetable(
         context["day"] = wanted_day
         context["today"] = timezone.now().date()
         context["week"] = wanted_week
-        context["periods"] = TimePeriod.get_times_dict()
+        context["periods"] = TimePeriod.get_times_dict(wanted_day)
         context["smart"] = True
+        context["ical_url"] = _get_ical_url(request, "my")
         context["announcements"] = (
             Announcement.for_timetables().on_date(wanted_day).for_person(person)
         )
@@ -117,6 +236,7 @@ def my_timetable(
 
 
 @permission_required("chronos.view_timetable", fn=get_el_by_pk)
+@conditional_view(_timetable_scope)
 def timetable(
     request: HttpRequest,
     type_: str,
@@ -137,17 +257,15 @@ def timetable(
 
     type_ = TimetableType.from_string(type_)
 
-    if year and week:
-        wanted_week = CalendarWeek(year=year, week=week)
-    else:
-        wanted_week = TimePeriod.get_relevant_week_from_datetime()
+    wanted_week = _get_wanted_week(year, week)
 
     # Build timetable
     timetable = build_timetable(type_, el, wanted_week)
     context["timetable"] = timetable
 
     # Add time periods
-    context["periods"] = TimePeriod.get_times_dict()
+    grid = TimePeriod.get_grid(wanted_week[0])
+    context["periods"] = grid.get_times_dict()
 
     # Build lists with weekdays and corresponding dates (long and short variant)
     context["weekdays"] = build_weekdays(TimePeriod.WEEKDAY_CHOICES, wanted_week)
@@ -159,6 +277,7 @@ def timetable(
     context["pk"] = pk
     context["el"] = el
     context["smart"] = is_smart
+    context["ical_url"] = _get_ical_url(request, type_.value, pk)
     context["week_select"] = {
         "year": wanted_week.year,
         "dest": reverse(
@@ -169,8 +288,8 @@ def timetable(
     }
 
     if is_smart:
-        start = wanted_week[TimePeriod.weekday_min]
-        stop = wanted_week[TimePeriod.weekday_max]
+        start = wanted_week[grid.weekday_min]
+        stop = wanted_week[grid.weekday_max]
         context["announcements"] = (
             Announcement.for_timetables().relevant_for(el).within_days(start, stop)
         )
@@ -198,11 +317,7 @@ def lessons_day(
     """View all lessons taking place on a specified day."""
     context = {}
 
-    if day:
-        wanted_day = timezone.datetime(year=year, month=month, day=day).date()
-        wanted_day = TimePeriod.get_next_relevant_day(wanted_day)
-    else:
-        wanted_day = TimePeriod.get_next_relevant_day(timezone.now().date(), datetime.now().time())
+    wanted_day = _get_wanted_day(year, month, day)
 
     # Get lessons
     lesson_periods = LessonPeriod.objects.on_day(wanted_day)
@@ -282,6 +397,7 @@ def delete_substitution(request: HttpRequest, id_: int, week: int) -> HttpRespon
 
 
 @permission_required("chronos.view_substitutions")
+@conditional_view(_substitutions_scope)
 def substitutions(
     request: HttpRequest,
     year: Optional[int] = None,
@@ -290,65 +406,225 @@ def substitutions(
     is_print: bool = False,
 ) -> HttpResponse:
     """View all substitutions on a spcified day."""
-    context = {}
+    wanted_day = _get_wanted_day(year, month, day)
+    template_name, context = build_substitutions_context(wanted_day, is_print=is_print)
 
-    if day:
-        wanted_day = timezone.datetime(year=year, month=month, day=day).date()
-        wanted_day = TimePeriod.get_next_relevant_day(wanted_day)
-    else:
-        wanted_day = TimePeriod.get_next_relevant_day(timezone.now().date(), datetime.now().time())
+    return render(request, template_name, context)
 
-    day_number = get_site_preferences()["chronos__substitutions_print_number_of_days"]
-    day_contexts = {}
 
-    if is_print:
-        next_day = wanted_day
-        for i in range(day_number):
-            day_contexts[next_day] = {"day": next_day}
-            next_day = TimePeriod.get_next_relevant_day(next_day + timedelta(days=1))
-    else:
-        day_contexts = {wanted_day: {"day": wanted_day}}
+@permission_required("chronos.view_substitutions")
+def changes(request: HttpRequest) -> HttpResponse:
+    """Get the changes of substitutions, extra lessons and events after a change number as JSON.
+
+    If changes after the number have already been pruned, `reset` is set and
+    clients have to load all data again instead of only applying the changes.
+    """
+    try:
+        since = int(request.GET.get("since", 0))
+        limit = int(request.GET.get("limit", CHANGES_PAGE_SIZE))
+    except ValueError:
+        return HttpResponseBadRequest()
 
-    for day in day_contexts:
-        subs = build_substitutions_list(day)
-        day_contexts[day]["substitutions"] = subs
+    return JsonResponse(get_changes_since(since, limit))
 
-        day_contexts[day]["announcements"] = (
-            Announcement.for_timetables().on_date(day).filter(show_in_timetables=True)
-        )
 
-        if get_site_preferences()["chronos__substitutions_show_header_box"]:
-            subs = LessonSubstitution.objects.on_day(day).order_by(
-                "lesson_period__lesson__groups", "lesson_period__period"
+def _substitution_events(
+    request: HttpRequest,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+) -> Iterator[str]:
+    """Generate a server-sent event with the substitution plan of a day as soon as it changed.
+
+    The ETag of the data and a hash of the rendered plan are sent as event ID,
+    which clients send back as `Last-Event-ID` when reconnecting. The plan is
+    only rendered again if the ETag changed, and only sent if it actually looks
+    different, e.g. not after changes to other days of the same week. If it
+    looks the same, only the new event ID is sent.
+
+    The stream ends after one event or after `SUBSTITUTIONS_STREAM_TIMEOUT`
+    seconds without changes and clients reconnect on their own. With a
+    synchronous WSGI server, every display board holds a worker for this time,
+    so enough workers (or threads) have to be available for all boards. While
+    waiting, no database connection is held.
+    """
+    last_etag, __, last_hash = request.META.get("HTTP_LAST_EVENT_ID", "").partition(":")
+    deadline = time.monotonic() + SUBSTITUTIONS_STREAM_TIMEOUT
+    sequence = broker.sequence
+
+    yield f"retry: {SUBSTITUTIONS_STREAM_RETRY}\n\n"
+    while True:
+        weeks, parts = _substitutions_scope(year, month, day)
+        etag = get_view_etag(request, weeks, *parts)
+
+        if etag != last_etag:
+            wanted_day = _get_wanted_day(year, month, day)
+            context = build_substitution_day_contexts([wanted_day])[wanted_day]
+            payload = json.dumps(
+                {
+                    "day": wanted_day.isoformat(),
+                    "header": render_to_string(
+                        "chronos/partials/subs/header.html", context, request
+                    ),
+                    "table": render_to_string("chronos/partials/subs/table.html", context, request),
+                }
             )
-            absences = Absence.objects.on_day(day)
-            day_contexts[day]["absent_teachers"] = absences.absent_teachers()
-            day_contexts[day]["absent_groups"] = absences.absent_groups()
-            day_contexts[day]["affected_teachers"] = subs.affected_teachers()
-            affected_groups = subs.affected_groups()
-            if get_site_preferences()["chronos__affected_groups_parent_groups"]:
-                groups_with_parent_groups = affected_groups.filter(parent_groups__isnull=False)
-                groups_without_parent_groups = affected_groups.filter(parent_groups__isnull=True)
-                affected_groups = Group.objects.filter(
-                    Q(child_groups__pk__in=groups_with_parent_groups.values_list("pk", flat=True))
-                    | Q(pk__in=groups_without_parent_groups.values_list("pk", flat=True))
-                ).distinct()
-            day_contexts[day]["affected_groups"] = affected_groups
-
-    if not is_print:
-        context = day_contexts[wanted_day]
-        context["datepicker"] = {
-            "date": date_unix(wanted_day),
-            "dest": reverse("substitutions"),
-        }
+            payload_hash = sha1(payload.encode()).hexdigest()  # noqa: S303
+
+            if payload_hash != last_hash:
+                yield f"id: {etag}:{payload_hash}\nevent: substitutions\ndata: {payload}\n\n"
+                return
+
+            # An event without data only updates the ID used for reconnecting
+            last_etag = etag
+            yield f"id: {etag}:{payload_hash}\n\n"
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+
+        # Changes in this process wake the stream up at once, changes in other
+        # processes are noticed by comparing the data versions
+        connection.close()
+        sequence = broker.wait(sequence, min(SUBSTITUTIONS_STREAM_POLL_INTERVAL, remaining))
 
-        context["url_prev"], context["url_next"] = TimePeriod.get_prev_next_by_day(
-            wanted_day, "substitutions_by_date"
-        )
 
-        template_name = "chronos/substitutions.html"
+@permission_required("chronos.view_substitutions")
+def substitutions_stream(
+    request: HttpRequest,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+) -> HttpResponse:
+    """Send the substitution plan of a day as server-sent event once it changed."""
+    response = StreamingHttpResponse(
+        _substitution_events(request, year, month, day), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _get_ical_url(request: HttpRequest, type_: str, pk: Optional[int] = None) -> str:
+    """Get the URL of the calendar feed of a timetable, including a token for the current user."""
+    if pk is None:
+        url = reverse("my_timetable_ical")
+    else:
+        url = reverse("timetable_ical", args=[type_, pk])
+    token = get_ical_token(request.user, type_, pk)
+    return request.build_absolute_uri(f"{url}?{urlencode({'token': token})}")
+
+
+def _get_ical_user(request: HttpRequest, type_: str, pk: Optional[int] = None):
+    """Get the user requesting a calendar feed, either by a token or by the session."""
+    token = request.GET.get("token")
+    if token:
+        return check_ical_token(token, type_, pk)
+    elif request.user.is_authenticated:
+        return request.user
+    return None
+
+
+def _get_ical_range(request: HttpRequest) -> Tuple[date, date]:
+    """Get the date range of a calendar feed, defaulting to the current validity range."""
+    validity_range = ValidityRange.get_current()
+    if validity_range:
+        start, end = validity_range.date_start, validity_range.date_end
     else:
-        context["days"] = day_contexts
-        template_name = "chronos/substitutions_print.html"
+        start = timezone.now().date()
+        end = start + timedelta(days=ICAL_DEFAULT_DAYS)
 
-    return render(request, template_name, context)
+    start = date.fromisoformat(request.GET["start"]) if "start" in request.GET else start
+    end = date.fromisoformat(request.GET["end"]) if "end" in request.GET else end
+    return start, min(end, start + timedelta(days=ICAL_MAX_DAYS))
+
+
+def _ical_response(
+    request: HttpRequest, user, type_: Union[TimetableType, str], obj, name: str
+) -> HttpResponse:
+    try:
+        start, end = _get_ical_range(request)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    type_value = getattr(type_, "value", type_)
+    # Lessons are taken from the occurrences, which are regenerated only after
+    # the data they are built from has been committed
+    etag = get_view_etag(
+        request,
+        weeks_between(start, end),
+        user.pk,
+        type_value,
+        obj.pk,
+        start,
+        end,
+        get_version(LESSON_OCCURRENCES_VERSION_KEY),
+    )
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is not None:
+        return response
+
+    response = StreamingHttpResponse(
+        generate_ical(type_, obj, start, end, name), content_type="text/calendar; charset=utf-8"
+    )
+    response["ETag"] = quote_etag(etag)
+    response["Content-Disposition"] = f'inline; filename="{type_value}_{obj.pk}.ics"'
+    return response
+
+
+def my_timetable_ical(request: HttpRequest) -> HttpResponse:
+    """Get the personal timetable as iCalendar feed."""
+    user = _get_ical_user(request, "my")
+    if not user or not user.has_perm("chronos.view_my_timetable"):
+        return HttpResponseForbidden()
+    if not has_person(user):
+        return HttpResponseNotFound()
+
+    person = user.person
+    return _ical_response(request, user, "person", person, _("My timetable"))
+
+
+def timetable_ical(request: HttpRequest, type_: str, pk: int) -> HttpResponse:
+    """Get the timetable of a group, teacher or room as iCalendar feed."""
+    user = _get_ical_user(request, type_, pk)
+    el = get_el_by_pk(request, type_, pk)
+    if type(el) == HttpResponseNotFound:
+        return HttpResponseNotFound()
+    if not user or not user.has_perm("chronos.view_timetable", el):
+        return HttpResponseForbidden()
+
+    return _ical_response(
+        request, user, TimetableType.from_string(type_), el, _("Timetable of %s") % el.short_name
+    )
+
+
+@permission_required("chronos.view_timetable", fn=_get_el_for_api)
+@conditional_view(_timetable_api_scope)
+def timetable_api(
+    request: HttpRequest,
+    type_: str,
+    pk: int,
+    year: Optional[int] = None,
+    week: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+) -> HttpResponse:
+    """Get the timetable of a group, teacher or room in a week or on a day as compact JSON.
+
+    The regular timetable (without substitutions, extra lessons and events)
+    is returned with `?mode=regular`.
+    """
+    el = get_el_by_pk(request, type_, pk)
+    if type(el) == HttpResponseNotFound:
+        return HttpResponseNotFound()
+
+    try:
+        date_ref = _get_timetable_api_ref(year, week, month, day)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    is_smart = request.GET.get("mode") != "regular"
+    payload = encode_timetable(TimetableType.from_string(type_), el, date_ref, smart=is_smart)
+    if payload is None:
+        return HttpResponseNotFound()
+    return JsonResponse(payload)